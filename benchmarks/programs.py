@@ -0,0 +1,134 @@
+# each benchmark has a source per engine, None where that language cannot express it,
+# and the value its last DEBUG must print. recursive has no arrays or structs, so it
+# only gets the programs built from functions, loops and classes
+PROGRAMS = {
+    "fib" : {
+        "compiler" : """
+            int fib(int i) {
+                if (i < 2) {
+                    return 1;
+                } else {
+                    return fib(i - 1) + fib(i - 2);
+                }
+            }
+            DEBUG fib(18);
+        """,
+        "recursive" : """
+            fun fib(i) {
+                if (i < 2) {
+                    return 1;
+                } else {
+                    return fib(i - 1) + fib(i - 2);
+                }
+            }
+            DEBUG fib(18);
+        """,
+        "expect" : 4181,
+    },
+    "sieve" : {
+        "compiler" : """
+            int[2000] composite;
+            int count = 0;
+            for (int i = 2; i < 2000; i = i + 1) {
+                if (composite[i] == 0) {
+                    count = count + 1;
+                    for (int j = i * i; j < 2000; j = j + i) {
+                        composite[j] = 1;
+                    }
+                }
+            }
+            DEBUG count;
+        """,
+        "recursive" : None,
+        "expect" : 303,
+    },
+    "bubble_sort" : {
+        "compiler" : """
+            int[80] a;
+            int seed = 12345;
+            for (int i = 0; i < 80; i = i + 1) {
+                seed = (seed * 1103 + 12345) % 65536;
+                a[i] = seed;
+            }
+            for (int i = 0; i < 79; i = i + 1) {
+                for (int j = 0; j < 79 - i; j = j + 1) {
+                    if (a[j] > a[j + 1]) {
+                        int t = a[j];
+                        a[j] = a[j + 1];
+                        a[j + 1] = t;
+                    }
+                }
+            }
+            int sorted = 1;
+            for (int i = 0; i < 79; i = i + 1) {
+                if (a[i] > a[i + 1]) {
+                    sorted = 0;
+                }
+            }
+            DEBUG sorted;
+        """,
+        "recursive" : None,
+        "expect" : 1,
+    },
+    "linked_list" : {
+        # nodes link by index, the compiled language has no self referential structs
+        "compiler" : """
+            struct node {int value; int next;};
+            node[200] nodes;
+            for (int i = 0; i < 200; i = i + 1) {
+                nodes[i] = {i, (i + 37) % 200};
+            }
+            int total = 0;
+            int p = 0;
+            for (int k = 0; k < 4000; k = k + 1) {
+                node n = nodes[p];
+                total = total + n.value;
+                p = n.next;
+            }
+            DEBUG total;
+        """,
+        "recursive" : """
+            class Node {
+                fun init(value, next) {
+                    self.value = value;
+                    self.next = next;
+                }
+            }
+            var head = Node(0, 0);
+            for (var i = 1; i < 200; i = i + 1;) {
+                head = Node(i, head);
+            }
+            var total = 0;
+            for (var r = 0; r < 20; r = r + 1;) {
+                var p = head;
+                for (var k = 0; k < 200; k = k + 1;) {
+                    total = total + p.value;
+                    p = p.next;
+                }
+            }
+            DEBUG total;
+        """,
+        "expect" : 398000,
+    },
+    "nested_loops" : {
+        "compiler" : """
+            int total = 0;
+            for (int i = 0; i < 100; i = i + 1) {
+                for (int j = 0; j < 100; j = j + 1) {
+                    total = total + i * j;
+                }
+            }
+            DEBUG total;
+        """,
+        "recursive" : """
+            var total = 0;
+            for (var i = 0; i < 100; i = i + 1;) {
+                for (var j = 0; j < 100; j = j + 1;) {
+                    total = total + i * j;
+                }
+            }
+            DEBUG total;
+        """,
+        "expect" : 24502500,
+    },
+}
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from programs import PROGRAMS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+ENGINES = ["compiler", "recursive"]
+
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_REPEAT = 3
+# relative slowdown in wall time or growth in peak memory that counts as a regression
+DEFAULT_TOLERANCE = 0.25
+
+# pipeline phases as (name, fn taking the previous phase's output). the last one runs the program
+# and returns its debug output
+def compilerPhases():
+    from Tokenizer import tokenize
+    from Parser import parse
+    from Typechecker import typecheck
+    from Compiler import comp
+    from Emu import Emu
+
+    def check(parsed):
+        typecheck(parsed[0])
+        return parsed
+
+    def run(instr):
+        emu = Emu(instr)
+        emu.run()
+        return emu.debug_info[-1] if emu.debug_info else None, emu.steps
+
+    return [("tokenize", tokenize), ("parse", parse), ("typecheck", check),
+            ("compile", lambda parsed : comp(*parsed)), ("run", run)]
+
+def recursivePhases():
+    from Tokenizer import tokenize
+    from RecursiveParser import parse
+    from Interpreter import Interpreter
+
+    def run(ast):
+        interpreter = Interpreter()
+        interpreter.interpret(ast)
+        return interpreter.debug_info, None
+
+    return [("tokenize", tokenize), ("parse", parse), ("run", run)]
+
+def runPhases(phases, source):
+    times = {}
+    value = source
+
+    for name, fn in phases:
+        start = time.perf_counter()
+        value = fn(value)
+        times[name] = time.perf_counter() - start
+
+    return times, value
+
+# runs inside a child process whose imports come from the engine's directory
+def measure(engine, name, repeat):
+    sys.path.insert(0, os.path.join(ROOT, engine))
+    phases = compilerPhases() if engine == "compiler" else recursivePhases()
+    source = PROGRAMS[name][engine]
+
+    best = None
+    for _ in range(repeat):
+        times, (output, retired) = runPhases(phases, source)
+
+        if best is None or sum(times.values()) < sum(best.values()):
+            best = times
+
+    # a separate untimed run, tracemalloc slows every allocation down
+    tracemalloc.start()
+    runPhases(phases, source)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"wall_time" : sum(best.values()), "phases" : best, "instructions" : retired,
+            "peak_memory" : peak, "output" : output, "ok" : output == PROGRAMS[name]["expect"]}
+
+# each engine has its own Tokenizer module, so every measurement runs in a fresh interpreter
+def spawn(engine, name, repeat):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", engine, name, "--repeat", str(repeat)],
+                          capture_output=True, text=True, cwd=os.path.join(ROOT, engine))
+
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()
+        return {"error" : error[-1] if error else f"exit code {proc.returncode}", "ok" : False}
+
+    return json.loads(proc.stdout)
+
+def runSuite(names=None, engines=ENGINES, repeat=DEFAULT_REPEAT):
+    results = {}
+
+    for name in names or PROGRAMS:
+        if name not in PROGRAMS:
+            raise Exception(f"Unknown benchmark {name}")
+
+        results[name] = {engine : spawn(engine, name, repeat) for engine in engines
+                         if PROGRAMS[name][engine] is not None}
+
+    return {"python" : platform.python_version(), "results" : results}
+
+# returns a list of human readable regressions, instruction counts are deterministic so any
+# growth is flagged, time and memory get the tolerance
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+
+    for name, engines in current["results"].items():
+        for engine, now in engines.items():
+            then = baseline["results"].get(name, {}).get(engine)
+            where = f"{name}/{engine}"
+
+            if not now["ok"]:
+                regressions.append(f"{where}: {now.get('error') or 'wrong output ' + repr(now['output'])}")
+                continue
+
+            if then is None or not then["ok"]:
+                continue
+
+            if then["instructions"] is not None and now["instructions"] > then["instructions"]:
+                regressions.append(f"{where}: instructions {then['instructions']} -> {now['instructions']}")
+
+            for key in ["wall_time", "peak_memory"]:
+                if now[key] > then[key] * (1 + tolerance):
+                    regressions.append(f"{where}: {key} {then[key]:.4g} -> {now[key]:.4g} "
+                                       f"(+{now[key] / then[key] - 1:.0%})")
+
+    return regressions
+
+def report(current, baseline):
+    print(f"{'benchmark':<14} {'engine':<10} {'wall ms':>9} {'vs base':>8} {'instructions':>13} {'peak KiB':>9}  phases ms")
+
+    for name, engines in current["results"].items():
+        for engine, now in engines.items():
+            if not now["ok"]:
+                print(f"{name:<14} {engine:<10} FAILED {now.get('error') or now['output']}")
+                continue
+
+            then = (baseline or {}).get("results", {}).get(name, {}).get(engine)
+            change = f"{now['wall_time'] / then['wall_time'] - 1:+.0%}" if then and then["ok"] else "-"
+            instructions = "-" if now["instructions"] is None else f"{now['instructions']:,}"
+            phases = " ".join(f"{phase}={seconds * 1000:.1f}" for phase, seconds in now["phases"].items())
+
+            print(f"{name:<14} {engine:<10} {now['wall_time'] * 1000:>9.1f} {change:>8} {instructions:>13} "
+                  f"{now['peak_memory'] / 1024:>9.0f}  {phases}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark programs under both pipelines")
+    parser.add_argument("names", nargs="*", help="benchmarks to run, all of them by default")
+    parser.add_argument("--engine", choices=ENGINES, action="append", help="only run these engines")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs, the fastest is kept")
+    parser.add_argument("--output", help="write the results as JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--worker", nargs=2, metavar=("ENGINE", "NAME"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(measure(*args.worker, args.repeat)))
+        return 0
+
+    current = runSuite(args.names, args.engine or ENGINES, args.repeat)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    report(current, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        return 0
+
+    regressions = compare(current, baseline or {"results" : {}}, args.tolerance)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
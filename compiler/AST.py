@@ -26,6 +26,9 @@ class Dereference(ASTNode):
         super().__init__()
         self.expr = expr
 
+    def __str__(self):
+        return f"*{self.expr}"
+
 class Struct(ASTNode):
     def __init__(self, exprs):
         super().__init__()
@@ -45,6 +48,9 @@ class StructLookUp(ASTNode):
         self.identifier = identifier
         self.expr = expr
 
+    def __str__(self):
+        return f"{self.expr}.{self.identifier}"
+
 class BinaryOp(ASTNode):
     def __init__(self, left, op, right):
         super().__init__()
@@ -115,12 +121,17 @@ class If(ASTNode):
             return f"if ({self.cond}) {self.if_expr} else {self.else_expr}"
 
 class While(ASTNode):
-    def __init__(self, cond, expr):
+    # step is the increment of a for loop, it runs after the body and on continue
+    def __init__(self, cond, expr, step=None):
         super().__init__()
         self.cond = cond
         self.expr = expr
+        self.step = step
     
     def __str__(self):
+        if self.step:
+            return f"while ({self.cond}) {self.expr} {self.step}"
+
         return f"while ({self.cond}) {self.expr}"
 
 class Continue(ASTNode):
@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+
+from Emu import BudgetExceeded
+from Pipeline import Pipeline, PhaseRecorder
+
+DEFAULT_CHUNK_SIZE = 16
+
+def runSource(name, code, max_steps=None, timeout=None, jit=False, phases=False):
+    result = {"name" : name, "debug_info" : None, "stats" : None, "error" : None}
+    recorder = PhaseRecorder() if phases else None
+    pipeline = Pipeline([recorder] if recorder else None, max_steps, timeout, jit=jit)
+
+    try:
+        emu = pipeline.load(code)
+        result["debug_info"] = emu.debug_info
+        result["stats"] = pipeline.execute(emu).asDict()
+    except BudgetExceeded as e:
+        result["stats"] = e.stats.asDict()
+        result["error"] = f"{type(e).__name__}: {e}"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    if recorder:
+        result["phases"] = recorder.asDicts()
+
+    return result
+
+def runChunk(chunk, options):
+    return [runSource(name, code, **options) for name, code in chunk]
+
+# runs once per worker process so the first real chunk does not pay for imports and warmup
+def warmWorker(path):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+    runSource("<warmup>", "int a = 1; DEBUG a + 1;")
+
+def readSources(paths, pattern="*"):
+    sources = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(f for f in glob(os.path.join(path, pattern)) if os.path.isfile(f))
+        else:
+            files = [path]
+
+        for fname in files:
+            with open(fname) as f:
+                sources.append((fname, f.read()))
+
+    return sources
+
+def runBatch(sources, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, **options):
+    if chunk_size < 1:
+        raise Exception("chunk_size must be at least 1")
+
+    chunks = [sources[i : i + chunk_size] for i in range(0, len(sources), chunk_size)]
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=warmWorker, initargs=(here,)) as pool:
+        futures = [pool.submit(runChunk, chunk, options) for chunk in chunks]
+
+        for future in as_completed(futures):
+            yield from future.result()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile and run many programs in parallel")
+    parser.add_argument("paths", nargs="+", help="source files or directories of source files")
+    parser.add_argument("--glob", default="*", help="file pattern used inside directories")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--max-steps", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=None)
+    parser.add_argument("--jit", action="store_true")
+    parser.add_argument("--phases", action="store_true",
+                        help="record time, memory and output size of every pipeline phase")
+    args = parser.parse_args(argv)
+
+    sources = readSources(args.paths, args.glob)
+    failures = 0
+
+    results = runBatch(sources, args.workers, args.chunk_size,
+                       max_steps=args.max_steps, timeout=args.timeout, jit=args.jit,
+                       phases=args.phases)
+
+    for result in results:
+        failures += result["error"] is not None
+        print(json.dumps(result), flush=True)
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,122 +1,149 @@
 from functools import total_ordering
 
+MASK = 0xFFFFFFFF
+SIGN_BIT = 0x80000000
+
+def toSigned(bits: int):
+    return bits - 0x100000000 if bits & SIGN_BIT else bits
+
 def bin2dec(s: str):
-    value = -2 ** 31 * int(s[0])
-    for i in range(1, 32):
-        value += int(s[i]) * 2 ** (31 - i)
-    
-    return value
+    return toSigned(int(s, 2))
 
 def bin2decU(s: str):
-    value = 2 ** 31 * int(s[0])
-    for i in range(1, 32):
-        value += int(s[i]) * 2 ** (31 - i)
-    
-    return value
+    return int(s, 2)
 
 def dec2bin(i: int):
-    s = bin(i % 2 ** 32)
+    return format(i & MASK, "032b")
+
+# RV32M on signed 32 bit ints. division truncates toward zero and never traps: x / 0 is -1
+# (all ones unsigned), x % 0 is x, and the one overflowing case -2^31 / -1 gives -2^31 rem 0
+
+def mulh(a: int, b: int):
+    return (a * b) >> 32
+
+def mulhsu(a: int, b: int):
+    return (a * (b & MASK)) >> 32
+
+def mulhu(a: int, b: int):
+    return toSigned(((a & MASK) * (b & MASK)) >> 32)
+
+def div(a: int, b: int):
+    if b == 0:
+        return -1
+
+    q = abs(a) // abs(b)
+    return toSigned((q if (a < 0) == (b < 0) else -q) & MASK)
+
+def divu(a: int, b: int):
+    if b == 0:
+        return -1
 
-    if s[0] == "-":
-        s = s[3:]
-        s = "".join(["1" for i in range(32 - len(s))]) + s
-    else:
-        s = s[2:]
-        s = "".join(["0" for i in range(32 - len(s))]) + s
-    
-    return s
+    return toSigned((a & MASK) // (b & MASK))
+
+def rem(a: int, b: int):
+    if b == 0:
+        return a
+
+    r = abs(a) % abs(b)
+    return -r if a < 0 else r
+
+def remu(a: int, b: int):
+    if b == 0:
+        return a
+
+    return toSigned((a & MASK) % (b & MASK))
 
 @total_ordering
 class Binary():
+    # bits holds the raw unsigned word, signed caches the two's complement view
+    __slots__ = ("bits", "signed")
+
     def __init__(self, i):
         if type(i) == float:
-            
+
             if i % 1 != 0:
                 raise NotImplementedError
 
             i = int(i)
 
         if type(i) == int:
-            self.value = dec2bin(i)
-            return
-
-        
-
-        if len(i) != 32:
-            self.value = dec2bin(int(i))
-            return 
+            bits = i & MASK
+        elif type(i) == Binary:
+            bits = i.bits
+        elif len(i) != 32:
+            bits = int(i) & MASK
+        else:
+            bits = int(i, 2)
+
+        self.bits = bits
+        self.signed = toSigned(bits)
+
+    @staticmethod
+    def fromBits(bits):
+        b = Binary.__new__(Binary)
+        bits &= MASK
+        b.bits = bits
+        b.signed = bits - 0x100000000 if bits & SIGN_BIT else bits
+        return b
+
+    @property
+    def value(self):
+        return dec2bin(self.bits)
 
-        self.value = i
-    
     def uint(self):
-        return bin2decU(self.value)
-    
+        return self.bits
+
     def __iter__(self):
         return iter(self.value)
-    
+
     def __add__(self, op):
         if type(op) == int:
-            op = Binary(op)
-
-        carry = 0
-        output = ""
-
-        for i in range(31, -1, -1):
-            total = carry + int(self.value[i]) + int(op.value[i])
-
-            match total:
-                case 0:
-                    output = "0" + output
-                    carry = 0
-                case 1:
-                    output = "1" + output
-                    carry = 0
-                case 2:
-                    output = "0" + output
-                    carry = 1
-                case 3:
-                    output = "1" + output
-                    carry = 1
-                case _:
-                    raise Exception
-        
-        return Binary(output)
-    
+            return Binary.fromBits(self.bits + op)
+
+        return Binary.fromBits(self.bits + op.bits)
+
     def __sub__(self, op):
         if type(op) == int:
-            op = Binary(op)
+            return Binary.fromBits(self.bits - op)
+
+        return Binary.fromBits(self.bits - op.bits)
 
-        negation = Binary("".join(["1" if i == "0" else "0" for i in op]))
-        negation = negation + Binary(1)
-        return self + negation 
-    
     def __int__(self):
-        return bin2dec(self.value)
-    
+        return self.signed
+
+    def __hash__(self):
+        return hash(self.signed)
+
     def __eq__(self, o):
-        return int(self) == int(o)
-    
+        if type(o) == Binary:
+            return self.signed == o.signed
+
+        return self.signed == int(o)
+
     def __lt__(self, o):
-        return int(self) < int(o)
-    
+        if type(o) == Binary:
+            return self.signed < o.signed
+
+        return self.signed < int(o)
+
     def __mul__(self, o):
-        return Binary(int(self) * int(o))
+        return Binary.fromBits(self.signed * int(o))
+
+    def __truediv__(self, o):
+        return Binary.fromBits(div(self.signed, int(o)))
 
-    def __div__(self, o):
-        return Binary(int(self) // int(o))
+    def __mod__(self, o):
+        return Binary.fromBits(rem(self.signed, int(o)))
+
+    def __repr__(self):
+        return f"Binary({self.signed})"
 
-    def bitwise(self, o, op):
-        return "".join(map(op, self.value, o.value))
-    
     def bitwiseAnd(self, o):
-        value = self.bitwise(o, lambda x, y : "1" if x == "1" and y == "1" else "0")
-        return Binary(value)
-    
+        return Binary.fromBits(self.bits & o.bits)
+
     def bitwiseOr(self, o):
-        value = self.bitwise(o, lambda x, y : "1" if x == "1" or y == "1" else "0")
-        return Binary(value)
-    
+        return Binary.fromBits(self.bits | o.bits)
+
     def bitwiseXor(self, o):
-        value = self.bitwise(o, lambda x, y : "1" if (x == "1" or y == "1") and x != y else "0")
-        return Binary(value)
-    
+        return Binary.fromBits(self.bits ^ o.bits)
+
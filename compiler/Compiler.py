@@ -1,14 +1,23 @@
+import copy
+
 from Tokenizer import TokenType
 from Instruction import *
 from Types import *
 from Parser import INT, CHAR, VOID
 from StackManager import StackManager
-from AST import VariableGet
+from AST import Value, Dereference, StructLookUp, BinaryOp, VariableGet, List
+from RegisterAllocator import VirtualCode, allocate
+
+SP = register_name_to_num["sp"]
 
 class Compiler:
-    def __init__(self, ast, types):
+    # imports are the return types of functions compiled in other units, see Linker. with registers
+    # expressions that need no call are computed in registers instead of on the stack, see resolveLowered
+    def __init__(self, ast, types, imports=None, registers=False):
         self.ast = ast
         self.types = types
+        self.imports = imports or {}
+        self.registers = registers
 
         self.stack = StackManager()
 
@@ -18,12 +27,33 @@ class Compiler:
         self.function_instr = Instructions()
         self.function_addrs = {}
         self.function_returns = {}
+        self.function_args = {}
+
+        self.labels = 0
+        # (continue label, break label, stack position) of each loop we are inside
+        self.loops = []
     
+    # the program with labels still in it, see link
     def run(self):
-        instr = self.ast.resolve(self) + Stop()
+        instr = Instructions(Label("main")) + self.ast.resolve(self) + Stop()
 
-        start = Instructions(Jal("x0", len(self.function_instr) * 4 + 4))
+        start = Instructions(Jal("x0", "main"))
         return start + self.function_instr + instr
+
+    # a separately compiled unit: its functions, then its top level code from the main label on.
+    # calls to functions of other units are left as relocations
+    def runUnit(self):
+        instr = self.ast.resolve(self)
+        return self.function_instr + Label("main") + instr
+
+    def link(self, instr):
+        program, symbols = link(instr)
+        self.function_addrs = {name : symbols[functionLabel(name)] for name in self.function_returns}
+        return program
+
+    def newLabel(self, kind):
+        self.labels += 1
+        return f"{kind}{self.labels}"
     
     def beginScope(self):
         self.locals.append({})
@@ -82,11 +112,12 @@ class Compiler:
                 Lw(reg, "sp", 0)
         )
 
-    def linkFutureBeq(self, instructions, addr_rel_start):
-        for i, instr in enumerate(instructions):
-            if type(instr) == FutureBeq:
-                instructions[i] = Beq("x0", "x0", addr_rel_start - i * 4)
-                instructions[i].comment = instr.comment
+    # drops whatever the statements inside a loop or function pushed, then jumps to label
+    def jumpOut(self, label, stack_pos):
+        return Instructions(
+            Addi("sp", "sp", stack_pos - self.stack.getCurrent()),
+            Beq("x0", "x0", label)
+        )
 
     def resolveErr(self, err):
         return Instructions(RaiseError())
@@ -101,12 +132,21 @@ class Compiler:
         raise NotImplementedError
     
     def resolveDereference(self, dref):
+        if self.registers and self.lowerable(dref):
+            return self.resolveLowered(dref)
+
         instr = Instructions()
         words = dref.type.getWords()
 
         instr += dref.expr.resolve(self)
         instr += self.pop("t0")
 
+        if dref.type.getSize() == 1:
+            instr += Lbu("t1", "t0", 0)
+            instr += Sw("sp", "t1", 0)
+            instr += Addi("sp", "sp", 4)
+            words = 0
+
         for _ in range(words):
             instr += Lw("t1", "t0", 0)
             instr += Sw("sp", "t1", 0)
@@ -115,13 +155,17 @@ class Compiler:
         
         self.stack.push(dref.type)
         
-        instr.commentFirst("dref start")
-        instr.commentLast("dref end")
+        instr = instr.commentFirst("dref start")
+        instr = instr.commentLast("dref end")
         
         return instr
     
     def resolveStruct(self, struct):
         instr = Instructions()
+
+        if not struct.type.word_layout:
+            return self.resolvePackedStruct(struct)
+
         for expr in struct.exprs:
             instr += expr.resolve(self)
         
@@ -129,6 +173,54 @@ class Compiler:
         self.stack.push(struct.type)
         
         return instr
+
+    # zeroes the struct's words on the stack, then stores each property at its byte offset
+    def resolvePackedStruct(self, struct):
+        base = self.stack.getCurrent()
+        instr = self.reserve(struct.type.getWords())
+
+        for expr, type_, offset in zip(struct.exprs, struct.type.property_types, struct.type.offsets):
+            instr += self.popInto(type_, base + offset, expr.resolve(self))
+
+        self.stack.popUntil(base)
+        self.stack.push(struct.type)
+
+        return instr
+
+    def reserve(self, words):
+        instr = Instructions()
+
+        for i in range(words):
+            instr += Sw("sp", "x0", 4 * i)
+            self.stack.push(VOID)
+
+        instr += Addi("sp", "sp", 4 * words)
+        return instr
+
+    # moves the value the instructions pushed into the stack slot at pos, with byte stores for chars
+    def popInto(self, type_, pos, instr):
+        amount = self.stack.pop()
+        rel = pos - self.stack.getCurrent()
+        store = Sb if type_.getSize() == 1 else Sw
+        last = instr.last
+        rest = instr.dropLast(1)
+        push = rest.last
+
+        # a single word pushed straight from a register is stored from that register instead
+        if (amount == 4 and type(push) == Sw and push.r1 == SP and push.imm == 0
+                and type(last) == Addi and last.rd == last.r1 == SP and last.imm == 4):
+            return rest.dropLast(1) + store("sp", push.r2, rel)
+
+        if type_.getSize() == 1:
+            instr += Lw("t0", "sp", -4)
+            instr += Sb("sp", "t0", rel - 4)
+        else:
+            for i in range(0, amount, 4):
+                instr += Lw("t0", "sp", i - amount)
+                instr += Sw("sp", "t0", rel + i - amount)
+
+        instr += Addi("sp", "sp", -amount)
+        return instr
     
     def resolveList(self, l):
         instr = Instructions()
@@ -138,27 +230,28 @@ class Compiler:
         return instr
             
     def resolveBinaryOp(self, op):
+        if self.registers and self.lowerable(op):
+            return self.resolveLowered(op)
+
         instr = op.left.resolve(self)
-        instr.commentFirst(f"#binaryop {op.left} {op.op.name} {op.right}")
-        instr.commentLast("#left binop done")
+        instr = instr.commentFirst(f"#binaryop {op.left} {op.op.name} {op.right}")
+        instr = instr.commentLast("#left binop done")
 
         instr += op.right.resolve(self)
-        instr.commentLast("#right binop done")
+        instr = instr.commentLast("#right binop done")
         instr += self.pop("t1")
         instr += self.pop("t0")
 
         match op.op:
             case TokenType.OP_PLUS:
                 if type(op.left.type) == PointerType:
-                        instr += Addi("t2", "x0", op.left.type.getPointedWords() * 4)
-                        instr += Mul("t1", "t1", "t2")
+                    instr += self.scaleIndex(op.left.type)
 
                 instr += Add("t0", "t0", "t1")
 
             case TokenType.OP_MINUS:
                 if type(op.left.type) == PointerType:
-                        instr += Addi("t2", "x0", op.left.type.getPointedWords() * 4)
-                        instr += Mul("t1", "t1", "t2")
+                    instr += self.scaleIndex(op.left.type)
 
                 instr += Sub("t0", "t0", "t1")
 
@@ -168,6 +261,9 @@ class Compiler:
             case TokenType.OP_DIV:
                 instr += Div("t0", "t0", "t1")
 
+            case TokenType.OP_MOD:
+                instr += Rem("t0", "t0", "t1")
+
             case TokenType.COMP_EQ:
                 instr += Instructions(
                             Xor("t0", "t0", "t1"),
@@ -214,10 +310,129 @@ class Compiler:
                 raise NotImplementedError
         
         instr += self.pushReg("t0")
-        instr.commentLast("#END binaryop")
+        instr = instr.commentLast("#END binaryop")
 
         return instr
         
+    # pointer arithmetic moves by whole elements, which for chars is one byte
+    def scaleIndex(self, pointer):
+        size = pointer.getPointedSize()
+
+        if size == 1:
+            return Instructions()
+
+        return Instructions(
+                    Addi("t2", "x0", size),
+                    Mul("t1", "t1", "t2"))
+
+    # a one word expression made of values, variables, lookups, loads and arithmetic. calls are
+    # left on the stack since the callee is free to use every register
+    def lowerable(self, expr):
+        if type(expr) == Value:
+            return expr.type == INT or expr.type == CHAR
+
+        if type(expr) == VariableGet:
+            return True
+
+        if type(expr) == StructLookUp:
+            return self.lowerable(expr.expr)
+
+        if type(expr) == Dereference:
+            return expr.type.getWords() == 1 and self.lowerable(expr.expr)
+
+        if type(expr) == BinaryOp:
+            return (expr.type.getWords() == 1 and expr.op in LOWERED_OPS
+                    and self.lowerable(expr.left) and self.lowerable(expr.right))
+
+        return False
+
+    # computes the expression in registers and pushes only its result
+    def resolveLowered(self, expr):
+        code = VirtualCode()
+        instr, reg = allocate(code, self.lower(expr, code))
+        instr += Sw("sp", reg, 0)
+        instr += Addi("sp", "sp", 4)
+
+        self.stack.push(expr.type if type(expr) == Dereference else VOID)
+
+        instr = instr.commentFirst(f"#registers {expr}")
+        instr = instr.commentLast("#END registers")
+        return instr
+
+    # emits the expression into code, returns the virtual register holding it
+    def lower(self, expr, code):
+        if type(expr) == Value:
+            value = ord(expr.value) if expr.type == CHAR else Binary(expr.value)
+            return code.emit(Addi, code.new(), "x0", imm=value)
+
+        if type(expr) == Dereference:
+            base, offset = self.lowerAddress(expr.expr, code)
+            load = Lbu if expr.type.getSize() == 1 else Lw
+            return code.emit(load, code.new(), base, imm=offset)
+
+        if type(expr) == BinaryOp:
+            return self.lowerBinaryOp(expr, code)
+
+        base, offset = self.lowerAddress(expr, code)
+        return code.emit(Addi, code.new(), base, imm=offset)
+
+    # an address as a register and an offset, so variables and properties fold into the load
+    def lowerAddress(self, expr, code):
+        if type(expr) == VariableGet:
+            _, pos = self.get(expr.name)
+            return "sp", pos - self.stack.getCurrent()
+
+        if type(expr) == StructLookUp:
+            base, offset = self.lowerAddress(expr.expr, code)
+            return base, offset + expr.type.type.getPropertyOffset(expr.identifier)
+
+        return self.lower(expr, code), 0
+
+    def lowerBinaryOp(self, op, code):
+        left = self.lower(op.left, code)
+        right = self.lower(op.right, code)
+        dest = code.new()
+
+        match op.op:
+            case TokenType.OP_PLUS | TokenType.OP_MINUS:
+                if type(op.left.type) == PointerType and op.left.type.getPointedSize() != 1:
+                    size = code.emit(Addi, code.new(), "x0", imm=op.left.type.getPointedSize())
+                    right = code.emit(Mul, code.new(), right, size)
+
+                code.emit(Add if op.op == TokenType.OP_PLUS else Sub, dest, left, right)
+
+            case TokenType.OP_MUL | TokenType.OP_DIV | TokenType.OP_MOD:
+                code.emit(LOWERED_OPS[op.op], dest, left, right)
+
+            case TokenType.COMP_EQ:
+                code.emit(Xor, dest, left, right)
+                code.emit(SltiU, dest, dest, imm=1)
+
+            case TokenType.COMP_NEQ:
+                code.emit(Xor, dest, left, right)
+                code.emit(SltU, dest, "x0", dest)
+
+            case TokenType.COMP_GT | TokenType.COMP_LT_EQ:
+                code.emit(Sub, dest, left, right)
+                self.lowerSign(op.op == TokenType.COMP_GT, dest, code)
+
+            case TokenType.COMP_LT | TokenType.COMP_GT_EQ:
+                code.emit(Sub, dest, right, left)
+                self.lowerSign(op.op == TokenType.COMP_LT, dest, code)
+
+            case TokenType.OR | TokenType.AND:
+                code.emit(LOWERED_OPS[op.op], dest, left, right)
+                code.emit(SltU, dest, "x0", dest)
+
+        return dest
+
+    # dest > 0 when positive, dest < 1 otherwise
+    def lowerSign(self, positive, dest, code):
+        if positive:
+            code.emit(Slt, dest, "x0", dest)
+        else:
+            code.emit(Slti, dest, dest, imm=1)
+
     def resolveVariableDecl(self, vardecl):
         self.bindPosition(vardecl.name, vardecl.type, 0)
         instr = Instructions()
@@ -229,7 +444,13 @@ class Compiler:
             # TODO change 
             self.stack.push(INT)
         
-        if vardecl.expr:
+        if vardecl.expr and self.packedList(vardecl):
+            data = self.stack.getCurrent()
+            instr += self.reserve(vardecl.type.getAllocWords())
+
+            for i, expr in enumerate(vardecl.expr.exprs):
+                instr += self.popInto(vardecl.type.type, data + i, expr.resolve(self))
+        elif vardecl.expr:
             instr += vardecl.expr.resolve(self)
         else:
             amount = vardecl.type.getAllocWords()
@@ -237,19 +458,30 @@ class Compiler:
             for _ in range(amount):
                 instr += self.push(0)
 
-        instr.commentLast("decl end")
+        instr = instr.commentLast("decl end")
         return instr
     
+    # char arrays initialised from a list literal are stored a byte per element
+    def packedList(self, vardecl):
+        return (type(vardecl.type) == PointerType and vardecl.type.amount != 0
+                and vardecl.type.getPointedSize() == 1 and type(vardecl.expr) == List)
+
     def resolveVariableSet(self, varset):
         instr = Instructions()
 
         instr += varset.value_expr.resolve(self)
 
         instr += varset.addr_expr.resolve(self)
-        instr.commentFirst(f"#{varset.addr_expr} = {varset.value_expr}")
-        instr.commentLast("#stack set up")
+        instr = instr.commentFirst(f"#{varset.addr_expr} = {varset.value_expr}")
+        instr = instr.commentLast("#stack set up")
 
         instr += self.pop("t1")
+
+        if varset.type.getSize() == 1:
+            instr += self.pop("t0")
+            instr += Sb("t1", "t0", 0)
+            return instr
+
         byte_amount = self.stack.pop()
         instr += Addi("t1", "t1", byte_amount-4)
 
@@ -270,21 +502,24 @@ class Compiler:
         instr += Addi("t0", "sp", pos-self.stack.getCurrent())
         instr += self.pushReg("t0")
 
-        instr.commentFirst("varget start")
-        instr.commentLast("vargetend")
+        instr = instr.commentFirst("varget start")
+        instr = instr.commentLast("vargetend")
 
 
         return instr
     
     def resolveStructLookUp(self, slu):
+        if self.registers and self.lowerable(slu):
+            return self.resolveLowered(slu)
+
         instr = slu.expr.resolve(self)
 
         instr += self.pop("t0")
-        instr += Addi("t0", "t0", 4 * slu.type.type.getPropertyOffset(slu.identifier))
+        instr += Addi("t0", "t0", slu.type.type.getPropertyOffset(slu.identifier))
         instr += self.pushReg("t0")
 
-        instr.commentFirst("slu start")
-        instr.commentLast("slu done")
+        instr = instr.commentFirst("slu start")
+        instr = instr.commentLast("slu done")
 
         return instr
 
@@ -308,11 +543,11 @@ class Compiler:
         stack_start = self.stack.getCurrent()
 
         instr = block.statements.resolve(self)
-        instr.commentFirst("#block start")
+        instr = instr.commentFirst("#block start")
         
         stack_diff = stack_start - self.stack.getCurrent()
         instr += Addi("sp", "sp", stack_diff)
-        instr.commentLast("#END block")
+        instr = instr.commentLast("#END block")
         self.stack.popUntil(stack_start)
 
         self.endScope()
@@ -320,72 +555,95 @@ class Compiler:
     
     def resolveIf(self, if_):
         cond = if_.cond.resolve(self)
-        cond.commentFirst("#IF cond start")
+        cond = cond.commentFirst("#IF cond start")
         cond += self.pop("t0")
 
+        label = self.newLabel("if")
+
         if if_.else_expr:
 
             else_expr = if_.else_expr.resolve(self)
-            else_expr.commentFirst("#ELSE expr start")
-            else_expr.commentLast("#END else expr")
+            else_expr = else_expr.commentFirst("#ELSE expr start")
+            else_expr = else_expr.commentLast("#END else expr")
 
             if_expr = if_.if_expr.resolve(self)
-            if_expr.commentFirst("IF expr start")
+            if_expr = if_expr.commentFirst("#IF expr start")
 
-            if_expr += Beq("x0", "x0", 4 * len(else_expr) + 4)
-            if_expr.commentLast("#IF expr end")
+            if_expr += Beq("x0", "x0", f"{label}.end")
+            if_expr = if_expr.commentLast("#IF expr end")
 
-            cond += Beq("t0", "x0", 4 * len(if_expr) + 4)
-            cond.commentLast("#IF cond end")
-            return cond + if_expr + else_expr
+            cond += Beq("t0", "x0", f"{label}.else")
+            cond = cond.commentLast("#IF cond end")
+            return cond + if_expr + Label(f"{label}.else") + else_expr + Label(f"{label}.end")
 
         else:
             if_expr = if_.if_expr.resolve(self)
-            if_expr.commentFirst("#IF expr start")
-            cond += Beq("t0", "x0", 4 * len(if_expr) + 4)
-            cond.commentLast("#IF cond end")
-            return cond + if_expr
+            if_expr = if_expr.commentFirst("#IF expr start")
+            cond += Beq("t0", "x0", f"{label}.end")
+            cond = cond.commentLast("#IF cond end")
+            return cond + if_expr + Label(f"{label}.end")
 
     def resolveWhile(self, wh):
+        label = self.newLabel("while")
+        head, step, exit = f"{label}.head", f"{label}.step", f"{label}.exit"
+
         cond = wh.cond.resolve(self)
-        cond.commentFirst(f"#WHILE {wh.cond}")
+        cond = cond.commentFirst(f"#WHILE {wh.cond}")
         cond += self.pop("t0")
+        cond += Beq("t0", "x0", exit)
 
+        # continue in a for loop still runs the step
+        self.loops.append((step if wh.step else head, exit, self.stack.getCurrent()))
         block = wh.expr.resolve(self)
-        block += Beq("x0", "x0", - 4 * len(block) - 4 * len(cond) - 4)
-        block.commentLast("#END while")
-        cond += (Beq("t0", "x0", 4 * len(block) + 4))
-        return cond + block
+        self.loops.pop()
+
+        if wh.step:
+            block += Label(step)
+            block += wh.step.resolve(self)
+
+        block += Beq("x0", "x0", head)
+        block = block.commentLast("#END while")
+        return Instructions(Label(head)) + cond + block + Label(exit)
     
     def resolveContinue(self, cont):
-        raise NotImplementedError()
+        if not self.loops:
+            raise Exception("continue outside of a loop")
+
+        head, _, stack_pos = self.loops[-1]
+        return self.jumpOut(head, stack_pos).commentLast("#continue")
     
-    def resolveBreak(self, cont):
-        raise NotImplementedError()
+    def resolveBreak(self, brk):
+        if not self.loops:
+            raise Exception("break outside of a loop")
+
+        _, exit, stack_pos = self.loops[-1]
+        return self.jumpOut(exit, stack_pos).commentLast("#break")
     
     def resolveFunctionDecl(self, fn):
-        self.function_addrs[fn.name] = len(self.function_instr) * 4 + 4
+        entry = functionLabel(fn.name)
+        self.function_exit = f"{entry}.exit"
         self.function_returns[fn.name] = fn.type
+        self.function_args[fn.name] = (fn.args, fn.argtypes)
 
+        loops, self.loops = self.loops, []
         self.beginScope()
 
         for i, arg in enumerate(fn.args):
             self.bindPosition(arg, fn.argtypes[i], -4 * fn.argtypes[i].getWords() * (len(fn.args) - i))
         
-        instr = self.pushReg("ra")
-        instr.commentFirst(f"# function {fn.name}")
-        instr.commentLast("# ra pushed to stack")
+        instr = Instructions(Label(entry)) + self.pushReg("ra")
+        instr = instr.commentFirst(f"# function {fn.name}")
+        instr = instr.commentLast("# ra pushed to stack")
 
         # adds return value to stack
         self.function_stack = self.stack.getCurrent()
         instr += fn.block.resolve(self).commentFirst("# resolve function block")
+        instr = instr.commentLast("# end function block")
 
-        self.linkFutureBeq(instr, 4 * len(instr))
-
-        instr.commentLast("# end function block")
+        instr += Label(self.function_exit)
         instr += self.pop("ra").commentFirst("# start of function exit prec")
         instr += Addi("sp", "sp", -4 * len(fn.args))
-        instr.commentLast("# restore stack")
+        instr = instr.commentLast("# restore stack")
 
         # copy old stack
         b = fn.type.getWords()
@@ -400,6 +658,7 @@ class Compiler:
 
         instr += Jalr("x0", "ra", 0)
         self.endScope()
+        self.loops = loops
 
         self.function_instr += instr
 
@@ -410,20 +669,20 @@ class Compiler:
         for arg in call.args:
             instr += arg.resolve(self)
 
-        instr += Jalr("ra", "x0", self.function_addrs[call.name])
+        instr += Jalr("ra", "x0", functionLabel(call.name))
         self.stack.popItems(len(call.args))
-        self.stack.push(self.function_returns[call.name])
-        instr.commentFirst(f"#CALL {call.name}")
-        instr.commentLast("#END call")
+        self.stack.push(self.function_returns[call.name] if call.name in self.function_returns else self.imports[call.name])
+        instr = instr.commentFirst(f"#CALL {call.name}")
+        instr = instr.commentLast("#END call")
         return instr
     
     def resolveReturn(self, ret):
         instr = ret.expr.resolve(self)
         instr += Addi("a0", "sp", 0)
         instr += Addi("sp", "sp", self.function_stack - self.stack.getCurrent())
-        instr += FutureBeq("x0", "x0")
-        instr.commentFirst("# return start")
-        instr.commentLast("# return jump")
+        instr += Beq("x0", "x0", self.function_exit)
+        instr = instr.commentFirst("# return start")
+        instr = instr.commentLast("# return jump")
         return instr
     
     def resolveStatements(self, stmts):
@@ -433,10 +692,72 @@ class Compiler:
         
         return instr
 
-def comp(ast, types):
-    c = Compiler(ast, types)
-    instr = c.run().instr
-    return instr
+# the binary operators resolveLowered handles, with the instruction of the ones that map onto one
+LOWERED_OPS = {TokenType.OP_PLUS : Add, TokenType.OP_MINUS : Sub, TokenType.OP_MUL : Mul,
+               TokenType.OP_DIV : Div, TokenType.OP_MOD : Rem, TokenType.COMP_EQ : Xor,
+               TokenType.COMP_NEQ : Xor, TokenType.COMP_GT : Sub, TokenType.COMP_LT : Sub,
+               TokenType.COMP_GT_EQ : Sub, TokenType.COMP_LT_EQ : Sub, TokenType.OR : Or,
+               TokenType.AND : And}
+
+def functionLabel(name):
+    return f"fn.{name}"
+
+# lays the program out in one pass: labels take no space and are collected by address, along with
+# the indices of the instructions that still name one
+def layout(flat):
+    program = Program()
+    symbols = {}
+    relocations = []
+    # a comment put on a label belongs to the instruction after it
+    pending = ""
+
+    for i, instr in enumerate(flat):
+        comment = flat.comments.get(i, "")
+
+        if type(instr) == Label:
+            if instr.name in symbols:
+                raise Exception(f"Duplicate label {instr.name}")
+
+            symbols[instr.name] = len(program) * 4
+            pending = pending or comment
+            continue
+
+        if pending or comment:
+            program.comments[len(program)] = pending or comment
+            pending = ""
+
+        if type(getattr(instr, "imm", None)) == str:
+            relocations.append(len(program))
+
+        program.append(instr)
+
+    return program, symbols, relocations
+
+# branches and jumps to a label get the pc relative offset and any other immediate naming one gets
+# its address. returns the Program and the address of every label
+def link(instrs):
+    program, symbols, relocations = layout(instrs.flatten())
+
+    for index in relocations:
+        program[index] = relocate(program[index], symbols, index * 4)
+
+    return program, symbols
+
+def relocate(instr, symbols, pc):
+    if instr.imm not in symbols:
+        raise Exception(f"Undefined label {instr.imm}")
+
+    linked = copy.copy(instr)
+    linked.imm = symbols[instr.imm]
+
+    if isinstance(instr, (BType, JType)):
+        linked.imm -= pc
+
+    return linked
+
+def comp(ast, types, registers=False):
+    c = Compiler(ast, types, registers=registers)
+    return c.link(c.run())
             
         
 
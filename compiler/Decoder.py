@@ -0,0 +1,68 @@
+from Instruction import *
+
+# the position of a class in this list is its opcode number
+OPCODES = [
+    Add, Sub, Xor, Or, And, Mul, Div, Slt, SltU,
+    Mulh, Mulhsu, Mulhu, Divu, Rem, Remu,
+    Addi, Jalr, Lw, Slti, SltiU,
+    Lb, Lbu, Lh, Lhu,
+    Beq, Bne, Blt, Bge,
+    Jal,
+    Sw, Sb, Sh,
+    Stop, Debug, RaiseError,
+    Lui
+]
+
+# decoded writes to x0 land in this extra register slot, so x0 stays 0 without a branch per write
+X0_SINK = 32
+
+# not real instructions, Emu patches them over decoded records that have a breakpoint
+# or that sit in memory without execute permission
+BREAKPOINT = len(OPCODES)
+NO_EXEC = BREAKPOINT + 1
+
+opcode_of = {cls : i for i, cls in enumerate(OPCODES)}
+opcode_names = [cls.__name__ for cls in OPCODES] + ["Breakpoint", "NoExec"]
+
+def dest(num):
+    return num or X0_SINK
+
+def decodeInstruction(instr):
+    if type(instr) not in opcode_of:
+        raise Exception(f"Cannot decode {type(instr).__name__}")
+
+    op = opcode_of[type(instr)]
+
+    if isinstance(instr, RType):
+        return (op, dest(instr.rd), instr.r1, instr.r2, 0)
+
+    if isinstance(instr, IType):
+        return (op, dest(instr.rd), instr.r1, 0, instr.imm)
+
+    if isinstance(instr, BType):
+        imm = instr.imm
+
+        if imm % 4 != 0:
+            raise Exception("Bad pc")
+
+        return (op, 0, instr.r1, instr.r2, imm)
+
+    if isinstance(instr, JType):
+        imm = instr.imm
+
+        if imm % 4 != 0:
+            raise Exception("Bad pc")
+
+        return (op, dest(instr.rd), 0, 0, imm)
+
+    if isinstance(instr, SType):
+        return (op, 0, instr.r1, instr.r2, instr.imm)
+
+    if isinstance(instr, UType):
+        return (op, dest(instr.rd), 0, 0, instr.imm)
+
+    return (op, 0, 0, 0, 0)
+
+# turns Instruction objects into (opcode, rd, r1, r2, imm) records for Emu.run
+def decode(instrs):
+    return [decodeInstruction(instr) for instr in instrs]
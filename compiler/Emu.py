@@ -1,55 +1,188 @@
-from Binary import Binary
-
-ZERO = "00000000000000000000000000000000"
-register_name_to_num = {"x0":0, "zero":0, "x1":1, "ra":1,
-                        "x2":2, "sp":2, "x3":3, "gp":3, 
-                        "x4":4, "tp":4, "x5":5, "t0":5,
-                        "x6":6, "t1":6, "x7":7, "t2":7,
-                        "x8":8, "s0":8, "fp":8, 
-                        "x9":9, "s1":9, "x10":10, "a0":10, 
-                        "x11":11, "a1":11, "x12":12, "a2":12,
-                        "x13":13, "a3":13, "x14":14, "a4":14,
-                        "x15":15, "a5":15, "x16":16, "a6":16,
-                        "x17":17, "a7":17, "x18":18, "s2":18,
-                        "x19":19, "s3":19, "x20":20, "s4":20,
-                        "x21":21, "s5":21, "x22":22, "s6":22,
-                        "x23":23, "s7":23, "x24":24, "s8":24,
-                        "x25":25, "s9":25, "x26":26, "s10":26,
-                        "x27":27, "s11":27, "x28":28, "t3":28,
-                        "x29":29, "t4":29, "x30":30, "t5":30,
-                        "x31":31, "at":31, "PC": 32
-                        }
+import asyncio
+import time
+from functools import partial
+
+from Binary import Binary, MASK, mulh, mulhsu, mulhu, div, divu, rem, remu
+from Instruction import Lw, Sw, Lb, Lbu, Lh, Lhu, Sb, Sh, Debug, register_name_to_num
+
+from Decoder import decode, OPCODES, BREAKPOINT, NO_EXEC, opcode_of
+from Memory import Memory, MemoryFault, DEFAULT_MEM_SIZE
+from PagedMemory import PagedMemory, PAGED_MEM_SIZE
+from JIT import JIT, JIT_THRESHOLD
+from Profiler import Profiler
+from RV32 import Image
+from Tracer import Tracer
+
+RUN_CHUNK = 4096
+# instructions per slice before runAsync yields, small enough to keep the event loop responsive
+RUN_SLICE = 1024
+
+LOADS = (Lw, Lb, Lbu, Lh, Lhu)
+STORES = (Sw, Sb, Sh)
+# the part of the source register a store writes, which is what a write watch reports
+STORE_MASKS = {Sw : -1, Sb : 0xFF, Sh : 0xFFFF}
+
+class RunStats:
+    def __init__(self, instructions=0, wall_time=0.0, loads=0, stores=0,
+                 branches_taken=0, branches_not_taken=0):
+        self.instructions = instructions
+        self.wall_time = wall_time
+        self.loads = loads
+        self.stores = stores
+        self.branches_taken = branches_taken
+        self.branches_not_taken = branches_not_taken
+
+    @property
+    def instructions_per_second(self):
+        if not self.wall_time:
+            return 0.0
+
+        return self.instructions / self.wall_time
+
+    def asDict(self):
+        return {
+            "instructions" : self.instructions,
+            "wall_time" : self.wall_time,
+            "instructions_per_second" : self.instructions_per_second,
+            "loads" : self.loads,
+            "stores" : self.stores,
+            "branches_taken" : self.branches_taken,
+            "branches_not_taken" : self.branches_not_taken,
+        }
+
+    def __str__(self):
+        return (f"{self.instructions} instructions in {self.wall_time:.4f}s "
+                f"({self.instructions_per_second:,.0f}/s), {self.loads} loads, {self.stores} stores, "
+                f"branches {self.branches_taken} taken / {self.branches_not_taken} not taken")
+
+class Snapshot:
+    def __init__(self, regs, pc, pages, debug_info, stop, counters):
+        self.regs = regs
+        self.pc = pc
+        self.pages = pages
+        self.debug_info = debug_info
+        self.stop = stop
+        self.counters = counters
+
+    def size(self):
+        return sum(len(data) for data in self.pages.values())
+
+class BudgetExceeded(Exception):
+    def __init__(self, message, stats):
+        super().__init__(message)
+        self.stats = stats
+
+# raised by Stop, breakpoints and watchpoints so the decoded loops do not have to test a flag every step.
+# executed is False when the instruction at pc has not run and should not be counted
+class Halt(Exception):
+    def __init__(self, pc, executed=True):
+        super().__init__()
+        self.pc = pc
+        self.executed = executed
 
 class Emu:
-    def __init__(self, instrs, debug=False):
+    def __init__(self, instrs, debug=False, mem_size=None, mem_file=None,
+                 jit=False, jit_threshold=JIT_THRESHOLD, profile=False, trace=None,
+                 paged=False, regions=None):
         self.instrs = instrs
 
-        self.index = 0
-        self.regs = [Binary(ZERO) for _ in range(33)]
-        self.mem = [Binary(ZERO) for _ in range(1000)]
+        # x0..x31 plus the x0 write sink, all held as signed 32 bit ints
+        self.regs = [0] * 33
+        self.pc = 0
+
+        # paged memory is sparse and permission checked, flat memory is one buffer the
+        # handlers and JIT blocks index directly
+        self.paged = paged or regions is not None
+
+        if self.paged:
+            self.mem = PagedMemory(PAGED_MEM_SIZE if mem_size is None else mem_size, regions)
+            self.words = None
+            self.bytes = None
+            self.halves = None
+            self.written = None
+        else:
+            self.mem = Memory(DEFAULT_MEM_SIZE if mem_size is None else mem_size, mem_file)
+            self.words = self.mem.words
+            self.bytes = self.mem.bytes
+            self.halves = self.mem.halves
+            self.written = self.mem.written
 
         self.debug = debug
         self.debug_info = [] 
 
         self.stop = False
+        self.steps = 0
+        self.loads = 0
+        self.stores = 0
+        self.branches_taken = 0
+        self.branches_not_taken = 0
+
+        self.code = None
+        self.jit = None
+        self.use_jit = bool(jit)
+        self.jit_threshold = jit_threshold
+        # pc of the instruction a compiled block raised at, see JIT.BlockBuilder.source
+        self.fault_pc = None
+
+        # a JIT instance can be shared between emulators running the same program
+        if isinstance(jit, JIT):
+            self.jit = jit
+            self.code = self.protect(jit.code) if self.paged else jit.code
+        self.profile = profile
+        self.profiler = None
+
+        # a ring size or a configured Tracer
+        self.tracer = Tracer(trace) if isinstance(trace, int) else trace
+
+        self.handlers = [self.__getattribute__(f"exec{cls.__name__}") for cls in OPCODES]
+        self.handlers += [self.execBreakpoint, self.execNoExec]
+
+        if self.paged:
+            self.handlers[opcode_of[Debug]] = self.execDebugPaged
+
+            for cls in LOADS + STORES:
+                self.handlers[opcode_of[cls]] = self.__getattribute__(f"exec{cls.__name__}Paged")
+
+        # the unwatched handler of every load and store, see swapMemoryHandlers
+        self.memory_handlers = {cls : self.handlers[opcode_of[cls]] for cls in LOADS + STORES}
+
+        # pc -> (original decoded record, callback)
+        self.breakpoints = {}
+        # word address -> callback, for reads and writes
+        self.read_watches = {}
+        self.write_watches = {}
+        # why the last run returned early, None when it was not paused
+        self.paused = None
+        self.resume_break = None
+
+        self.swapMemoryHandlers()
 
+    # instructions hold register numbers, the names are for callers poking at registers by hand
     def getReg(self, reg_name):
-        index = register_name_to_num[reg_name]
-        return self.regs[index]
+        index = reg_name if type(reg_name) == int else register_name_to_num[reg_name]
+
+        if index == register_name_to_num["PC"]:
+            return Binary(self.pc)
+
+        return Binary(self.regs[index])
     
     def setReg(self, reg_name, value):
-        index = register_name_to_num[reg_name]
+        index = reg_name if type(reg_name) == int else register_name_to_num[reg_name]
+
+        if index == register_name_to_num["PC"]:
+            self.pc = int(value) & MASK
+            return
 
-        if index == register_name_to_num["x0"]:
+        if index == 0:
             return 
 
-        self.regs[index] = value
+        self.regs[index] = int(value)
 
     def addPC(self, value):
-        self.setReg("PC", self.getReg("PC") + value)
+        self.pc = (self.pc + int(value)) & MASK
     
     def next(self):
-        pc = int(self.getReg("PC")) 
+        pc = self.pc
 
         if pc % 4 != 0:
             raise Exception("Bad pc")
@@ -61,14 +194,683 @@ class Emu:
         instr.resolve(self)
         self.addPC(4)
     
-    def run(self):
-        i = 0
-        while not self.stop:
+    def snapshot(self):
+        return Snapshot(self.regs[:32], self.pc, self.mem.snapshotPages(), self.debug_info[:],
+                        self.stop, self.counters())
+
+    # mutates state in place, the run loops and compiled blocks hold on to regs and the word view
+    def restore(self, snap):
+        self.regs[:32] = snap.regs
+        self.pc = snap.pc
+        self.mem.restorePages(snap.pages)
+        self.debug_info[:] = snap.debug_info
+        self.stop = snap.stop
+        (self.steps, self.loads, self.stores,
+         self.branches_taken, self.branches_not_taken) = snap.counters
+
+    def decodeProgram(self):
+        if self.code is None:
+            code = self.instrs.records() if isinstance(self.instrs, Image) else decode(self.instrs)
+            self.code = self.protect(code) if self.paged else code
+
+        return self.code
+
+    # instructions in pages without execute permission fault when reached
+    def protect(self, code):
+        return [record if self.mem.executable(index * 4) else (NO_EXEC, 0, 0, 0, 0)
+                for index, record in enumerate(code)]
+
+    def counters(self):
+        return (self.steps, self.loads, self.stores, self.branches_taken, self.branches_not_taken)
+
+    def statsSince(self, before, start):
+        deltas = [now - then for now, then in zip(self.counters(), before)]
+        return RunStats(deltas[0], time.perf_counter() - start, *deltas[1:])
+
+    # breakpoints patch the decoded record at pc and watchpoints swap the Lw and Sw handlers,
+    # so an emulator without any runs exactly the same loop as before. a callback of None
+    # pauses run() with self.paused set, otherwise a truthy return from the callback does
+
+    def addBreakpoint(self, pc, callback=None):
+        if pc & 3 or not 0 <= pc >> 2 < len(self.instrs):
+            raise Exception("Bad pc")
+
+        if not self.breakpoints:
+            # a private copy, the decoded program may be shared with a JIT or another Emu
+            self.code = list(self.decodeProgram())
+
+        original = self.breakpoints[pc][0] if pc in self.breakpoints else self.code[pc >> 2]
+        self.breakpoints[pc] = (original, callback)
+        self.code[pc >> 2] = (BREAKPOINT, 0, 0, 0, 0)
+
+    def removeBreakpoint(self, pc):
+        original, _ = self.breakpoints.pop(pc)
+        self.code[pc >> 2] = original
+
+    def addWatchpoint(self, addr, read=False, write=True, callback=None):
+        if addr & 3 or addr < 0 or addr >= len(self.mem):
+            raise Exception("Bad address")
+
+        if read:
+            self.read_watches[addr] = callback
+        if write:
+            self.write_watches[addr] = callback
+
+        self.swapMemoryHandlers()
+
+    def removeWatchpoint(self, addr):
+        self.read_watches.pop(addr, None)
+        self.write_watches.pop(addr, None)
+        self.swapMemoryHandlers()
+
+    # watches match the word containing the accessed address, so byte and halfword accesses fire too
+    def swapMemoryHandlers(self):
+        for cls in LOADS:
+            handler = self.memory_handlers[cls]
+            self.handlers[opcode_of[cls]] = partial(self.execLoadWatched, handler) if self.read_watches else handler
+
+        for cls in STORES:
+            handler = self.memory_handlers[cls]
+            self.handlers[opcode_of[cls]] = (partial(self.execStoreWatched, handler, STORE_MASKS[cls])
+                                             if self.write_watches else handler)
+
+    def pickLoop(self):
+        if self.debug:
+            return self.runResolve
+        elif self.profile:
+            return self.runProfiled
+        elif self.tracer is not None:
+            return self.runTraced
+        elif self.use_jit and not (self.paged or self.breakpoints or self.read_watches or self.write_watches):
+            return self.runJit
+
+        return self.runDecoded
+
+    def run(self, max_steps=None, timeout=None):
+        slices = self.runSlices(RUN_CHUNK, max_steps, timeout)
+
+        try:
+            while True:
+                next(slices)
+        except StopIteration as done:
+            return done.value
+
+    # runs `slice` instructions at a time and yields to the event loop in between
+    async def runAsync(self, slice=RUN_SLICE, max_steps=None, timeout=None):
+        slices = self.runSlices(slice, max_steps, timeout)
+
+        try:
+            while True:
+                next(slices)
+                await asyncio.sleep(0)
+        except StopIteration as done:
+            return done.value
+
+    # generator behind run and runAsync: yields after every slice and returns the RunStats
+    def runSlices(self, size, max_steps=None, timeout=None):
+        if size < 1:
+            raise Exception("Slice size must be at least 1")
+
+        execute = self.pickLoop()
+
+        # resuming from a breakpoint runs the instruction under it once instead of pausing again
+        if self.resume_break != self.pc:
+            self.resume_break = None
+        self.paused = None
+
+        before = self.counters()
+        start = time.perf_counter()
+        deadline = None if timeout is None else start + timeout
+        remaining = max_steps
+
+        # the budget is only looked at between slices, so the dispatch loops stay free of it
+        while not self.stop and self.paused is None:
+            if remaining is None:
+                chunk = size
+            elif remaining <= 0:
+                raise BudgetExceeded(f"Step budget of {max_steps} exhausted", self.statsSince(before, start))
+            else:
+                chunk = min(size, remaining)
+
+            retired = execute(chunk)
+
+            if remaining is not None:
+                remaining -= retired
+
+            if deadline is not None and not self.stop and self.paused is None and time.perf_counter() > deadline:
+                raise BudgetExceeded(f"Timeout of {timeout}s exceeded", self.statsSince(before, start))
+
+            if not self.stop and self.paused is None:
+                yield
+
+        return self.statsSince(before, start)
+
+    # each execute loop runs at most n instructions and returns how many were retired
+
+    def runDecoded(self, n):
+        code = self.decodeProgram()
+        handlers = self.handlers
+        pc = self.pc
+        retired = 0
+
+        try:
+            for retired in range(1, n + 1):
+                op, rd, r1, r2, imm = code[pc >> 2]
+                pc = handlers[op](pc, rd, r1, r2, imm)
+        except Halt as halt:
+            retired -= not halt.executed
+            pc = halt.pc
+        except BaseException:
+            retired -= 1
+            raise
+        finally:
+            self.pc = pc
+            self.steps += retired
+
+        return retired
+
+    # same as runDecoded plus a per pc counter, kept separate so the normal loop pays nothing for it
+    def runProfiled(self, n):
+        code = self.decodeProgram()
+
+        if self.profiler is None:
+            self.profiler = Profiler(self.instrs, code)
+
+        counts = self.profiler.counts
+        handlers = self.handlers
+        pc = self.pc
+        retired = 0
+
+        try:
+            for retired in range(1, n + 1):
+                op, rd, r1, r2, imm = code[pc >> 2]
+                counts[pc >> 2] += 1
+                pc = handlers[op](pc, rd, r1, r2, imm)
+        except Halt as halt:
+            retired -= not halt.executed
+            counts[pc >> 2] -= not halt.executed
+            pc = halt.pc
+        except BaseException:
+            retired -= 1
+            raise
+        finally:
+            self.pc = pc
+            self.steps += retired
+
+        return retired
+
+    # same as runDecoded, recording each matching instruction into the tracer's ring
+    def runTraced(self, n):
+        code = self.decodeProgram()
+        handlers = self.handlers
+        regs = self.regs
+        tracer = self.tracer
+        wanted, low, high = tracer.wanted, tracer.low, tracer.high
+        pc = self.pc
+        retired = 0
+
+        try:
+            for retired in range(1, n + 1):
+                op, rd, r1, r2, imm = code[pc >> 2]
+
+                if wanted[op] and low <= pc < high:
+                    next_pc = handlers[op](pc, rd, r1, r2, imm)
+                    tracer.record(pc, op, rd, regs[rd])
+                    pc = next_pc
+                else:
+                    pc = handlers[op](pc, rd, r1, r2, imm)
+        except Halt as halt:
+            retired -= not halt.executed
+            if halt.executed:
+                self.traceLast(pc, False)
+            pc = halt.pc
+        except BaseException:
+            retired -= 1
+            self.traceLast(pc, True)
+
+            if tracer.dump_on_error:
+                tracer.dump()
+            raise
+        finally:
+            self.pc = pc
+            self.steps += retired
+
+        return retired
+
+    # records the instruction that stopped or raised, which never got past its handler
+    def traceLast(self, pc, raised):
+        tracer = self.tracer
+
+        if 0 <= pc >> 2 < len(self.code):
+            op, rd = self.code[pc >> 2][:2]
+
+            if tracer.wanted[op] and tracer.low <= pc < tracer.high:
+                tracer.record(pc, op, rd, None if raised else self.regs[rd])
+
+    # tiered mode: blocks are interpreted and counted until they get hot, then run as compiled python
+    def runJit(self, n):
+        code = self.decodeProgram()
+
+        if self.jit is None:
+            self.jit = JIT(code, self.jit_threshold)
+
+        jit = self.jit
+        compiled = jit.compiled
+        handlers = self.handlers
+        regs = self.regs
+        words = self.words
+        pc = self.pc
+        retired = 0
+
+        try:
+            while retired < n and not self.stop:
+                block = compiled.get(pc)
+
+                if block is not None and block[1] <= n - retired:
+                    try:
+                        pc = block[0](regs, words, self)
+                    except BaseException:
+                        # the block stopped at fault_pc, what ran before it retired
+                        retired += (self.fault_pc - pc) >> 2
+                        pc = self.fault_pc
+                        raise
+
+                    retired += block[1]
+                else:
+                    for _ in range(min(jit.hit(pc), n - retired)):
+                        op, rd, r1, r2, imm = code[pc >> 2]
+                        pc = handlers[op](pc, rd, r1, r2, imm)
+                        retired += 1
+        except Halt as halt:
+            pc = halt.pc
+            retired += halt.executed
+        finally:
+            self.pc = pc
+            self.steps += retired
+
+        return retired
+
+    def runResolve(self, n):
+        retired = 0
+
+        while retired < n and not self.stop:
             self.next()
+            retired += 1
+
+        self.steps += retired
+        return retired
+
+    # decoded handlers: each takes the instruction's pc and fields and returns the next pc.
+    # results are wrapped back into the signed 32 bit range with (x + 2^31 & MASK) - 2^31
+
+    def execAdd(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = ((regs[r1] + regs[r2] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        return pc + 4
+
+    def execSub(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = ((regs[r1] - regs[r2] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        return pc + 4
 
-            i += 1
-            if i > 10000:
-                raise Exception("Loop")
+    def execXor(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = regs[r1] ^ regs[r2]
+        return pc + 4
+
+    def execOr(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = regs[r1] | regs[r2]
+        return pc + 4
+
+    def execAnd(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = regs[r1] & regs[r2]
+        return pc + 4
+
+    def execMul(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = ((regs[r1] * regs[r2] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        return pc + 4
+
+    def execMulh(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = (regs[r1] * regs[r2]) >> 32
+        return pc + 4
+
+    def execMulhsu(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = (regs[r1] * (regs[r2] & 0xFFFFFFFF)) >> 32
+        return pc + 4
+
+    def execMulhu(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = mulhu(regs[r1], regs[r2])
+        return pc + 4
+
+    # division follows RV32M: no trap on zero, see Binary.div
+
+    def execDiv(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = div(regs[r1], regs[r2])
+        return pc + 4
+
+    def execDivu(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = divu(regs[r1], regs[r2])
+        return pc + 4
+
+    def execRem(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = rem(regs[r1], regs[r2])
+        return pc + 4
+
+    def execRemu(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = remu(regs[r1], regs[r2])
+        return pc + 4
+
+    def execSlt(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = 1 if regs[r1] < regs[r2] else 0
+        return pc + 4
+
+    def execSltU(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = 1 if regs[r1] & 0xFFFFFFFF < regs[r2] & 0xFFFFFFFF else 0
+        return pc + 4
+
+    def execAddi(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = ((regs[r1] + imm + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        return pc + 4
+
+    def execJalr(self, pc, rd, r1, r2, imm):
+        target = (self.regs[r1] + imm) & 0xFFFFFFFF
+
+        if target & 3:
+            raise Exception("Bad pc")
+
+        self.regs[rd] = pc + 4
+        return target
+
+    def execLw(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        addr = regs[r1] + imm
+
+        if addr & 3 or addr < 0:
+            raise MemoryFault("Bad address", "read", addr, pc)
+
+        try:
+            regs[rd] = self.words[addr >> 2]
+        except IndexError:
+            raise MemoryFault("Bad address", "read", addr, pc)
+        self.loads += 1
+        return pc + 4
+
+    def execLb(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        addr = regs[r1] + imm
+
+        if addr < 0:
+            raise MemoryFault("Bad address", "read", addr, pc)
+
+        try:
+            regs[rd] = (self.bytes[addr] ^ 0x80) - 0x80
+        except IndexError:
+            raise MemoryFault("Bad address", "read", addr, pc)
+        self.loads += 1
+        return pc + 4
+
+    def execLbu(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        addr = regs[r1] + imm
+
+        if addr < 0:
+            raise MemoryFault("Bad address", "read", addr, pc)
+
+        try:
+            regs[rd] = self.bytes[addr]
+        except IndexError:
+            raise MemoryFault("Bad address", "read", addr, pc)
+        self.loads += 1
+        return pc + 4
+
+    def execLh(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        addr = regs[r1] + imm
+
+        if addr & 1 or addr < 0:
+            raise MemoryFault("Bad address", "read", addr, pc)
+
+        try:
+            regs[rd] = (self.halves[addr >> 1] ^ 0x8000) - 0x8000
+        except IndexError:
+            raise MemoryFault("Bad address", "read", addr, pc)
+        self.loads += 1
+        return pc + 4
+
+    def execLhu(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        addr = regs[r1] + imm
+
+        if addr & 1 or addr < 0:
+            raise MemoryFault("Bad address", "read", addr, pc)
+
+        try:
+            regs[rd] = self.halves[addr >> 1]
+        except IndexError:
+            raise MemoryFault("Bad address", "read", addr, pc)
+        self.loads += 1
+        return pc + 4
+
+    def execSlti(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = 1 if regs[r1] < imm else 0
+        return pc + 4
+
+    def execSltiU(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        regs[rd] = 1 if regs[r1] & 0xFFFFFFFF < imm & 0xFFFFFFFF else 0
+        return pc + 4
+
+    def execBeq(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        if regs[r1] == regs[r2]:
+            self.branches_taken += 1
+            return pc + imm
+        self.branches_not_taken += 1
+        return pc + 4
+
+    def execBne(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        if regs[r1] != regs[r2]:
+            self.branches_taken += 1
+            return pc + imm
+        self.branches_not_taken += 1
+        return pc + 4
+
+    def execBlt(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        if regs[r1] < regs[r2]:
+            self.branches_taken += 1
+            return pc + imm
+        self.branches_not_taken += 1
+        return pc + 4
+
+    def execBge(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        if regs[r1] >= regs[r2]:
+            self.branches_taken += 1
+            return pc + imm
+        self.branches_not_taken += 1
+        return pc + 4
+
+    def execJal(self, pc, rd, r1, r2, imm):
+        self.regs[rd] = pc + 4
+        return pc + imm
+
+    def execLui(self, pc, rd, r1, r2, imm):
+        self.regs[rd] = (((imm & 0xFFFFF) << 12) ^ 0x80000000) - 0x80000000
+        return pc + 4
+
+    def execSw(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        addr = regs[r1] + imm
+
+        if addr & 3 or addr < 0:
+            raise MemoryFault("Bad address", "write", addr, pc)
+
+        try:
+            self.words[addr >> 2] = regs[r2]
+        except IndexError:
+            raise MemoryFault("Bad address", "write", addr, pc)
+        self.written[addr >> 12] = 1
+        self.stores += 1
+        return pc + 4
+
+    def execSb(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        addr = regs[r1] + imm
+
+        if addr < 0:
+            raise MemoryFault("Bad address", "write", addr, pc)
+
+        try:
+            self.bytes[addr] = regs[r2] & 0xFF
+        except IndexError:
+            raise MemoryFault("Bad address", "write", addr, pc)
+        self.written[addr >> 12] = 1
+        self.stores += 1
+        return pc + 4
+
+    def execSh(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        addr = regs[r1] + imm
+
+        if addr & 1 or addr < 0:
+            raise MemoryFault("Bad address", "write", addr, pc)
+
+        try:
+            self.halves[addr >> 1] = regs[r2] & 0xFFFF
+        except IndexError:
+            raise MemoryFault("Bad address", "write", addr, pc)
+        self.written[addr >> 12] = 1
+        self.stores += 1
+        return pc + 4
+
+    def execBreakpoint(self, pc, rd, r1, r2, imm):
+        original, callback = self.breakpoints[pc]
+
+        if pc == self.resume_break:
+            self.resume_break = None
+        elif callback is None or callback(self, pc):
+            self.paused = f"breakpoint at {pc}"
+            self.resume_break = pc
+            raise Halt(pc, executed=False)
+
+        return self.handlers[original[0]](pc, *original[1:])
+
+    def execLoadWatched(self, handler, pc, rd, r1, r2, imm):
+        addr = self.regs[r1] + imm
+        next_pc = handler(pc, rd, r1, r2, imm)
+        self.watched(self.read_watches, "read", pc, addr & ~3, self.regs[rd], next_pc)
+        return next_pc
+
+    def execStoreWatched(self, handler, mask, pc, rd, r1, r2, imm):
+        addr = self.regs[r1] + imm
+        next_pc = handler(pc, rd, r1, r2, imm)
+        self.watched(self.write_watches, "write", pc, addr & ~3, self.regs[r2] & mask, next_pc)
+        return next_pc
+
+    # watchpoints fire after the access, so a pause resumes at the next instruction
+    def watched(self, watches, kind, pc, addr, value, next_pc):
+        if addr not in watches:
+            return
+
+        callback = watches[addr]
+
+        if callback is None or callback(self, pc, addr, value):
+            self.paused = f"{kind} of {addr} at {pc}"
+            raise Halt(next_pc)
+
+    # paged memory: the most recently used page is read or written directly, anything else
+    # goes through the page table with its permission and bounds checks
+
+    def execLwPaged(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        mem = self.mem
+        addr = regs[r1] + imm
+
+        if addr >> 12 == mem.read_page and not addr & 3:
+            regs[rd] = mem.read_words[(addr & 0xFFF) >> 2]
+        else:
+            regs[rd] = mem.loadWord(addr, pc)
+        self.loads += 1
+        return pc + 4
+
+    def execSwPaged(self, pc, rd, r1, r2, imm):
+        regs = self.regs
+        mem = self.mem
+        addr = regs[r1] + imm
+
+        if addr >> 12 == mem.write_page and not addr & 3:
+            mem.write_words[(addr & 0xFFF) >> 2] = regs[r2]
+        else:
+            mem.storeWord(addr, regs[r2], pc)
+        self.stores += 1
+        return pc + 4
+
+    # byte and halfword accesses are rarer than words, so on paged memory they skip the MRU fast path
+    def execLbPaged(self, pc, rd, r1, r2, imm):
+        self.regs[rd] = (self.mem.loadByte(self.regs[r1] + imm, pc) ^ 0x80) - 0x80
+        self.loads += 1
+        return pc + 4
+
+    def execLbuPaged(self, pc, rd, r1, r2, imm):
+        self.regs[rd] = self.mem.loadByte(self.regs[r1] + imm, pc)
+        self.loads += 1
+        return pc + 4
+
+    def execLhPaged(self, pc, rd, r1, r2, imm):
+        self.regs[rd] = (self.mem.loadHalf(self.regs[r1] + imm, pc) ^ 0x8000) - 0x8000
+        self.loads += 1
+        return pc + 4
+
+    def execLhuPaged(self, pc, rd, r1, r2, imm):
+        self.regs[rd] = self.mem.loadHalf(self.regs[r1] + imm, pc)
+        self.loads += 1
+        return pc + 4
+
+    def execSbPaged(self, pc, rd, r1, r2, imm):
+        self.mem.storeByte(self.regs[r1] + imm, self.regs[r2], pc)
+        self.stores += 1
+        return pc + 4
+
+    def execShPaged(self, pc, rd, r1, r2, imm):
+        self.mem.storeHalf(self.regs[r1] + imm, self.regs[r2], pc)
+        self.stores += 1
+        return pc + 4
+
+    def execDebugPaged(self, pc, rd, r1, r2, imm):
+        self.debug_info.append(self.mem.loadWord(self.regs[2] - 4, pc))
+        return pc + 4
+
+    def execNoExec(self, pc, rd, r1, r2, imm):
+        raise MemoryFault("Permission denied", "execute", pc, pc)
+
+    def execStop(self, pc, rd, r1, r2, imm):
+        self.stop = True
+        raise Halt(pc + 4)
+
+    def execDebug(self, pc, rd, r1, r2, imm):
+        self.debug_info.append(self.words[(self.regs[2] - 4) >> 2])
+        return pc + 4
+
+    def execRaiseError(self, pc, rd, r1, r2, imm):
+        raise Exception("RaiseError instruction")
+
+    # resolve path: walks Instruction objects directly, used when debugging
     
     def resolveComment(self, instr):
         pass
@@ -93,6 +895,27 @@ class Emu:
     
     def resolveDiv(self, div):
         self.resolveRType(div, lambda x, y : x / y)
+
+    def resolveRem(self, rem):
+        self.resolveRType(rem, lambda x, y : x % y)
+
+    def resolveMType(self, instr, op):
+        self.resolveRType(instr, lambda x, y : Binary(op(int(x), int(y))))
+
+    def resolveDivu(self, divu_):
+        self.resolveMType(divu_, divu)
+
+    def resolveRemu(self, remu_):
+        self.resolveMType(remu_, remu)
+
+    def resolveMulh(self, mulh_):
+        self.resolveMType(mulh_, mulh)
+
+    def resolveMulhsu(self, mulhsu_):
+        self.resolveMType(mulhsu_, mulhsu)
+
+    def resolveMulhu(self, mulhu_):
+        self.resolveMType(mulhu_, mulhu)
     
     def resolveXor(self, xor):
         self.resolveRType(xor, lambda x, y : x.bitwiseXor(y))
@@ -115,16 +938,32 @@ class Emu:
     
     def resolveLw(self, lw):
         addr = int(self.getReg(lw.r1) + lw.imm)
+        self.setReg(lw.rd, self.mem.loadWord(addr, self.pc))
+        self.loads += 1
+    
+    def resolveLb(self, lb):
+        addr = int(self.getReg(lb.r1) + lb.imm)
+        self.setReg(lb.rd, Binary((self.mem.loadByte(addr, self.pc) ^ 0x80) - 0x80))
+        self.loads += 1
 
-        if addr % 4 != 0:
-            raise Exception("Bad address")
-        
-        index = addr // 4
-        self.setReg(lw.rd, self.mem[index])
+    def resolveLbu(self, lbu):
+        addr = int(self.getReg(lbu.r1) + lbu.imm)
+        self.setReg(lbu.rd, Binary(self.mem.loadByte(addr, self.pc)))
+        self.loads += 1
+
+    def resolveLh(self, lh):
+        addr = int(self.getReg(lh.r1) + lh.imm)
+        self.setReg(lh.rd, Binary((self.mem.loadHalf(addr, self.pc) ^ 0x8000) - 0x8000))
+        self.loads += 1
+
+    def resolveLhu(self, lhu):
+        addr = int(self.getReg(lhu.r1) + lhu.imm)
+        self.setReg(lhu.rd, Binary(self.mem.loadHalf(addr, self.pc)))
+        self.loads += 1
     
     def resolveJalr(self, jalr):
         retvalue = self.getReg(jalr.r1)
-        self.setReg("ra", self.getReg("PC") + 4)
+        self.setReg(jalr.rd, self.getReg("PC") + 4)
         self.setReg("PC", retvalue + jalr.imm - 4)
     
     def resolveSlti(self, slti):
@@ -134,14 +973,17 @@ class Emu:
 
     def resolveSltiU(self, sltiU):
         r1_value = self.getReg(sltiU.r1)
-        res = Binary(1) if r1_value.uint() < sltiU.imm.uint() else Binary(0)
+        res = Binary(1) if r1_value.uint() < Binary(sltiU.imm).uint() else Binary(0)
         self.setReg(sltiU.rd, res)
 
     def resolveBType(self, instr, cmp):
         r1_value = self.getReg(instr.r1)
         r2_value = self.getReg(instr.r2)
         if cmp(r1_value, r2_value):
-            self.addPC(int(instr.imm) - 4)
+            self.addPC(instr.imm - 4)
+            self.branches_taken += 1
+        else:
+            self.branches_not_taken += 1
     
     def resolveBeq(self, beq):
         self.resolveBType(beq, lambda x, y : x == y)
@@ -158,17 +1000,26 @@ class Emu:
 
     def resolveSw(self, sw):
         addr = int(self.getReg(sw.r1) + sw.imm)
+        self.mem.storeWord(addr, int(self.getReg(sw.r2)), self.pc)
+        self.stores += 1
 
-        if addr % 4 != 0 or addr < 0:
-            raise Exception("Bad address")
-        
-        index = addr // 4
-        self.mem[index] = self.getReg(sw.r2)
+    def resolveSb(self, sb):
+        addr = int(self.getReg(sb.r1) + sb.imm)
+        self.mem.storeByte(addr, int(self.getReg(sb.r2)), self.pc)
+        self.stores += 1
+
+    def resolveSh(self, sh):
+        addr = int(self.getReg(sh.r1) + sh.imm)
+        self.mem.storeHalf(addr, int(self.getReg(sh.r2)), self.pc)
+        self.stores += 1
     
     def resolveDebug(self, debug):
-        self.debug_info.append(int(self.mem[(int(self.getReg("sp")) - 4) // 4]))
+        self.debug_info.append(self.mem.loadWord(int(self.getReg("sp")) - 4, self.pc))
 
     
+    def resolveLui(self, lui):
+        self.setReg(lui.rd, Binary(lui.imm << 12))
+
     def resolveJal(self, jal):
         self.setReg(jal.rd, self.getReg("PC") + 4)
         self.setReg("PC", self.getReg("PC") + jal.imm - 4)
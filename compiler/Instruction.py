@@ -1,229 +1,560 @@
-from Emu import Binary
+from Binary import Binary
+
+register_name_to_num = {"x0":0, "zero":0, "x1":1, "ra":1,
+                        "x2":2, "sp":2, "x3":3, "gp":3,
+                        "x4":4, "tp":4, "x5":5, "t0":5,
+                        "x6":6, "t1":6, "x7":7, "t2":7,
+                        "x8":8, "s0":8, "fp":8,
+                        "x9":9, "s1":9, "x10":10, "a0":10,
+                        "x11":11, "a1":11, "x12":12, "a2":12,
+                        "x13":13, "a3":13, "x14":14, "a4":14,
+                        "x15":15, "a5":15, "x16":16, "a6":16,
+                        "x17":17, "a7":17, "x18":18, "s2":18,
+                        "x19":19, "s3":19, "x20":20, "s4":20,
+                        "x21":21, "s5":21, "x22":22, "s6":22,
+                        "x23":23, "s7":23, "x24":24, "s8":24,
+                        "x25":25, "s9":25, "x26":26, "s10":26,
+                        "x27":27, "s11":27, "x28":28, "t3":28,
+                        "x29":29, "t4":29, "x30":30, "t5":30,
+                        "x31":31, "at":31, "PC": 32
+                        }
+
+# the name str() prints for each register number, x0 keeps its x name like the compiler writes it
+reg_names = ["x0"] + [next(name for name, num in register_name_to_num.items() if num == i and name != f"x{i}")
+                      for i in range(1, 32)]
+
+# instructions hold register numbers, names are looked up once when they are built. PC is left
+# out since no instruction can name it
+reg_nums = {name : num for name, num in register_name_to_num.items() if name != "PC"} | {i : i for i in range(32)}
+
+def regNum(name):
+    if name not in reg_nums:
+        raise Exception(f"Bad reg: {name}")
+
+    return reg_nums[name]
+
+# an immediate can also name a Label, the linker replaces it with the label's offset or address
+def immediate(imm):
+    if type(imm) == int and -0x80000000 <= imm <= 0x7FFFFFFF:
+        return imm
+
+    if type(imm) == str:
+        return imm
+
+    return int(Binary(imm))
 
 class Instruction:
-    def __init__(self):
-        self.comment = ""
+    __slots__ = ()
 
     def resolve(self, emu):
         attr = emu.__getattribute__(f"resolve{type(self).__name__}")
         attr(self)
     
-    def padComment(self, str):
+    def padComment(self, str, comment=""):
         str += "".join([" " for _ in range(20 - len(str))])
-        return str + f"{self.comment}"
+        return str + comment
 
+    # instructions without operands print as their name
+    def __str__(self):
+        return self.padComment(type(self).__name__.lower())
+
+# marks a position for branches and jumps to name, it takes no space once linked
+class Label(Instruction):
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.padComment(f"{self.name}:")
+
+# a flattened program. comments live in a side table keyed by index instead of on every instruction
+class Program(list):
+    def __init__(self, instrs=(), comments=None):
+        super().__init__(instrs)
+        self.comments = comments if comments is not None else {}
+
+    def comment(self, index):
+        return self.comments.get(index, "")
+
+    def __str__(self):
+        return "".join(str(instr) + self.comment(i) + "\n" for i, instr in enumerate(self))
+
+# ropes this short are copied into one leaf when joined, which keeps the node count (and the
+# garbage collector's work) down while concatenation stays O(1)
+LEAF_SIZE = 32
 
+# an immutable rope of instructions. a leaf holds a tuple of Instruction objects plus the comments
+# on them by offset, and an inner node joins two ropes, so concatenation never copies more than
+# LEAF_SIZE instructions. lengths and the end leaves are cached because the compiler asks for them
+# at every nesting level
 class Instructions:
+    __slots__ = ("items", "notes", "left", "right", "length", "first_leaf", "last_leaf")
+
     def __init__(self, *args):
-        self.instr = list(iter(args))
-    
+        self.items = args
+        self.notes = None
+        self.left = None
+        self.right = None
+        self.length = len(args)
+        self.first_leaf = self
+        self.last_leaf = self
+
+    @staticmethod
+    def fromProgram(program):
+        leaf = Instructions(*program)
+        leaf.notes = dict(program.comments) or None
+        return leaf
+
+    @staticmethod
+    def join(left, right):
+        if not right.length:
+            return left
+
+        if not left.length:
+            return right
+
+        if left.length + right.length <= LEAF_SIZE:
+            return Instructions.merge(left, right)
+
+        # appending a few instructions to a rope that ends in a short leaf grows that leaf
+        if left.items is None and left.right.length + right.length <= LEAF_SIZE:
+            return Instructions.join(left.left, Instructions.merge(left.right, right))
+
+        node = Instructions()
+        node.items = None
+        node.left = left
+        node.right = right
+        node.length = left.length + right.length
+        node.first_leaf = left.first_leaf
+        node.last_leaf = right.last_leaf
+        return node
+
+    @staticmethod
+    def merge(left, right):
+        first, second = left.leaf(), right.leaf()
+        leaf = Instructions()
+        leaf.items = first.items + second.items
+        leaf.length = len(leaf.items)
+
+        if first.notes or second.notes:
+            leaf.notes = dict(first.notes or {})
+
+            for i, text in (second.notes or {}).items():
+                leaf.notes[i + first.length] = text
+
+        return leaf
+
+    # short ropes are always leaves already, since join merges them
+    def leaf(self):
+        return self if self.items is not None else Instructions.fromProgram(self.flatten())
+
     def __add__(self, o):
         if type(o) == Instructions:
-            self.instr += o.instr
-        elif isinstance(o, Instruction):
-            self.instr.append(o)
-        else:
-            raise Exception(f"Unexpected type {type(o)}")
+            return Instructions.join(self, o)
 
-        return self
-    
-    def __iadd__(self, o):
-        return self + o
-    
+        if isinstance(o, Instruction):
+            return Instructions.join(self, Instructions(o))
+
+        raise Exception(f"Unexpected type {type(o)}")
+
+    @property
+    def first(self):
+        return self.first_leaf.items[0] if self.length else None
+
+    @property
+    def last(self):
+        return self.last_leaf.items[-1] if self.length else None
+
+    # comments return a new rope like every other operation, leaves can be shared between ropes
     def commentFirst(self, text):
-        if self.instr:
-            self.instr[0].comment = text
-        return self
-    
+        return self.withNote(False, text)
+
     def commentLast(self, text):
-        if self.instr:
-            self.instr[-1].comment = text
-        return self
-    
+        return self.withNote(True, text)
+
+    # copies only the leaf at the start or end and the nodes above it, the rest stays shared
+    def withNote(self, at_end, text):
+        if not self.length:
+            return self
+
+        path = []
+        node = self
+
+        while node.items is None:
+            path.append(node)
+            node = node.right if at_end else node.left
+
+        rope = Instructions(*node.items)
+        rope.notes = dict(node.notes or {})
+        rope.notes[len(node.items) - 1 if at_end else 0] = text
+
+        for parent in reversed(path):
+            left, right = (parent.left, rope) if at_end else (rope, parent.right)
+            rope = Instructions()
+            rope.items = None
+            rope.left = left
+            rope.right = right
+            rope.length = parent.length
+            rope.first_leaf = left.first_leaf
+            rope.last_leaf = right.last_leaf
+
+        return rope
+
+    # the rope without its last n instructions, rebuilding only the right spine
+    def dropLast(self, n):
+        lefts = []
+        node = self
+
+        while node.items is None:
+            if n >= node.right.length:
+                n -= node.right.length
+                node = node.left
+            else:
+                lefts.append(node.left)
+                node = node.right
+
+        keep = max(len(node.items) - n, 0)
+        rest = Instructions(*node.items[:keep])
+
+        if node.notes:
+            rest.notes = {i : text for i, text in node.notes.items() if i < keep} or None
+
+        for left in reversed(lefts):
+            rest = Instructions.join(left, rest)
+
+        return rest
+
+    # ropes nest as deep as the program, so this walks them with an explicit stack
+    def flatten(self):
+        flat = Program()
+        todo = [self]
+
+        while todo:
+            node = todo.pop()
+
+            if node.items is not None:
+                if node.notes:
+                    for i, text in node.notes.items():
+                        flat.comments[len(flat) + i] = text
+
+                flat.extend(node.items)
+            else:
+                todo.append(node.right)
+                todo.append(node.left)
+
+        return flat
+
     def __getitem__(self, idx):
-        return self.instr[idx]
-    
-    def __setitem__(self, idx, value):
-        self.instr[idx] = value
-    
+        if isinstance(idx, slice):
+            return self.flatten()[idx]
+
+        if idx < 0:
+            idx += self.length
+
+        if not 0 <= idx < self.length:
+            raise IndexError(idx)
+
+        node = self
+
+        while node.items is None:
+            if idx < node.left.length:
+                node = node.left
+            else:
+                idx -= node.left.length
+                node = node.right
+
+        return node.items[idx]
+
     def __iter__(self):
-        return iter(self.instr)
-    
+        return iter(self.flatten())
+
     def __str__(self):
-        return "".join(str(i) + "\n" for i in self)
-    
+        return str(self.flatten())
+
     def __len__(self):
-        return len(self.instr)
+        return self.length
 
 class RType(Instruction):
+    __slots__ = ("rd", "r1", "r2")
+
     def __init__(self, rd, r1, r2):
-        super().__init__()
-        self.rd = rd
-        self.r1 = r1
-        self.r2 = r2
+        self.rd = regNum(rd)
+        self.r1 = regNum(r1)
+        self.r2 = regNum(r2)
     
     def __str__(self):
         op = type(self).__name__.lower()
-        return self.padComment(f"{op} {self.rd} {self.r1} {self.r2}")
+        return self.padComment(f"{op} {reg_names[self.rd]} {reg_names[self.r1]} {reg_names[self.r2]}")
 
 class Add(RType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, r2):
         super().__init__(rd, r1, r2)
     
 class Sub(RType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, r2):
         super().__init__(rd, r1, r2)
     
 class Xor(RType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, r2):
         super().__init__(rd, r1, r2)
     
 class Or(RType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, r2):
         super().__init__(rd, r1, r2)
     
 class And(RType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, r2):
         super().__init__(rd, r1, r2)
 
 class Mul(RType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, r2):
         super().__init__(rd, r1, r2)
 
 class Div(RType):
+    __slots__ = ()
+
+    def __init__(self, rd, r1, r2):
+        super().__init__(rd, r1, r2)
+
+class Divu(RType):
+    __slots__ = ()
+
+    def __init__(self, rd, r1, r2):
+        super().__init__(rd, r1, r2)
+
+class Rem(RType):
+    __slots__ = ()
+
+    def __init__(self, rd, r1, r2):
+        super().__init__(rd, r1, r2)
+
+class Remu(RType):
+    __slots__ = ()
+
+    def __init__(self, rd, r1, r2):
+        super().__init__(rd, r1, r2)
+
+class Mulh(RType):
+    __slots__ = ()
+
+    def __init__(self, rd, r1, r2):
+        super().__init__(rd, r1, r2)
+
+class Mulhsu(RType):
+    __slots__ = ()
+
+    def __init__(self, rd, r1, r2):
+        super().__init__(rd, r1, r2)
+
+class Mulhu(RType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, r2):
         super().__init__(rd, r1, r2)
 
 class Slt(RType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, r2):
         super().__init__(rd, r1, r2)
 
 class SltU(RType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, r2):
         super().__init__(rd, r1, r2)
 
 
 class IType(Instruction):
+    __slots__ = ("rd", "r1", "imm")
+
     def __init__(self, rd, r1, imm):
-        super().__init__()
-        self.rd = rd
-        self.r1 = r1
-
-        if type(imm) == float or type(imm) == int:
-            imm = Binary(imm)
-            
-        self.imm = imm
+        self.rd = regNum(rd)
+        self.r1 = regNum(r1)
+        self.imm = immediate(imm)
     
     def __str__(self):
         op = type(self).__name__.lower()
-        return self.padComment(f"{op} {self.rd} {self.r1} {int(self.imm)}")
+        return self.padComment(f"{op} {reg_names[self.rd]} {reg_names[self.r1]} {self.imm}")
 
 class Addi(IType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, imm):
         super().__init__(rd, r1, imm)
 
 class Jalr(IType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, imm):
         super().__init__(rd, r1, imm)
 
 class Lw(IType):
+    __slots__ = ()
+
+    def __init__(self, rd, r1, imm):
+        super().__init__(rd, r1, imm)
+
+class Lb(IType):
+    __slots__ = ()
+
+    def __init__(self, rd, r1, imm):
+        super().__init__(rd, r1, imm)
+
+class Lbu(IType):
+    __slots__ = ()
+
+    def __init__(self, rd, r1, imm):
+        super().__init__(rd, r1, imm)
+
+class Lh(IType):
+    __slots__ = ()
+
+    def __init__(self, rd, r1, imm):
+        super().__init__(rd, r1, imm)
+
+class Lhu(IType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, imm):
         super().__init__(rd, r1, imm)
 
 class Slti(IType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, imm):
         super().__init__(rd, r1, imm)
 
 class SltiU(IType):
+    __slots__ = ()
+
     def __init__(self, rd, r1, imm):
         super().__init__(rd, r1, imm)
 
 class BType(Instruction):
+    __slots__ = ("r1", "r2", "imm")
+
     def __init__(self, r1, r2, imm):
-        super().__init__()
-        self.r1 = r1
-        self.r2 = r2
-        
-        if type(imm) == float or type(imm) == int:
-            imm = Binary(imm)
-
-        self.imm = imm
+        self.r1 = regNum(r1)
+        self.r2 = regNum(r2)
+        self.imm = immediate(imm)
     
     def __str__(self):
         op = type(self).__name__.lower()
-        return self.padComment(f"{op} {self.r1} {self.r2} {int(self.imm)}")
+        return self.padComment(f"{op} {reg_names[self.r1]} {reg_names[self.r2]} {self.imm}")
 
 class Beq(BType):
+    __slots__ = ()
+
     def __init__(self, r1, r2, imm):
         super().__init__(r1, r2, imm)
 
-    def __str__(self):
-        op = type(self).__name__.lower()
-        return self.padComment(f"{op} {self.r1} {self.r2} {int(self.imm)}")
-
 class Bne(BType):
+    __slots__ = ()
+
     def __init__(self, r1, r2, imm):
         super().__init__(r1, r2, imm)
 
 class Blt(BType):
+    __slots__ = ()
+
     def __init__(self, r1, r2, imm):
         super().__init__(r1, r2, imm)
 
 class Bge(BType):
+    __slots__ = ()
+
     def __init__(self, r1, r2, imm):
         super().__init__(r1, r2, imm)
 
 
 class JType(Instruction):
-    def __init__(self, rd, imm):
-        super().__init__()
-        self.rd = rd
-
-        if type(imm) == float or type(imm) == int:
-            imm = Binary(imm)
+    __slots__ = ("rd", "imm")
 
-        self.imm = imm
+    def __init__(self, rd, imm):
+        self.rd = regNum(rd)
+        self.imm = immediate(imm)
 
     def __str__(self):
         op = type(self).__name__.lower()
-        return self.padComment(f"{op} {self.rd} {int(self.imm)}")
+        return self.padComment(f"{op} {reg_names[self.rd]} {self.imm}")
 
 class Jal(JType):
+    __slots__ = ()
+
     def __init__(self, rd, imm):
         super().__init__(rd, imm)
 
-class FutureBeq(Beq):
-    def __init__(self, r1, r2):
-        super().__init__(r1, r2, None)
-    
+
+# imm is the upper 20 bits of the value, as an unsigned number
+class UType(Instruction):
+    __slots__ = ("rd", "imm")
+
+    def __init__(self, rd, imm):
+        self.rd = regNum(rd)
+        self.imm = immediate(imm)
+
     def __str__(self):
-        return self.padComment("FUTURE BEQ")
+        op = type(self).__name__.lower()
+        return self.padComment(f"{op} {reg_names[self.rd]} {self.imm}")
+
+class Lui(UType):
+    __slots__ = ()
+
+    def __init__(self, rd, imm):
+        super().__init__(rd, imm)
+
 
 class SType(Instruction):
+    __slots__ = ("r1", "r2", "imm")
+
     def __init__(self, r1, r2, imm):
-        super().__init__()
-        self.r1 = r1
-        self.r2 = r2
-        self.imm = imm
+        self.r1 = regNum(r1)
+        self.r2 = regNum(r2)
+        self.imm = immediate(imm)
 
     def __str__(self):
         op = type(self).__name__.lower()
-        return self.padComment(f"{op} {self.r1} {self.r2} {self.imm}")
+        return self.padComment(f"{op} {reg_names[self.r1]} {reg_names[self.r2]} {self.imm}")
 
 class Sw(SType):
+    __slots__ = ()
+
+    def __init__(self, r1, r2, imm):
+        super().__init__(r1, r2, imm)
+
+class Sb(SType):
+    __slots__ = ()
+
+    def __init__(self, r1, r2, imm):
+        super().__init__(r1, r2, imm)
+
+class Sh(SType):
+    __slots__ = ()
+
     def __init__(self, r1, r2, imm):
         super().__init__(r1, r2, imm)
 
 class Stop(Instruction):
-    def __init__(self):
-        super().__init__()
+    __slots__ = ()
 
-class Debug(Instruction):
-    def __init__(self):
-        super().__init__()
 
-class RaiseError(Instruction):
-    def __init__(self):
-        super().__init__()
+class Debug(Instruction):
+    __slots__ = ()
 
 
+class RaiseError(Instruction):
+    __slots__ = ()
@@ -1,52 +1,270 @@
+import io
+import re
+
 from Instruction import *
-from Emu import register_name_to_num
-import Instruction
+from Decoder import OPCODES
+from RV32 import encode, decodeWord, MAGIC
 
-def verify(reg):
-      if reg not in register_name_to_num:
-            raise Exception(f"Bad reg: {reg}")
+# assembly reads the text Instruction.__str__ writes: one instruction per line, operands split by
+# spaces or commas, and anything after # or ; is a comment. lines can start with labels ("loop:"),
+# branch and jump targets can name a label, and ".word" places raw words
 
-instr_classes = list(filter(lambda x : x[0] != "_", list(Instruction.__dict__.keys())))
-instr_classes = list(map(lambda x : Instruction.__dict__[x], instr_classes))
+mnemonics = {cls.__name__.lower() : cls for cls in OPCODES}
 
-instr_to_class = dict(zip(map(lambda x : x.__name__.lower(), instr_classes), instr_classes))
+LABEL = re.compile(r"\s*([A-Za-z_.][\w.]*):")
+COMMENT = re.compile(r"[#;]")
 
-def parse(asm):
+class AssemblerError(Exception):
+    def __init__(self, lineno, message):
+        super().__init__(f"line {lineno}: {message}")
+        self.lineno = lineno
+
+class Line:
+    __slots__ = ("lineno", "labels", "op", "args", "comment")
+
+    def __init__(self, lineno, labels, op, args, comment):
+        self.lineno = lineno
+        self.labels = labels
+        self.op = op
+        self.args = args
+        self.comment = comment
+
+    # instructions and .word values take one word each
+    def size(self):
+        if self.op is None:
+            return 0
+
+        return 4 * max(len(self.args), 1) if self.op == ".word" else 4
+
+def scan(f):
+    for lineno, text in enumerate(f, 1):
+        comment = ""
+        match = COMMENT.search(text)
+
+        if match:
+            text, comment = text[:match.start()], text[match.start():].rstrip()
+
+        labels = []
+        while match := LABEL.match(text):
+            labels.append(match.group(1))
+            text = text[match.end():]
+
+        fields = text.replace(",", " ").split()
+
+        if not fields and not labels:
+            continue
+
+        op = fields[0].lower() if fields else None
+        yield Line(lineno, labels, op, fields[1:], comment)
+
+# first pass, label -> byte address
+def collectSymbols(f):
+    symbols = {}
+    pc = 0
+
+    for line in scan(f):
+        for label in line.labels:
+            if label in symbols:
+                raise AssemblerError(line.lineno, f"Duplicate label {label}")
+
+            symbols[label] = pc
+
+        pc += line.size()
+
+    return symbols
+
+def register(line, name):
+    if name.lower() not in register_name_to_num or name.lower() == "pc":
+        raise AssemblerError(line.lineno, f"Bad reg: {name}")
+
+    return register_name_to_num[name.lower()]
+
+# a number, or a label. branches and jumps are relative to their own address, everything else
+# gets the label's address
+def value(line, text, symbols, pc, relative):
+    try:
+        return int(text, 0)
+    except ValueError:
+        pass
+
+    if text not in symbols:
+        raise AssemblerError(line.lineno, f"Unknown label {text}")
+
+    return symbols[text] - pc if relative else symbols[text]
+
+def operands(line, count):
+    if len(line.args) != count:
+        raise AssemblerError(line.lineno, f"{line.op} takes {count} operands, got {len(line.args)}")
+
+    return line.args
+
+def build(line, symbols, pc):
+    if line.op not in mnemonics:
+        raise AssemblerError(line.lineno, f"Unknown instruction {line.op}")
+
+    cls = mnemonics[line.op]
+
+    if issubclass(cls, RType):
+        rd, r1, r2 = operands(line, 3)
+        return cls(register(line, rd), register(line, r1), register(line, r2))
+
+    if issubclass(cls, (IType, SType)):
+        a, b, imm = operands(line, 3)
+        return cls(register(line, a), register(line, b), value(line, imm, symbols, pc, False))
+
+    if issubclass(cls, BType):
+        r1, r2, imm = operands(line, 3)
+        return cls(register(line, r1), register(line, r2), value(line, imm, symbols, pc, True))
+
+    if issubclass(cls, JType):
+        rd, imm = operands(line, 2)
+        return cls(register(line, rd), value(line, imm, symbols, pc, True))
+
+    if issubclass(cls, UType):
+        rd, imm = operands(line, 2)
+        return cls(register(line, rd), value(line, imm, symbols, pc, False))
+
+    operands(line, 0)
+    return cls()
+
+# second pass, yields (line, Instruction or raw .word value, comment)
+def statements(f, symbols):
+    pc = 0
+
+    for line in scan(f):
+        if line.op is None:
+            continue
+
+        if line.op == ".word":
+            if not line.args:
+                raise AssemblerError(line.lineno, ".word needs a value")
 
-    instr_list = "".join(asm.split(",")).lower()
-    instr_list = asm.splitlines()
-    instr_list = list(filter(lambda x : x[0] != "#" and x[0] != ";", instr_list))
-
-    output = []
-
-    for line in instr_list:
-        args = line.split(" ")
-        op = instr_to_class[args[0]]
-
-        instr_type = op.__bases__[0]
-
-
-        if instr_type == RType:
-                verify(args[1])
-                verify(args[2])
-                verify(args[3])
-                output.append(op(args[1], args[2], args[3]))
-        elif instr_type == IType or instr_type == BType:
-                verify(args[1])
-                verify(args[2])
-                output.append(op(args[1], args[2], args[3]))
-        elif instr_type == JType:
-                verify(args[1])
-                verify(args[2])
-                output.append(op(args[1], args[2]))
-        elif op == Stop:
-              output.append(Stop())
+            for i, arg in enumerate(line.args):
+                yield line, value(line, arg, symbols, pc, False) & 0xFFFFFFFF, line.comment if i == 0 else ""
+                pc += 4
+            continue
+
+        if line.op.startswith("."):
+            raise AssemblerError(line.lineno, f"Unknown directive {line.op}")
+
+        try:
+            yield line, build(line, symbols, pc), line.comment
+        except AssemblerError:
+            raise
+        except Exception as e:
+            raise AssemblerError(line.lineno, str(e))
+
+        pc += 4
+
+# Instruction objects cannot hold data, so a .word has to be the encoding of one
+def instruction(line, item):
+    if type(item) != int:
+        return item
+
+    try:
+        return decodeWord(item)
+    except Exception:
+        raise AssemblerError(line.lineno, f".word {item:#010x} is not an instruction, assemble to words instead")
+
+# reads f twice, so it has to be seekable. only the symbol table is kept in memory, instructions
+# come out one at a time as Instruction objects or, with words=True, as encoded words
+def assemble(f, words=False):
+    start = f.tell()
+    symbols = collectSymbols(f)
+    f.seek(start)
+
+    for line, item, _ in statements(f, symbols):
+        if words:
+            yield item if type(item) == int else encode(item)
         else:
-            raise Exception("Unknown instruction")
-    
-    return output
+            yield instruction(line, item)
+
+# a whole program in memory, with its comments
+def parse(asm):
+    f = io.StringIO(asm)
+    symbols = collectSymbols(f)
+    f.seek(0)
+
+    program = Program()
+
+    for line, item, comment in statements(f, symbols):
+        if comment:
+            program.comments[len(program)] = comment
+
+        program.append(instruction(line, item))
+
+    return program
 
 def parseFile(fname):
-      with open(fname) as f:
-            contents = f.read()
-            return parse(contents)
+    with open(fname) as f:
+        return parse(f.read())
+
+# assembles straight into an RV32 program file without holding the program
+def assembleFile(src, dst):
+    count = 0
+
+    with open(src) as f, open(dst, "wb") as out:
+        out.write(MAGIC)
+
+        for word in assemble(f, words=True):
+            out.write(word.to_bytes(4, "little"))
+            count += 1
+
+    return count
+
+def branchTarget(instr, index):
+    if isinstance(instr, (BType, JType)) and type(instr.imm) == int:
+        return index + instr.imm // 4
+
+    return None
+
+def labelName(index):
+    return f"L{index * 4}"
+
+def formatLine(instr, index, targets):
+    target = branchTarget(instr, index) if targets else None
+
+    if target not in targets:
+        return str(instr)
+
+    op = type(instr).__name__.lower()
+
+    if isinstance(instr, BType):
+        return instr.padComment(f"{op} {reg_names[instr.r1]} {reg_names[instr.r2]} {labelName(target)}")
+
+    return instr.padComment(f"{op} {reg_names[instr.rd]} {labelName(target)}")
+
+# writes a listing to out one line at a time. instrs is a sequence of Instruction objects or
+# encoded words, like a Program or an Image. with labels=True branch and jump targets get labels,
+# which takes one extra pass over instrs. a target outside the program keeps its offset, one just
+# past the end gets a label on the last line
+def disassemble(instrs, out, labels=False):
+    comments = getattr(instrs, "comments", {})
+    targets = set()
+
+    if labels:
+        for index, instr in enumerate(instrs):
+            target = branchTarget(decodeWord(instr) if type(instr) == int else instr, index)
+
+            if target is not None:
+                targets.add(target)
+
+        targets = {target for target in targets if 0 <= target <= len(instrs)}
+
+    for index, instr in enumerate(instrs):
+        if type(instr) == int:
+            instr = decodeWord(instr)
+
+        if index in targets:
+            out.write(f"{labelName(index)}:\n")
+
+        comment = comments.get(index, "")
+
+        # comments the compiler writes without a marker need one to read back
+        if comment and not COMMENT.match(comment.lstrip()):
+            comment = "# " + comment
+
+        out.write(formatLine(instr, index, targets) + comment + "\n")
+
+    if len(instrs) in targets:
+        out.write(f"{labelName(len(instrs))}:\n")
@@ -0,0 +1,282 @@
+from Decoder import opcode_names, X0_SINK
+from Memory import MemoryFault
+from Binary import mulhu, div, divu, rem, remu
+
+JIT_THRESHOLD = 20
+
+BRANCHES = {"Beq" : "==", "Bne" : "!=", "Blt" : "<", "Bge" : ">="}
+TERMINATORS = {"Beq", "Bne", "Blt", "Bge", "Jal", "Jalr", "Stop", "RaiseError"}
+
+def wrap(expr):
+    return f"(({expr} + 0x80000000) & 0xFFFFFFFF) - 0x80000000"
+
+def findLeaders(code):
+    leaders = {0}
+
+    for index, (op, rd, r1, r2, imm) in enumerate(code):
+        name = opcode_names[op]
+        pc = index * 4
+
+        if name in TERMINATORS:
+            leaders.add(pc + 4)
+
+        if name in BRANCHES or name == "Jal":
+            leaders.add(pc + imm)
+
+        if name == "Jalr" and r1 == 0:
+            leaders.add(imm)
+
+    return leaders
+
+class BlockBuilder:
+    def __init__(self):
+        self.used = set()
+        self.written = set()
+        self.lines = []
+        self.memory = False
+        self.bytes = False
+        self.halves = False
+        self.terminated = False
+        self.loads = 0
+        self.stores = 0
+        # pc of every instruction that can raise -> (loads, stores) from it to the end of the block,
+        # which a fault takes back off the counts added on entry
+        self.undone = {}
+
+    def get(self, r):
+        if r == 0:
+            return "0"
+
+        self.used.add(r)
+        return f"x{r}"
+
+    def set(self, r):
+        if r == X0_SINK:
+            return "_"
+
+        self.used.add(r)
+        self.written.add(r)
+        return f"x{r}"
+
+    def emit(self, line, indent=2):
+        self.lines.append("    " * indent + line)
+
+    # notes the pc of an instruction that can raise, so a fault leaves emu where the interpreter would
+    def mayRaise(self, pc):
+        self.undone[pc] = (self.loads, self.stores)
+        self.emit(f"at = {pc}")
+
+    def addressCheck(self, base, imm, pc, access, align=4):
+        self.memory = True
+        self.mayRaise(pc)
+        self.emit(f"a = {base} + {imm}")
+        self.emit("if a < 0 or a >= limit:" if align == 1 else f"if a & {align - 1} or a < 0 or a >= limit:")
+        self.emit(f"raise MemoryFault(\"Bad address\", \"{access}\", a, {pc})", 3)
+
+    def add(self, pc, op, rd, r1, r2, imm):
+        name = opcode_names[op]
+        self.terminated = name in TERMINATORS
+
+        match name:
+            case "Add":
+                self.emit(f"{self.set(rd)} = {wrap(f'{self.get(r1)} + {self.get(r2)}')}")
+            case "Sub":
+                self.emit(f"{self.set(rd)} = {wrap(f'{self.get(r1)} - {self.get(r2)}')}")
+            case "Mul":
+                self.emit(f"{self.set(rd)} = {wrap(f'{self.get(r1)} * {self.get(r2)}')}")
+            case "Mulh":
+                self.emit(f"{self.set(rd)} = ({self.get(r1)} * {self.get(r2)}) >> 32")
+            case "Mulhsu":
+                self.emit(f"{self.set(rd)} = ({self.get(r1)} * ({self.get(r2)} & 0xFFFFFFFF)) >> 32")
+            case "Mulhu" | "Div" | "Divu" | "Rem" | "Remu":
+                self.emit(f"{self.set(rd)} = {name.lower()}({self.get(r1)}, {self.get(r2)})")
+            case "Xor":
+                self.emit(f"{self.set(rd)} = {self.get(r1)} ^ {self.get(r2)}")
+            case "Or":
+                self.emit(f"{self.set(rd)} = {self.get(r1)} | {self.get(r2)}")
+            case "And":
+                self.emit(f"{self.set(rd)} = {self.get(r1)} & {self.get(r2)}")
+            case "Slt":
+                self.emit(f"{self.set(rd)} = 1 if {self.get(r1)} < {self.get(r2)} else 0")
+            case "SltU":
+                self.emit(f"{self.set(rd)} = 1 if {self.get(r1)} & 0xFFFFFFFF < {self.get(r2)} & 0xFFFFFFFF else 0")
+            case "Addi":
+                if r1 == 0:
+                    self.emit(f"{self.set(rd)} = {((imm + 0x80000000) & 0xFFFFFFFF) - 0x80000000}")
+                else:
+                    self.emit(f"{self.set(rd)} = {wrap(f'{self.get(r1)} + {imm}')}")
+            case "Lui":
+                self.emit(f"{self.set(rd)} = {(((imm & 0xFFFFF) << 12) ^ 0x80000000) - 0x80000000}")
+            case "Slti":
+                self.emit(f"{self.set(rd)} = 1 if {self.get(r1)} < {imm} else 0")
+            case "SltiU":
+                self.emit(f"{self.set(rd)} = 1 if {self.get(r1)} & 0xFFFFFFFF < {imm & 0xFFFFFFFF} else 0")
+            case "Lw":
+                self.addressCheck(self.get(r1), imm, pc, "read")
+                self.loads += 1
+                self.emit(f"{self.set(rd)} = words[a >> 2]")
+            case "Sw":
+                self.addressCheck(self.get(r1), imm, pc, "write")
+                self.stores += 1
+                self.emit(f"words[a >> 2] = {self.get(r2)}")
+                self.emit("written[a >> 12] = 1")
+            case "Lb" | "Lbu":
+                self.bytes = True
+                self.addressCheck(self.get(r1), imm, pc, "read", 1)
+                self.loads += 1
+                self.emit(f"{self.set(rd)} = {'(bytes_[a] ^ 0x80) - 0x80' if name == 'Lb' else 'bytes_[a]'}")
+            case "Lh" | "Lhu":
+                self.halves = True
+                self.addressCheck(self.get(r1), imm, pc, "read", 2)
+                self.loads += 1
+                self.emit(f"{self.set(rd)} = {'(halves[a >> 1] ^ 0x8000) - 0x8000' if name == 'Lh' else 'halves[a >> 1]'}")
+            case "Sb":
+                self.bytes = True
+                self.addressCheck(self.get(r1), imm, pc, "write", 1)
+                self.stores += 1
+                self.emit(f"bytes_[a] = {self.get(r2)} & 0xFF")
+                self.emit("written[a >> 12] = 1")
+            case "Sh":
+                self.halves = True
+                self.addressCheck(self.get(r1), imm, pc, "write", 2)
+                self.stores += 1
+                self.emit(f"halves[a >> 1] = {self.get(r2)} & 0xFFFF")
+                self.emit("written[a >> 12] = 1")
+            case "Debug":
+                self.mayRaise(pc)
+                self.emit(f"emu.debug_info.append(words[({self.get(2)} - 4) >> 2])")
+            case "Jal":
+                self.emit(f"{self.set(rd)} = {pc + 4}")
+                self.emit(f"return {pc + imm}")
+            case "Jalr":
+                self.mayRaise(pc)
+                self.emit(f"t = ({self.get(r1)} + {imm}) & 0xFFFFFFFF")
+                self.emit("if t & 3:")
+                self.emit("raise Exception(\"Bad pc\")", 3)
+                self.emit(f"{self.set(rd)} = {pc + 4}")
+                self.emit("return t")
+            case "Stop":
+                self.emit("emu.stop = True")
+                self.emit(f"return {pc + 4}")
+            case "RaiseError":
+                self.mayRaise(pc)
+                self.emit("raise Exception(\"RaiseError instruction\")")
+            case _ if name in BRANCHES:
+                self.emit(f"if {self.get(r1)} {BRANCHES[name]} {self.get(r2)}:")
+                self.emit("emu.branches_taken += 1", 3)
+                self.emit(f"return {pc + imm}", 3)
+                self.emit("emu.branches_not_taken += 1")
+                self.emit(f"return {pc + 4}")
+            case _:
+                raise ValueError(f"JIT cannot compile {name}")
+
+    def source(self, end):
+        used = sorted(self.used)
+
+        lines = [f"def block(regs, words, emu):"]
+        lines += [f"    x{r} = regs[{r}]" for r in used]
+
+        if self.memory:
+            lines.append("    limit = len(words) << 2")
+
+        if self.loads:
+            lines.append(f"    emu.loads += {self.loads}")
+
+        if self.stores:
+            lines.append(f"    emu.stores += {self.stores}")
+            lines.append("    written = emu.written")
+
+        if self.bytes:
+            lines.append("    bytes_ = emu.bytes")
+
+        if self.halves:
+            lines.append("    halves = emu.halves")
+
+        lines.append("    try:")
+        lines += self.lines
+
+        if not self.terminated:
+            lines.append(f"        return {end}")
+
+        if self.undone:
+            # counts were taken up front, a fault keeps only those of the instructions before it
+            undone = {pc : (self.loads - loads, self.stores - stores) for pc, (loads, stores) in self.undone.items()}
+            lines.append("    except BaseException:")
+            lines.append(f"        loads, stores = {undone}[at]")
+            lines.append("        emu.loads -= loads")
+            lines.append("        emu.stores -= stores")
+            lines.append("        emu.fault_pc = at")
+            lines.append("        raise")
+
+        lines.append("    finally:")
+        lines += [f"        regs[{r}] = x{r}" for r in sorted(self.written)]
+
+        if not self.written:
+            lines.append("        pass")
+
+        return "\n".join(lines) + "\n"
+
+class JIT:
+    def __init__(self, code, threshold=JIT_THRESHOLD):
+        self.code = code
+        self.threshold = threshold
+        self.leaders = findLeaders(code)
+
+        self.lengths = {}
+        self.counts = {}
+        # start pc -> (compiled block, instruction count)
+        self.compiled = {}
+
+    def blockLength(self, pc):
+        if pc in self.lengths:
+            return self.lengths[pc]
+
+        code = self.code
+        index = pc >> 2
+        length = 0
+
+        while index < len(code):
+            length += 1
+
+            if opcode_names[code[index][0]] in TERMINATORS:
+                break
+
+            index += 1
+            if index * 4 in self.leaders:
+                break
+
+        # a pc past the end still gets one step so the interpreter reports it
+        self.lengths[pc] = length or 1
+        return self.lengths[pc]
+
+    def hit(self, pc):
+        count = self.counts.get(pc, 0) + 1
+        self.counts[pc] = count
+
+        if count >= self.threshold and pc not in self.compiled:
+            self.compile(pc)
+
+        return self.blockLength(pc)
+
+    def translate(self, pc):
+        length = self.blockLength(pc)
+        builder = BlockBuilder()
+
+        for i in range(length):
+            addr = pc + i * 4
+            builder.add(addr, *self.code[addr >> 2])
+
+        return builder.source(pc + length * 4)
+
+    def compile(self, pc):
+        namespace = {"MemoryFault" : MemoryFault, "mulhu" : mulhu, "div" : div, "divu" : divu,
+                     "rem" : rem, "remu" : remu}
+        try:
+            source = self.translate(pc)
+        except ValueError:
+            # left to the interpreter for good
+            self.compiled[pc] = None
+            return
+
+        exec(compile(source, f"<jit block {pc}>", "exec"), namespace)
+        self.compiled[pc] = (namespace["block"], self.blockLength(pc))
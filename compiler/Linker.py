@@ -0,0 +1,251 @@
+import argparse
+import hashlib
+import marshal
+import os
+import struct
+import sys
+
+from Tokenizer import tokenize
+from Parser import parse
+from Typechecker import typecheck
+from Compiler import Compiler, layout, functionLabel
+from Decoder import OPCODES, opcode_of
+from RV32 import makeInstruction
+from Types import BaseType, PointerType, StructType, UnknownStructType
+from AST import FunctionDecl
+from Instruction import *
+from Emu import Emu
+
+# an object file is a header, one fixed size record per instruction and then the symbol tables,
+# written with marshal so loading is a struct unpack and one marshal.loads
+MAGIC = b"RVO1"
+HEADER = struct.Struct("<4sII")
+# opcode, rd, r1, r2, imm. imm takes 32 bits since calls jump to absolute addresses
+RECORD = struct.Struct("<BBBBi")
+
+class LinkError(Exception):
+    pass
+
+# types as nested tuples of plain values, so they survive marshal
+def encodeType(type_):
+    if type(type_) == PointerType:
+        return ("pointer", encodeType(type_.type), type_.amount)
+
+    if type(type_) == UnknownStructType:
+        return ("unknown struct", tuple(encodeType(t) for t in type_.property_types))
+
+    if type(type_) == StructType:
+        return ("struct", tuple(type_.properties), tuple(encodeType(t) for t in type_.property_types))
+
+    return ("base", type_.name, type_.words, type_.size)
+
+def decodeType(encoded):
+    match encoded[0]:
+        case "pointer":
+            return PointerType(decodeType(encoded[1]), encoded[2])
+        case "unknown struct":
+            return UnknownStructType([decodeType(t) for t in encoded[1]])
+        case "struct":
+            return StructType(list(encoded[1]), [decodeType(t) for t in encoded[2]])
+
+    return BaseType(*encoded[1:])
+
+def record(instr):
+    imm = getattr(instr, "imm", 0)
+    return (opcode_of[type(instr)], getattr(instr, "rd", 0), getattr(instr, "r1", 0), getattr(instr, "r2", 0),
+            imm if type(imm) == int else 0)
+
+class ObjectFile:
+    def __init__(self, code, main_start, symbols, relocations, exports, stamp=None):
+        # (opcode, rd, r1, r2, imm) records, the unit's functions first and its top level code from main_start
+        self.code = code
+        self.main_start = main_start
+        # label -> byte offset in code, and (index, label) of every instruction whose imm names one
+        self.symbols = symbols
+        self.relocations = relocations
+        # function name -> (arg names, encoded arg types, encoded return type)
+        self.exports = exports
+        # hashes of the source and of the exports it was compiled against, see build
+        self.stamp = stamp
+
+    def toBytes(self):
+        meta = marshal.dumps((self.main_start, self.symbols, self.relocations, self.exports, self.stamp))
+        code = b"".join(RECORD.pack(*rec) for rec in self.code)
+        return HEADER.pack(MAGIC, len(self.code), len(meta)) + code + meta
+
+    @staticmethod
+    def fromBytes(data):
+        if len(data) < HEADER.size:
+            raise LinkError("Not an object file")
+
+        magic, count, meta_size = HEADER.unpack_from(data)
+        end = HEADER.size + count * RECORD.size
+
+        if magic != MAGIC or len(data) != end + meta_size:
+            raise LinkError("Not an object file")
+
+        code = list(RECORD.iter_unpack(data[HEADER.size:end]))
+        return ObjectFile(code, *marshal.loads(data[end:]))
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.toBytes())
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return ObjectFile.fromBytes(f.read())
+
+# exports -> the FunctionDecls the typechecker needs to check calls into other units
+def signatures(exports):
+    return {name : FunctionDecl(name, list(args), None, decodeType(ret), [decodeType(t) for t in argtypes])
+            for name, (args, argtypes, ret) in exports.items()}
+
+# compiles one unit against the exports of the units before it
+def compileUnit(source, imports=None):
+    decls = signatures(imports or {})
+
+    ast, types = parse(tokenize(source))
+    typecheck(ast, decls)
+
+    compiler = Compiler(ast, types, {name : decl.type for name, decl in decls.items()})
+    program, symbols, relocations = layout(compiler.runUnit().flatten())
+
+    exports = {name : (tuple(args), tuple(encodeType(t) for t in argtypes), encodeType(compiler.function_returns[name]))
+               for name, (args, argtypes) in compiler.function_args.items()}
+
+    return ObjectFile([record(instr) for instr in program], symbols["main"] // 4, symbols,
+                      [(index, program[index].imm) for index in relocations], exports)
+
+# one program from the units in order: a jump to the top level code, every unit's functions, then
+# every unit's top level code, which runs unit after unit, and a Stop
+def linkObjects(objects):
+    text_size = sum(obj.main_start for obj in objects)
+
+    # where each unit's functions and top level code start, in instructions
+    placements = []
+    text, main = 1, 1 + text_size
+    for obj in objects:
+        placements.append(Placement(obj, text, main))
+        text += obj.main_start
+        main += len(obj.code) - obj.main_start
+
+    # only function entries are visible to other units, every other label is local to its unit
+    globals = {}
+    for placed in placements:
+        for name in placed.obj.exports:
+            label = functionLabel(name)
+
+            if label in globals:
+                raise LinkError(f"Function {name} is defined twice")
+
+            globals[label] = placed.address(placed.obj.symbols[label])
+
+    program = Program([Jal("x0", 4 + 4 * text_size)] + [None] * (main - 1) + [Stop()])
+
+    for placed in placements:
+        code = list(placed.obj.code)
+
+        for index, label in placed.obj.relocations:
+            if label in placed.obj.symbols:
+                target = placed.address(placed.obj.symbols[label])
+            elif label in globals:
+                target = globals[label]
+            else:
+                raise LinkError(f"Undefined label {label}")
+
+            op, rd, r1, r2, _ = code[index]
+
+            if issubclass(OPCODES[op], (BType, JType)):
+                target -= placed.address(index * 4)
+
+            code[index] = (op, rd, r1, r2, target)
+
+        for index, (op, rd, r1, r2, imm) in enumerate(code):
+            program[placed.address(index * 4) // 4] = makeInstruction(OPCODES[op], rd, r1, r2, imm)
+
+    return program
+
+class Placement:
+    def __init__(self, obj, text, main):
+        self.obj = obj
+        self.text = text
+        self.main = main
+
+    # byte offset in the object -> byte address in the linked program
+    def address(self, offset):
+        index = offset // 4
+
+        if index < self.obj.main_start:
+            return 4 * (self.text + index)
+
+        return 4 * (self.main + index - self.obj.main_start)
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+# the file name keeps the object readable, the hash of the full path keeps units with the same
+# file name in different directories apart
+def objectPath(path, out_dir):
+    full = os.path.abspath(path)
+    return os.path.join(out_dir, f"{os.path.basename(full)}.{digest(full.encode())[:16]}.o")
+
+# compiles the units whose source, or the exports of a unit before them, changed since their
+# object file was written, and loads the rest. returns the objects and the paths that were compiled
+def build(paths, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+
+    objects = []
+    rebuilt = []
+    exports = {}
+
+    for path in paths:
+        with open(path) as f:
+            source = f.read()
+
+        stamp = (digest(source.encode()), digest(marshal.dumps(sorted(exports.items()))))
+        obj_path = objectPath(path, out_dir)
+        obj = None
+
+        if os.path.exists(obj_path):
+            try:
+                obj = ObjectFile.load(obj_path)
+            except (LinkError, ValueError, EOFError):
+                obj = None
+
+        if obj is None or obj.stamp != stamp:
+            obj = compileUnit(source, exports)
+            obj.stamp = stamp
+            obj.save(obj_path)
+            rebuilt.append(path)
+
+        exports.update(obj.exports)
+        objects.append(obj)
+
+    return objects, rebuilt
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile source files separately, link them and run the program")
+    parser.add_argument("paths", nargs="+", help="source files, in the order their top level code runs")
+    parser.add_argument("--out-dir", default="build", help="where object files are kept between builds")
+    parser.add_argument("--no-run", action="store_true", help="only build and link")
+    args = parser.parse_args(argv)
+
+    objects, rebuilt = build(args.paths, args.out_dir)
+
+    for path in rebuilt:
+        print(f"compiled {path}", file=sys.stderr)
+
+    program = linkObjects(objects)
+
+    if not args.no_run:
+        emu = Emu(program)
+        emu.run()
+
+        for value in emu.debug_info:
+            print(value)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
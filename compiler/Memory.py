@@ -0,0 +1,188 @@
+import mmap
+import struct
+import sys
+
+DEFAULT_MEM_SIZE = 1 << 20
+
+PAGE_SHIFT = 12
+PAGE_SIZE = 1 << PAGE_SHIFT
+
+# above this size an anonymous mmap is used, so the os hands out zero pages lazily
+# instead of bytearray clearing the whole range up front
+MMAP_THRESHOLD = 1 << 24
+
+class MemoryFault(Exception):
+    def __init__(self, reason, access, addr, pc=None):
+        where = "" if pc is None else f" at pc {pc}"
+        super().__init__(f"{reason}: {access} of {addr:#x}{where}")
+        self.reason = reason
+        self.access = access
+        self.addr = addr
+        self.pc = pc
+
+# words and halfwords of a byte buffer in RV32's little endian order, indexed like a memoryview cast.
+# on a little endian host that is the cast itself, anywhere else every access packs explicitly
+def littleEndian(buffer, fmt):
+    if sys.byteorder == "little":
+        return memoryview(buffer).cast(fmt)
+
+    return LittleEndianView(buffer, fmt)
+
+class LittleEndianView:
+    def __init__(self, buffer, fmt):
+        self.buffer = memoryview(buffer)
+        self.item = struct.Struct("<" + fmt)
+        self.length = len(self.buffer) // self.item.size
+
+    def __len__(self):
+        return self.length
+
+    def offset(self, index):
+        if index < 0:
+            index += self.length
+
+        if not 0 <= index < self.length:
+            raise IndexError("index out of bounds")
+
+        return index * self.item.size
+
+    def __getitem__(self, index):
+        if type(index) == slice:
+            return [self[i] for i in range(*index.indices(self.length))]
+
+        return self.item.unpack_from(self.buffer, self.offset(index))[0]
+
+    def __setitem__(self, index, value):
+        self.item.pack_into(self.buffer, self.offset(index), value)
+
+    def release(self):
+        self.buffer.release()
+
+class Memory:
+    def __init__(self, size=DEFAULT_MEM_SIZE, path=None):
+        if size <= 0 or size % 4 != 0:
+            raise Exception(f"Memory size must be a positive multiple of 4, was {size}")
+
+        self.size = size
+        self.file = None
+
+        if path is not None:
+            self.file = open(path, "a+b")
+            self.file.truncate(size)
+            self.buffer = mmap.mmap(self.file.fileno(), size)
+        elif size >= MMAP_THRESHOLD:
+            self.buffer = mmap.mmap(-1, size)
+        else:
+            self.buffer = bytearray(size)
+
+        self.bytes = memoryview(self.buffer)
+        self.words = littleEndian(self.buffer, "i")
+        self.halves = littleEndian(self.buffer, "H")
+
+        # one flag per page that has been stored to, so snapshots only copy what was touched
+        self.written = bytearray((size + PAGE_SIZE - 1) >> PAGE_SHIFT)
+
+    def __len__(self):
+        return self.size
+
+    def loadWord(self, addr, pc=None):
+        if addr & 3 or addr < 0:
+            raise MemoryFault("Bad address", "read", addr, pc)
+
+        try:
+            return self.words[addr >> 2]
+        except IndexError:
+            raise MemoryFault("Bad address", "read", addr, pc)
+
+    def storeWord(self, addr, value, pc=None):
+        if addr & 3 or addr < 0:
+            raise MemoryFault("Bad address", "write", addr, pc)
+
+        try:
+            self.words[addr >> 2] = value
+        except IndexError:
+            raise MemoryFault("Bad address", "write", addr, pc)
+
+        self.written[addr >> PAGE_SHIFT] = 1
+
+    # byte and halfword loads return the unsigned value, callers sign extend
+    def loadByte(self, addr, pc=None):
+        if addr < 0 or addr >= self.size:
+            raise MemoryFault("Bad address", "read", addr, pc)
+
+        return self.bytes[addr]
+
+    def storeByte(self, addr, value, pc=None):
+        if addr < 0 or addr >= self.size:
+            raise MemoryFault("Bad address", "write", addr, pc)
+
+        self.bytes[addr] = value & 0xFF
+        self.written[addr >> PAGE_SHIFT] = 1
+
+    def loadHalf(self, addr, pc=None):
+        if addr & 1 or addr < 0 or addr >= self.size:
+            raise MemoryFault("Bad address", "read", addr, pc)
+
+        return self.halves[addr >> 1]
+
+    def storeHalf(self, addr, value, pc=None):
+        if addr & 1 or addr < 0 or addr >= self.size:
+            raise MemoryFault("Bad address", "write", addr, pc)
+
+        self.halves[addr >> 1] = value & 0xFFFF
+        self.written[addr >> PAGE_SHIFT] = 1
+
+    def view(self, addr, words):
+        if addr & 3 or addr < 0 or addr + words * 4 > self.size:
+            raise Exception("Bad address")
+
+        return self.words[addr >> 2 : (addr >> 2) + words]
+
+    def pageRange(self, page):
+        return page << PAGE_SHIFT, min((page + 1) << PAGE_SHIFT, self.size)
+
+    def writtenPages(self):
+        pages = []
+        page = self.written.find(1)
+
+        while page != -1:
+            pages.append(page)
+            page = self.written.find(1, page + 1)
+
+        return pages
+
+    def snapshotPages(self):
+        pages = {}
+
+        for page in self.writtenPages():
+            start, end = self.pageRange(page)
+            pages[page] = bytes(self.bytes[start:end])
+
+        return pages
+
+    def restorePages(self, pages):
+        for page in self.writtenPages():
+            if page not in pages:
+                start, end = self.pageRange(page)
+                self.bytes[start:end] = bytes(end - start)
+
+        self.written[:] = bytes(len(self.written))
+
+        for page, data in pages.items():
+            start, end = self.pageRange(page)
+            self.bytes[start:end] = data
+            self.written[page] = 1
+
+    def flush(self):
+        if self.file is not None:
+            self.buffer.flush()
+
+    def close(self):
+        self.words.release()
+        self.halves.release()
+        self.bytes.release()
+
+        if self.file is not None:
+            self.buffer.close()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,155 @@
+from Memory import MemoryFault, PAGE_SHIFT, PAGE_SIZE, littleEndian
+
+PAGED_MEM_SIZE = 1 << 32
+
+PAGE_MASK = PAGE_SIZE - 1
+
+# a sparse address space: 4KiB pages are allocated on the first store to them and reads of
+# untouched pages return 0. regions are (start, end, perms) with page aligned bounds and
+# perms a subset of "rwx". later regions override earlier ones and addresses outside every
+# region cannot be accessed at all
+class PagedMemory:
+    def __init__(self, size=PAGED_MEM_SIZE, regions=None):
+        if size <= 0 or size % PAGE_SIZE != 0:
+            raise Exception(f"Paged memory size must be a positive multiple of {PAGE_SIZE}, was {size}")
+
+        self.size = size
+        self.regions = self.checkRegions([(0, size, "rwx")] if regions is None else regions)
+
+        # page number -> (bytearray, word view)
+        self.pages = {}
+        # page number -> perms, filled in as pages are first looked at
+        self.perms = {}
+
+        # most recently used readable and writable pages, Emu's handlers test these first
+        self.read_page = None
+        self.read_words = None
+        self.write_page = None
+        self.write_words = None
+
+    def checkRegions(self, regions):
+        checked = []
+
+        for start, end, perms in regions:
+            if start & PAGE_MASK or end & PAGE_MASK or not 0 <= start < end <= self.size:
+                raise Exception(f"Region {start:#x}-{end:#x} must be page aligned and inside memory")
+
+            if set(perms) - set("rwx"):
+                raise Exception(f"Bad permissions {perms}")
+
+            checked.append((start, end, perms))
+
+        return checked
+
+    def __len__(self):
+        return self.size
+
+    def pagePerms(self, page):
+        if page in self.perms:
+            return self.perms[page]
+
+        addr = page << PAGE_SHIFT
+        perms = ""
+
+        for start, end, region_perms in self.regions:
+            if start <= addr < end:
+                perms = region_perms
+
+        self.perms[page] = perms
+        return perms
+
+    def executable(self, addr):
+        return 0 <= addr < self.size and "x" in self.pagePerms(addr >> PAGE_SHIFT)
+
+    def check(self, addr, access, perm, pc, align=4):
+        if addr & (align - 1) or addr < 0 or addr >= self.size:
+            raise MemoryFault("Bad address", access, addr, pc)
+
+        page = addr >> PAGE_SHIFT
+
+        if perm not in self.pagePerms(page):
+            raise MemoryFault("Permission denied", access, addr, pc)
+
+        return page
+
+    def allocate(self, page):
+        data = bytearray(PAGE_SIZE)
+        self.pages[page] = (data, littleEndian(data, "i"))
+        return self.pages[page]
+
+    def loadWord(self, addr, pc=None):
+        page = self.check(addr, "read", "r", pc)
+
+        if page not in self.pages:
+            return 0
+
+        words = self.pages[page][1]
+        self.read_page, self.read_words = page, words
+        return words[(addr & PAGE_MASK) >> 2]
+
+    def storeWord(self, addr, value, pc=None):
+        page = self.check(addr, "write", "w", pc)
+        words = (self.pages.get(page) or self.allocate(page))[1]
+
+        self.write_page, self.write_words = page, words
+        words[(addr & PAGE_MASK) >> 2] = value
+
+    def loadByte(self, addr, pc=None):
+        page = self.check(addr, "read", "r", pc, 1)
+
+        if page not in self.pages:
+            return 0
+
+        return self.pages[page][0][addr & PAGE_MASK]
+
+    def storeByte(self, addr, value, pc=None):
+        page = self.check(addr, "write", "w", pc, 1)
+        data = (self.pages.get(page) or self.allocate(page))[0]
+        data[addr & PAGE_MASK] = value & 0xFF
+
+    def loadHalf(self, addr, pc=None):
+        page = self.check(addr, "read", "r", pc, 2)
+
+        if page not in self.pages:
+            return 0
+
+        data = self.pages[page][0]
+        offset = addr & PAGE_MASK
+        return data[offset] | data[offset + 1] << 8
+
+    def storeHalf(self, addr, value, pc=None):
+        page = self.check(addr, "write", "w", pc, 2)
+        data = (self.pages.get(page) or self.allocate(page))[0]
+        offset = addr & PAGE_MASK
+        data[offset] = value & 0xFF
+        data[offset + 1] = value >> 8 & 0xFF
+
+    def view(self, addr, words):
+        return [self.loadWord(addr + i * 4) for i in range(words)]
+
+    def footprint(self):
+        return len(self.pages) * PAGE_SIZE
+
+    def pageRange(self, page):
+        return page << PAGE_SHIFT, (page + 1) << PAGE_SHIFT
+
+    def writtenPages(self):
+        return sorted(self.pages)
+
+    def snapshotPages(self):
+        return {page : bytes(data) for page, (data, _) in self.pages.items()}
+
+    def restorePages(self, pages):
+        self.pages = {}
+
+        for page, data in pages.items():
+            self.allocate(page)[0][:] = data
+
+        self.read_page = self.read_words = None
+        self.write_page = self.write_words = None
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.pages = {}
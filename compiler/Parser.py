@@ -3,7 +3,7 @@ from AST import *
 from Types import *
 
 INT = BaseType("int", 1)
-CHAR = BaseType("char", 1)
+CHAR = BaseType("char", 1, 1)
 VOID = BaseType("void", 1)
 
 class Parser:
@@ -46,20 +46,20 @@ class Parser:
             self.defineBinaryOpFunction(TokenType.COMP_LT_EQ),  #23
             self.defineBinaryOpFunction(TokenType.OP_PLUS),     #24
             self.defineBinaryOpFunction(TokenType.OP_MINUS),    #25
-            self.defineBinaryOpFunction(TokenType.OP_MUL),      #26
-            self.defineBinaryOpFunction(TokenType.OP_DIV),      #27
-            self.parseDereference,                              #28
-            self.parseFunctionCall,                             #29
-            self.parseParns,                                    #30
-            self.parseVariableGet,                              #31
-            self.parseValue                                     #32
+            self.defineBinaryOpFunction(TokenType.OP_MUL,
+                TokenType.OP_DIV, TokenType.OP_MOD),            #26
+            self.parseDereference,                              #27
+            self.parseFunctionCall,                             #28
+            self.parseParns,                                    #29
+            self.parseVariableGet,                              #30
+            self.parseValue                                     #31
         ]
 
         self.expression_prec = 16
         self.block_prec = 6
         self.function_prec = 2
         self.var_decl_prec = 9
-        self.const_prec = 32
+        self.const_prec = 31
 
         self.ast = self.parsePrec(0)
     
@@ -269,11 +269,13 @@ class Parser:
 
         return None
     
-    def defineBinaryOpFunction(self, op) :
+    # the ops share one precedence level and apply left to right
+    def defineBinaryOpFunction(self, *ops) :
         def parseBinaryOp(prec):
             left = self.parsePrec(prec + 1)
 
-            while self.tryMatch(op):
+            while self.isNext() and self.peek().kind in ops:
+                op = self.next().kind
                 right = self.parsePrec(prec + 1)
                 left = BinaryOp(left, op, right)
             
@@ -295,16 +297,12 @@ class Parser:
     def parseBreak(self, prec):
         if not self.tryMatch(TokenType.BREAK):
             return self.parsePrec(prec + 1)
-        
-        self.match(TokenType.SEMI)
 
         return Break()
 
     def parseContinue(self, prec):
         if not self.tryMatch(TokenType.CONTINUE):
             return self.parsePrec(prec + 1)
-        
-        self.match(TokenType.SEMI)
 
         return Continue()
     
@@ -418,7 +416,7 @@ class Parser:
 
         block = self.parsePrec(self.block_prec)
 
-        while_block = While(cond, Block(Statements([block, incr])))
+        while_block = While(cond, block, incr)
         return Block(Statements([decl, while_block]))
 
     def parseWhile(self, prec):
@@ -0,0 +1,149 @@
+import time
+import tracemalloc
+
+from Tokenizer import tokenize
+from Parser import parse
+from Typechecker import typecheck
+from Compiler import comp
+from Emu import Emu
+from AST import ASTNode
+
+class PhaseStats:
+    def __init__(self, phase, wall_time=0.0, cpu_time=0.0, allocated=None, peak=None, size=None):
+        self.phase = phase
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        # bytes still held when the phase ended and the most held at once, None without tracemalloc
+        self.allocated = allocated
+        self.peak = peak
+        # tokens, AST nodes, instructions or instructions retired, depending on the phase
+        self.size = size
+
+    def asDict(self):
+        return {
+            "phase" : self.phase,
+            "wall_time" : self.wall_time,
+            "cpu_time" : self.cpu_time,
+            "allocated" : self.allocated,
+            "peak" : self.peak,
+            "size" : self.size,
+        }
+
+def countNodes(ast):
+    count = 0
+    todo = [ast]
+
+    while todo:
+        node = todo.pop()
+
+        if isinstance(node, ASTNode):
+            count += 1
+            todo.extend(vars(node).values())
+        elif isinstance(node, (list, tuple)):
+            todo.extend(node)
+
+    return count
+
+def outputSize(phase, output):
+    if output is None:
+        return None
+
+    match phase:
+        case "tokenize" | "comp":
+            return len(output)
+        case "parse":
+            return countNodes(output[0])
+        case "run":
+            return output.instructions
+
+    return None
+
+# a hook is told before and after every phase, output is None if the phase raised. this one records time, memory and output size,
+# tracing allocations only while a phase runs since tracemalloc slows everything down
+class PhaseRecorder:
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.stats = []
+
+        self.started = False
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.base = 0
+
+    def before(self, phase):
+        if self.memory:
+            self.started = not tracemalloc.is_tracing()
+
+            if self.started:
+                tracemalloc.start()
+
+            tracemalloc.reset_peak()
+            self.base = tracemalloc.get_traced_memory()[0]
+
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+
+    def after(self, phase, output):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        allocated = peak = None
+
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            allocated, peak = current - self.base, peak - self.base
+
+            if self.started:
+                tracemalloc.stop()
+
+        self.stats.append(PhaseStats(phase, wall, cpu, allocated, peak, outputSize(phase, output)))
+
+    def asDicts(self):
+        return [stats.asDict() for stats in self.stats]
+
+# tokenize -> parse -> typecheck -> comp -> Emu.run, with hooks around each phase.
+# without hooks the phases are called directly
+class Pipeline:
+    def __init__(self, hooks=None, max_steps=None, timeout=None, **emu_options):
+        self.hooks = list(hooks or [])
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.emu_options = emu_options
+
+    def addHook(self, hook):
+        self.hooks.append(hook)
+
+    def phase(self, name, fn, *args):
+        if not self.hooks:
+            return fn(*args)
+
+        for hook in self.hooks:
+            hook.before(name)
+
+        output = None
+
+        # hooks still hear about a phase that raised, with no output
+        try:
+            output = fn(*args)
+        finally:
+            for hook in reversed(self.hooks):
+                hook.after(name, output)
+
+        return output
+
+    def compile(self, code):
+        tokens = self.phase("tokenize", tokenize, code)
+        ast, types = self.phase("parse", parse, tokens)
+        self.phase("typecheck", typecheck, ast)
+        return self.phase("comp", comp, ast, types)
+
+    def load(self, code):
+        return Emu(self.compile(code), **self.emu_options)
+
+    # returns the run's RunStats, BudgetExceeded and program errors propagate
+    def execute(self, emu):
+        return self.phase("run", emu.run, self.max_steps, self.timeout)
+
+    def run(self, code):
+        emu = self.load(code)
+        self.execute(emu)
+        return emu
@@ -0,0 +1,118 @@
+from Decoder import opcode_names
+from JIT import findLeaders
+
+# comments Compiler puts on the first instruction of a source construct
+CONSTRUCT_MARKERS = ("#WHILE", "#IF cond start", "#IF expr start", "#ELSE", "#binaryop", "#registers",
+                     "#CALL", "# return start", "#block start", "# resolve function block", "dref start",
+                     "varget start", "slu start")
+FUNCTION_MARKER = "# function "
+
+class Profiler:
+    def __init__(self, instrs, code):
+        self.instrs = instrs
+        # a compiled Program keeps its comments by index, other instruction lists have none
+        self.comments = getattr(instrs, "comments", {})
+        self.code = code
+        self.counts = [0] * len(code)
+
+        self.leaders = sorted(findLeaders(code))
+        self.functions, self.constructs = self.attribute()
+
+    def attribute(self):
+        # code before main is laid out as: jal to main, then every function body
+        main_start = len(self.code) * 4
+        if self.code and opcode_names[self.code[0][0]] == "Jal":
+            main_start = self.code[0][4]
+
+        functions = []
+        constructs = []
+        function = "main"
+        construct = ""
+
+        for index in range(len(self.instrs)):
+            comment = self.comments.get(index, "").strip()
+            pc = index * 4
+
+            if pc >= main_start and function != "main":
+                function = "main"
+                construct = ""
+
+            if comment.startswith(FUNCTION_MARKER) and pc < main_start:
+                function = comment[len(FUNCTION_MARKER):]
+                construct = ""
+            elif comment.startswith(CONSTRUCT_MARKERS):
+                construct = comment
+
+            functions.append(function)
+            constructs.append(construct)
+
+        return functions, constructs
+
+    def total(self):
+        return sum(self.counts)
+
+    def hotPCs(self, limit=None):
+        ranked = sorted((i for i in range(len(self.counts)) if self.counts[i]), key=lambda i : -self.counts[i])
+        return [(i * 4, self.counts[i]) for i in ranked[:limit]]
+
+    def blockCounts(self):
+        blocks = []
+        bounds = self.leaders + [len(self.code) * 4]
+
+        for start, end in zip(bounds, bounds[1:]):
+            if start >= end or start >> 2 >= len(self.counts):
+                continue
+
+            executed = sum(self.counts[start >> 2 : end >> 2])
+            if executed:
+                blocks.append((start, end, self.counts[start >> 2], executed))
+
+        blocks.sort(key=lambda b : -b[3])
+        return blocks
+
+    def context(self, pc):
+        index = pc >> 2
+        return self.functions[index], self.constructs[index]
+
+    def report(self, limit=20):
+        total = self.total() or 1
+        lines = [f"{'pc':>6} {'count':>10} {'%':>6}  {'instruction':<24} {'function':<12} construct"]
+
+        for pc, count in self.hotPCs(limit):
+            function, construct = self.context(pc)
+            instr = str(self.instrs[pc >> 2])[:20].strip()
+            lines.append(f"{pc:>6} {count:>10} {100 * count / total:>5.1f}%  {instr:<24} {function:<12} {construct}")
+
+        lines.append("")
+        lines.append(f"{'block':>13} {'runs':>10} {'instrs':>10} {'%':>6}  function")
+
+        for start, end, runs, executed in self.blockCounts()[:limit]:
+            function, _ = self.context(start)
+            lines.append(f"{start:>6}-{end - 4:<6} {runs:>10} {executed:>10} {100 * executed / total:>5.1f}%  {function}")
+
+        return "\n".join(lines)
+
+    # one "frame;frame;frame count" line per stack, the input format of flamegraph.pl and speedscope
+    def collapsed(self):
+        stacks = {}
+
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+
+            function, construct = self.functions[index], self.constructs[index]
+            frames = [function]
+
+            if construct:
+                frames.append(construct.replace(";", ","))
+
+            frames.append(opcode_names[self.code[index][0]].lower())
+
+            stack = ";".join(frames)
+            stacks[stack] = stacks.get(stack, 0) + count
+
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+    def writeCollapsed(self, path):
+        with open(path, "w") as f:
+            f.write(self.collapsed())
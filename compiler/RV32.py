@@ -0,0 +1,320 @@
+import copy
+import mmap
+import sys
+from array import array
+from itertools import accumulate
+
+from Instruction import *
+from Decoder import opcode_of, X0_SINK
+
+MAGIC = b"RV32"
+
+# major opcodes
+OP = 0b0110011
+OP_IMM = 0b0010011
+LOAD = 0b0000011
+STORE = 0b0100011
+BRANCH = 0b1100011
+JAL = 0b1101111
+JALR = 0b1100111
+LUI = 0b0110111
+SYSTEM = 0b1110011
+CUSTOM_0 = 0b0001011
+
+# class -> (funct3, funct7)
+R_FUNCT = {
+    Add : (0b000, 0b0000000), Sub : (0b000, 0b0100000), Xor : (0b100, 0b0000000),
+    Or : (0b110, 0b0000000), And : (0b111, 0b0000000), Slt : (0b010, 0b0000000),
+    SltU : (0b011, 0b0000000), Mul : (0b000, 0b0000001), Mulh : (0b001, 0b0000001),
+    Mulhsu : (0b010, 0b0000001), Mulhu : (0b011, 0b0000001), Div : (0b100, 0b0000001),
+    Divu : (0b101, 0b0000001), Rem : (0b110, 0b0000001), Remu : (0b111, 0b0000001),
+}
+
+# class -> (opcode, funct3)
+I_FUNCT = {
+    Addi : (OP_IMM, 0b000), Slti : (OP_IMM, 0b010), SltiU : (OP_IMM, 0b011),
+    Lw : (LOAD, 0b010), Lb : (LOAD, 0b000), Lh : (LOAD, 0b001), Lbu : (LOAD, 0b100),
+    Lhu : (LOAD, 0b101), Jalr : (JALR, 0b000),
+}
+
+S_FUNCT = {Sw : 0b010, Sb : 0b000, Sh : 0b001}
+B_FUNCT = {Beq : 0b000, Bne : 0b001, Blt : 0b100, Bge : 0b101}
+
+ECALL = SYSTEM
+EBREAK = 1 << 20 | SYSTEM
+# RaiseError has no RV32 counterpart, it takes the first custom opcode
+RAISE = CUSTOM_0
+
+# Stop and Debug become the environment call and breakpoint instructions
+FIXED_WORDS = {Stop : ECALL, Debug : EBREAK, RaiseError : RAISE}
+
+R_CLASSES = {funct : cls for cls, funct in R_FUNCT.items()}
+I_CLASSES = {funct : cls for cls, funct in I_FUNCT.items()}
+S_CLASSES = {funct : cls for cls, funct in S_FUNCT.items()}
+B_CLASSES = {funct : cls for cls, funct in B_FUNCT.items()}
+FIXED_CLASSES = {word : cls for cls, word in FIXED_WORDS.items()}
+
+def signed(value, bits):
+    value &= (1 << bits) - 1
+    return value - (1 << bits) if value >> (bits - 1) else value
+
+def immediate(instr, bits, align=1):
+    imm = instr.imm
+    low, high = -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+
+    if imm < low or imm > high:
+        raise Exception(f"Immediate {imm} of {type(instr).__name__} does not fit in {bits} bits")
+
+    if imm % align != 0:
+        raise Exception("Bad pc")
+
+    return imm & ((1 << bits) - 1)
+
+def encode(instr):
+    cls = type(instr)
+
+    if cls in R_FUNCT:
+        funct3, funct7 = R_FUNCT[cls]
+        return (funct7 << 25 | instr.r2 << 20 | instr.r1 << 15 | funct3 << 12
+                | instr.rd << 7 | OP)
+
+    if cls in I_FUNCT:
+        opcode, funct3 = I_FUNCT[cls]
+        imm = immediate(instr, 12)
+        return imm << 20 | instr.r1 << 15 | funct3 << 12 | instr.rd << 7 | opcode
+
+    if cls in S_FUNCT:
+        imm = immediate(instr, 12)
+        return ((imm >> 5) << 25 | instr.r2 << 20 | instr.r1 << 15 | S_FUNCT[cls] << 12
+                | (imm & 0x1F) << 7 | STORE)
+
+    if cls in B_FUNCT:
+        imm = immediate(instr, 13, 4)
+        return ((imm >> 12 & 1) << 31 | (imm >> 5 & 0x3F) << 25 | instr.r2 << 20
+                | instr.r1 << 15 | B_FUNCT[cls] << 12 | (imm >> 1 & 0xF) << 8
+                | (imm >> 11 & 1) << 7 | BRANCH)
+
+    if cls == Jal:
+        imm = immediate(instr, 21, 4)
+        return ((imm >> 20 & 1) << 31 | (imm >> 1 & 0x3FF) << 21 | (imm >> 11 & 1) << 20
+                | (imm >> 12 & 0xFF) << 12 | instr.rd << 7 | JAL)
+
+    if cls == Lui:
+        if not -(1 << 19) <= instr.imm < 1 << 20:
+            raise Exception(f"Immediate {instr.imm} of Lui does not fit in 20 bits")
+
+        return (instr.imm & 0xFFFFF) << 12 | instr.rd << 7 | LUI
+
+    if cls in FIXED_WORDS:
+        return FIXED_WORDS[cls]
+
+    raise Exception(f"Cannot encode {cls.__name__}")
+
+# splits a word into (class, rd, r1, r2, imm) with register numbers, the shared step of both decoders
+def fields(word):
+    opcode = word & 0x7F
+    rd = word >> 7 & 0x1F
+    funct3 = word >> 12 & 0x7
+    r1 = word >> 15 & 0x1F
+    r2 = word >> 20 & 0x1F
+    funct7 = word >> 25
+
+    if opcode == OP and (funct3, funct7) in R_CLASSES:
+        return R_CLASSES[(funct3, funct7)], rd, r1, r2, 0
+
+    if (opcode, funct3) in I_CLASSES:
+        return I_CLASSES[(opcode, funct3)], rd, r1, 0, signed(word >> 20, 12)
+
+    if opcode == STORE and funct3 in S_CLASSES:
+        return S_CLASSES[funct3], 0, r1, r2, signed(funct7 << 5 | rd, 12)
+
+    if opcode == BRANCH and funct3 in B_CLASSES:
+        imm = (word >> 31 & 1) << 12 | (word >> 7 & 1) << 11 | (word >> 25 & 0x3F) << 5 | (word >> 8 & 0xF) << 1
+        return B_CLASSES[funct3], 0, r1, r2, signed(imm, 13)
+
+    if opcode == JAL:
+        imm = (word >> 31 & 1) << 20 | (word >> 12 & 0xFF) << 12 | (word >> 20 & 1) << 11 | (word >> 21 & 0x3FF) << 1
+        return Jal, rd, 0, 0, signed(imm, 21)
+
+    if opcode == LUI:
+        return Lui, rd, 0, 0, word >> 12
+
+    if word in FIXED_CLASSES:
+        return FIXED_CLASSES[word], 0, 0, 0, 0
+
+    raise Exception(f"Cannot decode word {word:#010x}")
+
+# word -> Instruction object, for the resolve path and for printing
+def decodeWord(word):
+    return makeInstruction(*fields(word))
+
+def makeInstruction(cls, rd, r1, r2, imm):
+    if issubclass(cls, RType):
+        return cls(rd, r1, r2)
+
+    if issubclass(cls, IType):
+        return cls(rd, r1, imm)
+
+    if issubclass(cls, BType) or issubclass(cls, SType):
+        return cls(r1, r2, imm)
+
+    if cls == Jal or cls == Lui:
+        return cls(rd, imm)
+
+    return cls()
+
+# word -> the (opcode, rd, r1, r2, imm) record Decoder.decode would produce
+def decodeRecord(word):
+    cls, rd, r1, r2, imm = fields(word)
+
+    if imm % 4 != 0 and (issubclass(cls, BType) or cls == Jal):
+        raise Exception("Bad pc")
+
+    if issubclass(cls, (RType, IType, JType, UType)):
+        rd = rd or X0_SINK
+
+    return (opcode_of[cls], rd, r1, r2, imm)
+
+# compiled code repeats a small set of words, so records are decoded once per distinct word
+class RecordCache(dict):
+    def __missing__(self, word):
+        record = self[word] = decodeRecord(word)
+        return record
+
+# the compiler writes immediates of any 32 bit value, stack offsets and constants alike. one that
+# does not fit in 12 bits is built with a Lui, added to the base register and the rest goes in the
+# instruction itself. the destination holds the upper bits when it is free to, otherwise SCRATCH,
+# which compiled code never uses
+SCRATCH = "gp"
+
+def fits(imm, bits):
+    return -(1 << (bits - 1)) <= imm < 1 << (bits - 1)
+
+# value -> (upper 20 bits for Lui, sign extended low 12 bits)
+def split(value):
+    low = signed(value, 12)
+    return (value - low) >> 12 & 0xFFFFF, low
+
+# the branch taken exactly when the other is not
+INVERTED = {Beq : Bne, Bne : Beq, Blt : Bge, Bge : Blt}
+
+# instr as the instructions that encode it, pc is the byte address the first of them lands at
+def expand(instr, pc):
+    cls = type(instr)
+
+    # a far branch skips over a jump when its condition fails, the jump sits 4 bytes further on
+    if cls in B_FUNCT and not fits(instr.imm, 13):
+        return [INVERTED[cls](instr.r1, instr.r2, 8)] + expand(Jal("x0", instr.imm - 4), pc + 4)
+
+    # a far jump goes to its absolute address through SCRATCH
+    if cls == Jal and not fits(instr.imm, 21):
+        upper, low = split(pc + instr.imm)
+        return [Lui(SCRATCH, upper), Jalr(instr.rd, SCRATCH, low)]
+
+    if (cls not in I_FUNCT and cls not in S_FUNCT) or fits(instr.imm, 12):
+        return [instr]
+
+    upper, low = split(instr.imm)
+
+    if cls in S_FUNCT:
+        temp = SCRATCH
+    else:
+        temp = instr.rd if instr.rd not in (0, instr.r1) else SCRATCH
+
+    # slti compares against the immediate, so the whole value goes in a register
+    if cls == Slti or cls == SltiU:
+        compare = Slt if cls == Slti else SltU
+        return [Lui(temp, upper), Addi(temp, temp, low), compare(instr.rd, instr.r1, temp)]
+
+    instrs = [Lui(temp, upper)]
+
+    if instr.r1 != 0:
+        instrs.append(Add(temp, temp, instr.r1))
+
+    if cls in S_FUNCT:
+        return instrs + [cls(temp, instr.r2, low)]
+
+    return instrs + [cls(instr.rd, temp, low)]
+
+# points branches, jumps and absolute calls at where their target moved to. starts holds the new
+# index of every old instruction and of the end of the program
+def retarget(instr, index, starts, end):
+    if isinstance(instr, (BType, JType)):
+        target = index + instr.imm // 4
+        pc = starts[index]
+    elif type(instr) == Jalr and instr.r1 == 0:
+        target = instr.imm // 4
+        pc = 0
+    else:
+        return instr
+
+    if instr.imm % 4 != 0 or not 0 <= target <= end:
+        return instr
+
+    moved = copy.copy(instr)
+    moved.imm = (starts[target] - pc) * 4
+    return moved
+
+# expands every wide immediate and far branch, retargeting until the layout stops growing. programs that need no
+# expansion come back as they are
+def legalize(instrs):
+    instrs = list(instrs)
+    sizes = [1] * len(instrs)
+
+    while True:
+        starts = list(accumulate(sizes, initial=0))
+        expanded = [expand(retarget(instr, i, starts, len(instrs)), starts[i] * 4) for i, instr in enumerate(instrs)]
+        new_sizes = [len(e) for e in expanded]
+
+        if new_sizes == sizes:
+            return [instr for e in expanded for instr in e]
+
+        sizes = new_sizes
+
+def encodeProgram(instrs):
+    words = array("I", [encode(instr) for instr in legalize(instrs)])
+
+    if sys.byteorder == "big":
+        words.byteswap()
+
+    return MAGIC + words.tobytes()
+
+def writeBinary(instrs, path):
+    with open(path, "wb") as f:
+        f.write(encodeProgram(instrs))
+
+# a program file mapped into memory. indexing decodes one Instruction on demand,
+# records() decodes the whole program into Emu's internal form
+class Image:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.buffer[:len(MAGIC)] != MAGIC or (len(self.buffer) - len(MAGIC)) % 4 != 0:
+            self.close()
+            raise Exception(f"{path} is not an RV32 program")
+
+        # little endian on disk, read natively like Memory does
+        self.words = memoryview(self.buffer)[len(MAGIC):].cast("I")
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getitem__(self, index):
+        return decodeWord(self.words[index])
+
+    def __iter__(self):
+        return map(decodeWord, self.words)
+
+    def records(self):
+        return list(map(RecordCache().__getitem__, self.words))
+
+    def close(self):
+        if hasattr(self, "words"):
+            self.words.release()
+
+        self.buffer.close()
+        self.file.close()
+
+def loadBinary(path):
+    return Image(path)
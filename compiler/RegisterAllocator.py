@@ -0,0 +1,121 @@
+from Instruction import *
+
+# registers the stack machine code never uses. a register allocated expression keeps its values here
+POOL = ["t3", "t4", "t5", "at", "a1", "a2", "a3", "a4", "a5", "a6", "a7",
+        "s1", "s2", "s3", "s4", "s5", "s6", "s7", "s8", "s9", "s10", "s11"]
+
+# spilled values are loaded into the stack machine's own temporaries around each use
+SPILL_USES = ["t0", "t1"]
+SPILL_DEF = "t2"
+
+# straight line code over virtual registers. an op is (cls, rd, r1, r2, imm) in Instruction field
+# order, virtual registers are ints and physical ones keep their names ("sp", "x0")
+class VirtualCode:
+    def __init__(self):
+        self.ops = []
+        self.count = 0
+
+    def new(self):
+        self.count += 1
+        return self.count - 1
+
+    def emit(self, cls, rd, r1, r2=None, imm=None):
+        self.ops.append((cls, rd, r1, r2, imm))
+        return rd
+
+# the result is still live after the last op, it gets pushed
+def liveIntervals(ops, result):
+    start = {}
+    end = {result : len(ops)}
+
+    for i, (cls, rd, r1, r2, imm) in enumerate(ops):
+        for v in (r1, r2):
+            if type(v) == int:
+                end[v] = i
+
+        if type(rd) == int:
+            start.setdefault(rd, i)
+            end[rd] = max(end.get(rd, i), i)
+
+    return start, end
+
+# linear scan over the live intervals. a register is free again from the op that last reads it,
+# since an op reads its operands before it writes. under pressure the interval that ends last is
+# spilled to a word above the stack top, the expression pushes nothing until it is done so that
+# space is free. returns vreg -> register name or spill offset from sp
+def linearScan(ops, result, pool=POOL):
+    start, end = liveIntervals(ops, result)
+    free = list(reversed(pool))
+    active = []
+    where = {}
+    slots = 0
+
+    for v in sorted(start, key=start.get):
+        for other in [a for a in active if end[a] <= start[v]]:
+            active.remove(other)
+            free.append(where[other])
+
+        if free:
+            where[v] = free.pop()
+            active.append(v)
+            continue
+
+        # whichever value is needed longest lives in memory for its whole interval
+        victim = max(active, key=end.get)
+
+        if end[victim] > end[v]:
+            where[v] = where[victim]
+            active.remove(victim)
+            active.append(v)
+        else:
+            victim = v
+
+        where[victim] = slots
+        slots += 4
+
+    return where
+
+def place(reg, where):
+    return where[reg] if type(reg) == int else reg
+
+# the ops as instructions with every virtual register replaced by its location, returns the
+# instructions and the register the result ends up in
+def allocate(code, result, pool=POOL):
+    where = linearScan(code.ops, result, pool)
+    instr = Instructions()
+
+    for cls, rd, r1, r2, imm in code.ops:
+        scratch = iter(SPILL_USES)
+        regs = []
+
+        for v in (r1, r2):
+            loc = place(v, where)
+
+            if type(loc) == int:
+                reg = next(scratch)
+                instr += Lw(reg, "sp", loc)
+                loc = reg
+
+            regs.append(loc)
+
+        dest = place(rd, where)
+        spill = dest if type(dest) == int else None
+
+        if spill is not None:
+            dest = SPILL_DEF
+
+        if issubclass(cls, RType):
+            instr += cls(dest, regs[0], regs[1])
+        else:
+            instr += cls(dest, regs[0], imm)
+
+        if spill is not None:
+            instr += Sw("sp", dest, spill)
+
+    loc = place(result, where)
+
+    if type(loc) == int:
+        instr += Lw(SPILL_DEF, "sp", loc)
+        loc = SPILL_DEF
+
+    return instr, loc
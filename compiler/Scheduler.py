@@ -0,0 +1,107 @@
+import asyncio
+from collections import deque
+
+from Emu import BudgetExceeded, RUN_SLICE
+
+# slices a program runs in the fresh queue before it is treated as long running
+FRESH_SLICES = 8
+# out of every this many slices, one goes to the long queue even while fresh programs wait
+LONG_SHARE = 4
+
+class Job:
+    def __init__(self, name, emu, slices, future):
+        self.name = name
+        self.emu = emu
+        self.slices = slices
+        self.future = future
+        self.used = 0
+
+# interleaves many emulators on one event loop, one slice at a time. new programs are served
+# ahead of long running ones, so short programs finish quickly however many long ones are queued,
+# while every LONG_SHARE-th slice still goes to the long queue so nothing starves
+class Scheduler:
+    def __init__(self, slice=RUN_SLICE, max_steps=None, timeout=None, fresh_slices=FRESH_SLICES):
+        self.slice = slice
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.fresh_slices = fresh_slices
+
+        self.fresh = deque()
+        self.long = deque()
+        self.jobs = {}
+        self.turn = 0
+
+    def __len__(self):
+        return len(self.jobs)
+
+    # returns a future resolving to the same result dict Batch.runSource produces
+    def submit(self, name, emu, max_steps=None, timeout=None):
+        if name in self.jobs:
+            raise Exception(f"A program named {name} is already scheduled")
+
+        max_steps = self.max_steps if max_steps is None else max_steps
+        timeout = self.timeout if timeout is None else timeout
+
+        future = asyncio.get_running_loop().create_future()
+        job = Job(name, emu, emu.runSlices(self.slice, max_steps, timeout), future)
+
+        self.jobs[name] = job
+        self.fresh.append(job)
+        return future
+
+    def cancel(self, name):
+        job = self.jobs.pop(name, None)
+
+        if job is None:
+            return False
+
+        for queue in (self.fresh, self.long):
+            if job in queue:
+                queue.remove(job)
+
+        job.slices.close()
+        self.finish(job, None, "Cancelled")
+        return True
+
+    def finish(self, job, stats, error):
+        self.jobs.pop(job.name, None)
+
+        if not job.future.done():
+            job.future.set_result({"name" : job.name, "debug_info" : job.emu.debug_info,
+                                   "stats" : stats, "error" : error})
+
+    def pick(self):
+        self.turn += 1
+
+        if self.fresh and (not self.long or self.turn % LONG_SHARE):
+            return self.fresh.popleft()
+
+        return self.long.popleft()
+
+    # runs one slice of one program
+    def step(self):
+        job = self.pick()
+        job.used += 1
+
+        try:
+            next(job.slices)
+        except StopIteration as done:
+            self.finish(job, done.value.asDict(), None)
+            return
+        except BudgetExceeded as e:
+            self.finish(job, e.stats.asDict(), f"{type(e).__name__}: {e}")
+            return
+        except Exception as e:
+            self.finish(job, None, f"{type(e).__name__}: {e}")
+            return
+
+        if job.used < self.fresh_slices:
+            self.fresh.append(job)
+        else:
+            self.long.append(job)
+
+    # runs until every submitted program has finished, yielding to the event loop after each slice
+    async def run(self):
+        while self.fresh or self.long:
+            self.step()
+            await asyncio.sleep(0)
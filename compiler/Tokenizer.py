@@ -54,6 +54,8 @@ class TokenType(Enum):
     STRUCT = 40
     AMP = 41
 
+    OP_MOD = 42
+
 class Token:
     def __init__(self, kind: TokenType, value=None):
         self.value = value
@@ -71,6 +73,7 @@ token_map = {
     "-" : TokenType.OP_MINUS,
     "*" : TokenType.OP_MUL,
     "/" : TokenType.OP_DIV,
+    "%" : TokenType.OP_MOD,
 
     "fun" : TokenType.FUNC,
     "=" : TokenType.DECL_EQ,
@@ -228,7 +231,7 @@ class Tokenizer:
                 while self.isNext():
                     c = self.peek()
 
-                    if c == " " or c in "({!=;})+-/*,.[]":
+                    if c == " " or c in "({!=;})+-/%*,.[]":
                         break
 
                     chars += self.next()
@@ -0,0 +1,61 @@
+import sys
+
+from Decoder import opcode_names, X0_SINK
+
+DEFAULT_TRACE_SIZE = 1024
+
+# keeps the last `size` executed (pc, opcode, rd, value) records in a preallocated ring.
+# value is rd's contents after the instruction ran, None for the instruction that raised
+class Tracer:
+    def __init__(self, size=DEFAULT_TRACE_SIZE, pc_range=None, opcodes=None, dump_on_error=True, file=None):
+        if size < 1:
+            raise Exception("Trace size must be at least 1")
+
+        self.size = size
+        self.ring = [None] * size
+        self.pos = 0
+        self.count = 0
+
+        self.low, self.high = pc_range if pc_range is not None else (0, 1 << 32)
+
+        # indexed by opcode, so the run loop filters with one list lookup
+        names = None if opcodes is None else {name.lower() for name in opcodes}
+        self.wanted = [names is None or name.lower() in names for name in opcode_names]
+        self.filtered = pc_range is not None or opcodes is not None
+
+        self.dump_on_error = dump_on_error
+        self.file = file
+
+    def clear(self):
+        self.ring = [None] * self.size
+        self.pos = 0
+        self.count = 0
+
+    def record(self, pc, op, rd, value):
+        self.ring[self.pos] = (pc, op, rd, value)
+        self.pos = (self.pos + 1) % self.size
+        self.count += 1
+
+    # oldest first
+    def records(self):
+        if self.count < self.size:
+            return self.ring[:self.count]
+
+        return self.ring[self.pos:] + self.ring[:self.pos]
+
+    def format(self, record):
+        pc, op, rd, value = record
+        rd = 0 if rd == X0_SINK else rd
+
+        if value is None:
+            return f"{pc:>6}  {opcode_names[op].lower():<6} <raised>"
+
+        return f"{pc:>6}  {opcode_names[op].lower():<6} x{rd:<2} = {value}"
+
+    def dump(self, file=None):
+        file = file or self.file or sys.stderr
+        records = self.records()
+
+        print(f"last {len(records)} of {self.count} traced instructions:", file=file)
+        for record in records:
+            print(self.format(record), file=file)
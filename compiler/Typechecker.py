@@ -8,13 +8,15 @@ class TypeError(Exception):
         super().__init__(*args)
 
 class Typechecker:
-    def __init__(self, ast):
-        self.globals = {}
+    # imports are FunctionDecls of functions compiled in other units, see Linker
+    def __init__(self, ast, imports=None):
+        self.globals = dict(imports or {})
         self.locals = []
         self.ast = ast
 
         self.expected_return_type = None
         self.found_return = True
+        self.loop_depth = 0
     
     def run(self):
         self.ast.resolve(self)
@@ -152,6 +154,8 @@ class Typechecker:
         if addr_expr != PointerType(value_expr):
             raise TypeError(f"address {varset.addr_expr} of type {addr_expr} assigned {varset.value_expr} of type {value_expr}")
 
+        varset.type = value_expr
+
     def resolveVariableGet(self, varget):
         var_type = self.get(varget.name)
         var_type = PointerType(var_type)
@@ -186,7 +190,20 @@ class Typechecker:
         if cond != INT:
             raise Exception(f"Typecheck error: while cond was type {cond}")
         
+        self.loop_depth += 1
         wh.expr.resolve(self)
+        self.loop_depth -= 1
+
+        if wh.step:
+            wh.step.resolve(self)
+
+    def resolveContinue(self, cont):
+        if not self.loop_depth:
+            raise TypeError("continue outside of a loop")
+
+    def resolveBreak(self, brk):
+        if not self.loop_depth:
+            raise TypeError("break outside of a loop")
     
     def resolveFunctionDecl(self, fn):
         self.decl(fn.name)
@@ -194,6 +211,7 @@ class Typechecker:
         # works as long as there are not nested functions, which are not supported anyways
         self.setExpectedReturnType(fn.type)
         self.found_return = False
+        loop_depth, self.loop_depth = self.loop_depth, 0
         self.beginScope()
 
         if len(fn.args) != len(fn.argtypes):
@@ -209,6 +227,7 @@ class Typechecker:
             raise TypeError("Function with no return")
 
         self.endScope()
+        self.loop_depth = loop_depth
         self.set(fn.name, fn)
     
     def resolveFunctionCall(self, call):
@@ -236,7 +255,7 @@ class Typechecker:
             s.resolve(self)
 
         
-def typecheck(ast):
-    checker = Typechecker(ast)
+def typecheck(ast, imports=None):
+    checker = Typechecker(ast, imports)
     checker.run()
     
\ No newline at end of file
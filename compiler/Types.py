@@ -1,7 +1,9 @@
 class BaseType:
-    def __init__(self, name, words):
+    def __init__(self, name, words, size=None):
         self.name = name
         self.words = words
+        # bytes the type takes up in memory, values still take whole words on the stack
+        self.size = words * 4 if size is None else size
     
     def __eq__(self, o):
         return self.name == o.name and self.words == o.words
@@ -15,6 +17,12 @@ class BaseType:
     def getAllocWords(self):
         return self.words
 
+    def getSize(self):
+        return self.size
+
+    def getAlign(self):
+        return min(self.size, 4)
+
 class PointerType(BaseType):
     def __init__(self, type_, amount=0):
         super().__init__(None, 1)
@@ -26,13 +34,21 @@ class PointerType(BaseType):
     
     def getAllocWords(self):
         if self.amount:
-            return int(self.type.getWords() * self.amount)
+            return (int(self.type.getSize() * self.amount) + 3) // 4
         
         return 1
 
+    def getSize(self):
+        return 4
+
+    def getAlign(self):
+        return 4
     
     def getPointedWords(self):
         return self.type.getWords()
+
+    def getPointedSize(self):
+        return self.type.getSize()
     
     def __eq__(self, o):
         if type(o) != PointerType:
@@ -50,23 +66,37 @@ class StructType(BaseType):
 
         self.properties = properties 
         self.property_types = property_types
-        self.property_word_offsets = {}
+        # byte offsets, each property aligned to its own size. the whole struct is padded
+        # to a word multiple so it can be pushed and copied a word at a time
+        self.property_offsets = {}
+        self.offsets = []
 
         s = 0
         for i in range(len(self.properties)):
-            self.property_word_offsets[self.properties[i]] = s
-            s += self.property_types[i].getWords()
+            align = self.property_types[i].getAlign()
+            s = (s + align - 1) // align * align
+            self.property_offsets[self.properties[i]] = s
+            self.offsets.append(s)
+            s += self.property_types[i].getSize()
         
-        super().__init__(None, s)
+        words = (s + 3) // 4
+        super().__init__(None, words)
+
+        # true when every property sits in its own stack words, so a literal can just push them in order
+        word_offsets = [sum(t.getWords() for t in self.property_types[:i]) * 4 for i in range(len(self.property_types))]
+        self.word_layout = self.offsets == word_offsets and words == sum(t.getWords() for t in self.property_types)
     
     def getPropertyType(self, name):
         return self.property_types[self.properties.index(name)]
     
     def getPropertyOffset(self, name):
-        return self.property_word_offsets[name]
+        return self.property_offsets[name]
     
     def getPropertySize(self, name):
-        return self.getPropertySize(name).getWords()
+        return self.getPropertyType(name).getSize()
+
+    def getAlign(self):
+        return 4
     
     def __eq__(self, o):
         if not type(o) == UnknownStructType and not type(o) == StructType:
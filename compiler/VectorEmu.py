@@ -0,0 +1,457 @@
+import time
+
+import numpy as np
+
+from Instruction import register_name_to_num
+from Decoder import decode, OPCODES
+from Emu import RunStats, BudgetExceeded, RUN_CHUNK
+
+# every lane holds its own copy of memory, so the default is much smaller than Emu's
+VECTOR_MEM_SIZE = 1 << 16
+
+# pc of a lane that has stopped or faulted, larger than any real pc so the min pc search skips it
+PARKED = 1 << 62
+
+def wrap(values):
+    return (((values + 0x80000000) & 0xFFFFFFFF) - 0x80000000).astype(np.int32)
+
+# runs one program on many lanes at once. registers are stored as (33, lanes) so that one
+# register across all lanes is a contiguous vector, memory as (lanes, words).
+#
+# lanes that share a pc issue together. after a divergent branch the group with the lowest
+# pc runs first and the others rejoin it once it reaches their pc, like a SIMT warp.
+class VectorEmu:
+    def __init__(self, instrs, lanes, mem_size=VECTOR_MEM_SIZE, code=None):
+        if lanes < 1:
+            raise Exception("VectorEmu needs at least one lane")
+
+        if mem_size <= 0 or mem_size % 4 != 0:
+            raise Exception(f"Memory size must be a positive multiple of 4, was {mem_size}")
+
+        self.instrs = instrs
+        self.code = code if code is not None else decode(instrs)
+        self.lanes = lanes
+
+        self.regs = np.zeros((33, lanes), dtype=np.int32)
+        self.mem = np.zeros((lanes, mem_size >> 2), dtype=np.int32)
+        # byte and halfword views of the same lane memory, signed and unsigned
+        self.mem_views = {dtype : self.mem.view(dtype) for dtype in (np.int8, np.uint8, np.int16, np.uint16)}
+        self.pcs = np.zeros(lanes, dtype=np.int64)
+
+        self.debug_info = [[] for _ in range(lanes)]
+        self.errors = [None] * lanes
+
+        self.steps = 0
+        self.lane_steps = 0
+        self.loads = 0
+        self.stores = 0
+        self.branches_taken = 0
+        self.branches_not_taken = 0
+
+        self.all_lanes = np.arange(lanes)
+        # lanes issuing the current instruction, as a slice when it is all of them
+        self.sel = slice(None)
+        self.group = self.all_lanes
+
+        self.handlers = [self.__getattribute__(f"exec{cls.__name__}") for cls in OPCODES]
+
+    def getReg(self, reg_name):
+        return self.regs[register_name_to_num[reg_name]].copy()
+
+    def setReg(self, reg_name, values):
+        index = register_name_to_num[reg_name]
+
+        if index == 0 or index == register_name_to_num["PC"]:
+            raise Exception(f"Cannot set {reg_name} on a VectorEmu")
+
+        self.regs[index] = values
+
+    def loadWord(self, addr):
+        if addr & 3 or addr < 0 or addr >> 2 >= self.mem.shape[1]:
+            raise Exception("Bad address")
+
+        return self.mem[:, addr >> 2].copy()
+
+    def storeWord(self, addr, values):
+        if addr & 3 or addr < 0 or addr >> 2 >= self.mem.shape[1]:
+            raise Exception("Bad address")
+
+        self.mem[:, addr >> 2] = values
+
+    @property
+    def stopped(self):
+        return bool((self.pcs == PARKED).all())
+
+    def fault(self, lanes, message):
+        for lane in lanes.tolist():
+            self.errors[lane] = message
+
+        self.pcs[lanes] = PARKED
+
+    # picks the lowest pc among running lanes and the lanes sitting on it.
+    # returns that pc and the pc where the next waiting group sits
+    def regroup(self):
+        pcs = self.pcs
+        pc = int(pcs.min())
+
+        if pc == PARKED:
+            return None, PARKED
+
+        here = pcs == pc
+        group = np.flatnonzero(here)
+        limit = int(np.where(here, PARKED, pcs).min())
+
+        self.group = group
+        self.sel = slice(None) if len(group) == self.lanes else group
+        return pc, limit
+
+    def run(self, max_steps=None, timeout=None):
+        before = self.counters()
+        start = time.perf_counter()
+        deadline = None if timeout is None else start + timeout
+        remaining = max_steps
+
+        while not self.stopped:
+            if remaining is None:
+                chunk = RUN_CHUNK
+            elif remaining <= 0:
+                raise BudgetExceeded(f"Step budget of {max_steps} exhausted", self.statsSince(before, start))
+            else:
+                chunk = min(RUN_CHUNK, remaining)
+
+            retired = self.runGroups(chunk)
+
+            if remaining is not None:
+                remaining -= retired
+
+            if deadline is not None and not self.stopped and time.perf_counter() > deadline:
+                raise BudgetExceeded(f"Timeout of {timeout}s exceeded", self.statsSince(before, start))
+
+        return self.statsSince(before, start)
+
+    # issues at most n instructions, each one across every lane of the current group
+    def runGroups(self, n):
+        code = self.code
+        handlers = self.handlers
+        retired = 0
+
+        while retired < n:
+            pc, limit = self.regroup()
+            if pc is None:
+                break
+
+            width = len(self.group)
+            issued = 0
+
+            # straight line and uniform branches stay in this loop, handlers return None
+            # once the group splits, stops or faults and its lanes' pcs are already stored
+            while pc is not None and pc < limit and issued < n - retired:
+                index = pc >> 2
+
+                if index >= len(code):
+                    self.fault(self.group, "Bad pc")
+                    pc = None
+                    break
+
+                op, rd, r1, r2, imm = code[index]
+                pc = handlers[op](pc, rd, r1, r2, imm)
+                issued += 1
+
+            if pc is not None:
+                self.pcs[self.sel] = pc
+
+            retired += issued
+            self.lane_steps += issued * width
+
+        self.steps += retired
+        return retired
+
+    def counters(self):
+        return (self.lane_steps, self.loads, self.stores, self.branches_taken, self.branches_not_taken)
+
+    # instructions are counted per lane, so instructions_per_second is the sweep's total throughput
+    def statsSince(self, before, start):
+        deltas = [now - then for now, then in zip(self.counters(), before)]
+        return RunStats(deltas[0], time.perf_counter() - start, *deltas[1:])
+
+    # lanes whose operation failed are faulted, the rest continue at pc + 4 after a regroup
+    def split(self, pc, bad, message):
+        self.fault(self.group[bad], message)
+        self.pcs[self.group[~bad]] = pc + 4
+
+    def address(self, r1, imm, width=4):
+        addr = self.regs[r1, self.sel].astype(np.int64) + imm
+        bad = (addr & (width - 1) != 0) | (addr < 0) | (addr >= self.mem.shape[1] * 4)
+        return addr, bad
+
+    # sub-word loads and stores index the byte or halfword view, shift turns the address into an index
+    def load(self, pc, rd, r1, imm, dtype, shift):
+        addr, bad = self.address(r1, imm, 1 << shift)
+        view = self.mem_views[dtype]
+        group = self.group
+
+        self.loads += int((~bad).sum())
+
+        if bad.any():
+            good = ~bad
+            self.regs[rd, group[good]] = view[group[good], addr[good] >> shift]
+            self.split(pc, bad, "Bad address")
+            return None
+
+        self.regs[rd, self.sel] = view[group, addr >> shift]
+        return pc + 4
+
+    def store(self, pc, r1, r2, imm, dtype, shift):
+        addr, bad = self.address(r1, imm, 1 << shift)
+        view = self.mem_views[dtype]
+        group = self.group
+        values = self.regs[r2, self.sel].astype(dtype)
+
+        self.stores += int((~bad).sum())
+
+        if bad.any():
+            good = ~bad
+            view[group[good], addr[good] >> shift] = values[good]
+            self.split(pc, bad, "Bad address")
+            return None
+
+        view[group, addr >> shift] = values
+        return pc + 4
+
+    # handlers: same fields as Emu's decoded handlers, operating on self.sel lanes.
+    # int32 arrays wrap on overflow, which is the 32 bit behaviour Emu gets by masking
+
+    def execAdd(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        regs[rd, sel] = regs[r1, sel] + regs[r2, sel]
+        return pc + 4
+
+    def execSub(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        regs[rd, sel] = regs[r1, sel] - regs[r2, sel]
+        return pc + 4
+
+    def execXor(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        regs[rd, sel] = regs[r1, sel] ^ regs[r2, sel]
+        return pc + 4
+
+    def execOr(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        regs[rd, sel] = regs[r1, sel] | regs[r2, sel]
+        return pc + 4
+
+    def execAnd(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        regs[rd, sel] = regs[r1, sel] & regs[r2, sel]
+        return pc + 4
+
+    def execMul(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        regs[rd, sel] = regs[r1, sel] * regs[r2, sel]
+        return pc + 4
+
+    def operands(self, r1, r2):
+        regs, sel = self.regs, self.sel
+        return regs[r1, sel].astype(np.int64), regs[r2, sel].astype(np.int64)
+
+    def execMulh(self, pc, rd, r1, r2, imm):
+        a, b = self.operands(r1, r2)
+        self.regs[rd, self.sel] = (a * b) >> 32
+        return pc + 4
+
+    def execMulhsu(self, pc, rd, r1, r2, imm):
+        a, b = self.operands(r1, r2)
+        self.regs[rd, self.sel] = (a * (b & 0xFFFFFFFF)) >> 32
+        return pc + 4
+
+    def execMulhu(self, pc, rd, r1, r2, imm):
+        a, b = self.operands(r1, r2)
+        high = ((a & 0xFFFFFFFF).astype(np.uint64) * (b & 0xFFFFFFFF).astype(np.uint64)) >> np.uint64(32)
+        self.regs[rd, self.sel] = high.astype(np.uint32).view(np.int32)
+        return pc + 4
+
+    # RV32M division, see Binary.div: zero divisors give -1 or the dividend instead of trapping
+
+    def execDiv(self, pc, rd, r1, r2, imm):
+        a, b = self.operands(r1, r2)
+        zero = b == 0
+        b = np.where(zero, 1, b)
+        q = np.abs(a) // np.abs(b)
+        q = np.where((a < 0) != (b < 0), -q, q)
+        self.regs[rd, self.sel] = wrap(np.where(zero, -1, q))
+        return pc + 4
+
+    def execDivu(self, pc, rd, r1, r2, imm):
+        a, b = self.operands(r1, r2)
+        a, b = a & 0xFFFFFFFF, b & 0xFFFFFFFF
+        zero = b == 0
+        self.regs[rd, self.sel] = wrap(np.where(zero, 0xFFFFFFFF, a // np.where(zero, 1, b)))
+        return pc + 4
+
+    def execRem(self, pc, rd, r1, r2, imm):
+        a, b = self.operands(r1, r2)
+        zero = b == 0
+        r = np.abs(a) % np.abs(np.where(zero, 1, b))
+        self.regs[rd, self.sel] = np.where(zero, a, np.where(a < 0, -r, r))
+        return pc + 4
+
+    def execRemu(self, pc, rd, r1, r2, imm):
+        a, b = self.operands(r1, r2)
+        a, b = a & 0xFFFFFFFF, b & 0xFFFFFFFF
+        zero = b == 0
+        self.regs[rd, self.sel] = wrap(np.where(zero, a, a % np.where(zero, 1, b)))
+        return pc + 4
+
+    def execSlt(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        regs[rd, sel] = regs[r1, sel] < regs[r2, sel]
+        return pc + 4
+
+    def execSltU(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        regs[rd, sel] = regs[r1, sel].view(np.uint32) < regs[r2, sel].view(np.uint32)
+        return pc + 4
+
+    def execAddi(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        regs[rd, sel] = regs[r1, sel] + np.int32(((imm + 0x80000000) & 0xFFFFFFFF) - 0x80000000)
+        return pc + 4
+
+    def execSlti(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        regs[rd, sel] = regs[r1, sel].astype(np.int64) < imm
+        return pc + 4
+
+    def execSltiU(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        regs[rd, sel] = regs[r1, sel].view(np.uint32) < np.uint32(imm & 0xFFFFFFFF)
+        return pc + 4
+
+    def execLw(self, pc, rd, r1, r2, imm):
+        addr, bad = self.address(r1, imm)
+        group = self.group
+
+        self.loads += int((~bad).sum())
+
+        if bad.any():
+            good = ~bad
+            self.regs[rd, group[good]] = self.mem[group[good], addr[good] >> 2]
+            self.split(pc, bad, "Bad address")
+            return None
+
+        self.regs[rd, self.sel] = self.mem[group, addr >> 2]
+        return pc + 4
+
+    def execSw(self, pc, rd, r1, r2, imm):
+        addr, bad = self.address(r1, imm)
+        group = self.group
+        values = self.regs[r2, self.sel]
+
+        self.stores += int((~bad).sum())
+
+        if bad.any():
+            good = ~bad
+            self.mem[group[good], addr[good] >> 2] = values[good]
+            self.split(pc, bad, "Bad address")
+            return None
+
+        self.mem[group, addr >> 2] = values
+        return pc + 4
+
+    def execLb(self, pc, rd, r1, r2, imm):
+        return self.load(pc, rd, r1, imm, np.int8, 0)
+
+    def execLbu(self, pc, rd, r1, r2, imm):
+        return self.load(pc, rd, r1, imm, np.uint8, 0)
+
+    def execLh(self, pc, rd, r1, r2, imm):
+        return self.load(pc, rd, r1, imm, np.int16, 1)
+
+    def execLhu(self, pc, rd, r1, r2, imm):
+        return self.load(pc, rd, r1, imm, np.uint16, 1)
+
+    def execSb(self, pc, rd, r1, r2, imm):
+        return self.store(pc, r1, r2, imm, np.uint8, 0)
+
+    def execSh(self, pc, rd, r1, r2, imm):
+        return self.store(pc, r1, r2, imm, np.uint16, 1)
+
+    def branch(self, pc, taken, imm):
+        count = int(taken.sum())
+        self.branches_taken += count
+        self.branches_not_taken += len(taken) - count
+
+        if count == len(taken):
+            return pc + imm
+
+        if count == 0:
+            return pc + 4
+
+        # the group diverges, each lane keeps its own pc until they meet again
+        self.pcs[self.group] = np.where(taken, pc + imm, pc + 4)
+        return None
+
+    def execBeq(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        return self.branch(pc, regs[r1, sel] == regs[r2, sel], imm)
+
+    def execBne(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        return self.branch(pc, regs[r1, sel] != regs[r2, sel], imm)
+
+    def execBlt(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        return self.branch(pc, regs[r1, sel] < regs[r2, sel], imm)
+
+    def execBge(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        return self.branch(pc, regs[r1, sel] >= regs[r2, sel], imm)
+
+    def execJal(self, pc, rd, r1, r2, imm):
+        self.regs[rd, self.sel] = pc + 4
+        return pc + imm
+
+    def execLui(self, pc, rd, r1, r2, imm):
+        self.regs[rd, self.sel] = np.int32((((imm & 0xFFFFF) << 12) ^ 0x80000000) - 0x80000000)
+        return pc + 4
+
+    def execJalr(self, pc, rd, r1, r2, imm):
+        regs, sel = self.regs, self.sel
+        targets = (regs[r1, sel].astype(np.int64) + imm) & 0xFFFFFFFF
+        regs[rd, sel] = pc + 4
+
+        bad = targets & 3 != 0
+        first = int(targets[0])
+
+        if not bad.any() and (targets == first).all():
+            return first
+
+        self.pcs[self.group] = targets
+
+        if bad.any():
+            self.fault(self.group[bad], "Bad pc")
+
+        return None
+
+    def execStop(self, pc, rd, r1, r2, imm):
+        self.pcs[self.group] = PARKED
+        return None
+
+    def execDebug(self, pc, rd, r1, r2, imm):
+        addr = self.regs[2, self.sel].astype(np.int64) - 4
+        bad = (addr & 3 != 0) | (addr < 0) | (addr >> 2 >= self.mem.shape[1])
+        group = self.group
+
+        for lane, value in zip(group[~bad].tolist(), self.mem[group[~bad], addr[~bad] >> 2].tolist()):
+            self.debug_info[lane].append(value)
+
+        if bad.any():
+            self.split(pc, bad, "Bad address")
+            return None
+
+        return pc + 4
+
+    def execRaiseError(self, pc, rd, r1, r2, imm):
+        self.fault(self.group, "RaiseError instruction")
+        return None
@@ -0,0 +1,118 @@
+import io
+import tracemalloc
+
+import pytest
+
+from Instruction import Addi, Bne, Jal, Stop, Debug
+from InstructionGenerator import parse, assemble, assembleFile, disassemble, AssemblerError
+from RV32 import encode, loadBinary
+from Emu import Emu
+from emu_bench import PROGRAMS, build
+
+LOOP = """
+# counts t1 up to t0
+
+start:  addi t0, x0, 10
+        addi t1 x0 0
+loop:
+        addi t1 t1 1        ; body
+        bne t0 t1 loop
+        jal x0 done
+data:   .word 0x00100073, 0x00100073
+done:   addi t3 x0 data
+        stop
+"""
+
+def test_labels_and_words():
+    program = parse(LOOP)
+
+    assert len(program) == 9
+    assert type(program[5]) == Debug
+    assert str(program[3]) == str(Bne("t0", "t1", -4))
+    assert str(program[4]) == str(Jal("x0", 12))
+    assert program[7].imm == 20 and type(program[8]) == Stop
+    assert program.comments == {2 : "; body"}
+
+    words = list(assemble(io.StringIO(LOOP), words=True))
+    assert words[5:7] == [0x00100073, 0x00100073]
+    assert words[3] == encode(Bne("t0", "t1", -4))
+
+def test_errors():
+    for asm, message in [("addi t0 x0", "line 1: addi takes 3 operands"), ("\n\nfoo t0", "line 3: Unknown instruction"),
+                         ("bne t0 t1 nowhere", "Unknown label nowhere"), ("a: stop\na: stop", "line 2: Duplicate label"),
+                         ("addi q0 x0 1", "Bad reg: q0"), (".byte 1", "Unknown directive")]:
+        with pytest.raises(AssemblerError, match=message):
+            parse(asm)
+
+    assert list(assemble(io.StringIO(".word -1, here\nhere: stop"), words=True)) == [0xFFFFFFFF, 8, 0x73]
+
+    with pytest.raises(AssemblerError, match="line 1: .word 0xffffffff is not an instruction"):
+        parse(".word -1")
+
+def test_round_trip():
+    for code in PROGRAMS.values():
+        program = build(code)
+
+        for labels in [False, True]:
+            out = io.StringIO()
+            disassemble(program, out, labels=labels)
+            text = out.getvalue()
+
+            assert [str(instr) for instr in parse(text)] == [str(instr) for instr in program]
+            assert (":\n" in text) == labels
+
+    # targets before the start, just past the end and far past it
+    for asm, listing in [("addi t0 x0 1\nbeq x0 x0 -8\nstop", "beq x0 x0 -8"),
+                         ("addi t0 x0 1\nbeq x0 x0 8\nstop", "stop\nL12:"),
+                         ("addi t0 x0 1\nbeq x0 x0 16\nstop", "beq x0 x0 16")]:
+        program = parse(asm)
+        out = io.StringIO()
+        disassemble(program, out, labels=True)
+
+        assert listing in "\n".join(line.rstrip() for line in out.getvalue().splitlines())
+        assert [str(instr) for instr in parse(out.getvalue())] == [str(instr) for instr in program]
+
+    out = io.StringIO()
+    disassemble([encode(Addi("t0", "x0", 1)), Debug(), Stop()], out)
+    assert out.getvalue().split() == ["addi", "t0", "x0", "1", "debug", "stop"]
+
+def test_assemble_file(tmp_path):
+    src, dst = tmp_path / "loop.asm", tmp_path / "loop.bin"
+    src.write_text(LOOP)
+
+    assert assembleFile(src, dst) == 9
+
+    image = loadBinary(dst)
+    emu = Emu(image)
+    emu.run()
+    assert int(emu.getReg("t1")) == 10
+
+    listing = tmp_path / "loop.s"
+    with open(listing, "w") as f:
+        disassemble(image, f, labels=True)
+    image.close()
+
+    assert [str(instr) for instr in parse(listing.read_text())] == [str(instr) for instr in parse(src.read_text())]
+
+# neither direction holds the program, so memory stays flat as the file grows
+def test_streaming(tmp_path):
+    src, dst, listing = tmp_path / "big.asm", tmp_path / "big.bin", tmp_path / "big.s"
+
+    with open(src, "w") as f:
+        f.write("top:\n")
+        for i in range(20000):
+            f.write(f"addi t0 t0 {i % 2048}\n")
+        f.write("jal x0 top\nstop\n")
+
+    tracemalloc.start()
+    assembleFile(src, dst)
+    image = loadBinary(dst)
+    with open(listing, "w") as f:
+        disassemble(image, f, labels=True)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    image.close()
+
+    # the Instruction objects alone would take over 1MiB
+    assert peak < 256 << 10
+    assert listing.read_text().startswith("L0:\naddi t0 t0 0")
@@ -0,0 +1,31 @@
+import json
+
+from Batch import runBatch, readSources, main
+
+def test_batch():
+    sources = [(f"p{i}", f"int a = {i}; DEBUG a * 2;") for i in range(10)]
+    sources.append(("bad", "DEBUG 1 + 'a';"))
+    sources.append(("loop", "while (1) {}"))
+
+    results = {r["name"] : r for r in runBatch(sources, workers=2, chunk_size=3, max_steps=5000)}
+
+    assert len(results) == 12
+    for i in range(10):
+        assert results[f"p{i}"]["debug_info"] == [i * 2]
+        assert results[f"p{i}"]["stats"]["instructions"] > 0
+        assert results[f"p{i}"]["error"] is None
+
+    assert results["bad"]["error"].startswith("TypeError")
+    assert results["loop"]["error"].startswith("BudgetExceeded")
+    assert results["loop"]["stats"]["instructions"] == 5000
+
+def test_batch_cli(tmp_path, capsys):
+    (tmp_path / "a.src").write_text("DEBUG 1;")
+    (tmp_path / "b.src").write_text("DEBUG 2;")
+    (tmp_path / "notes.txt").write_text("not a program")
+
+    assert len(readSources([str(tmp_path)], "*.src")) == 2
+    assert main([str(tmp_path), "--glob", "*.src", "--workers", "1"]) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert sorted(json.loads(line)["debug_info"] for line in lines) == [[1], [2]]
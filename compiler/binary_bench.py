@@ -0,0 +1,19 @@
+from timeit import timeit
+from random import randint
+
+from Binary import Binary
+
+def bench(name, fn, number=20000):
+    seconds = timeit(fn, number=number)
+    print(f"{name:<8} {number / seconds:>14,.0f} ops/s")
+
+if __name__ == "__main__":
+    a = Binary(randint(-2 ** 31, 2 ** 31 - 1))
+    b = Binary(randint(-2 ** 31, 2 ** 31 - 1))
+
+    bench("add", lambda : a + b)
+    bench("sub", lambda : a - b)
+    bench("lt", lambda : a < b)
+    bench("eq", lambda : a == b)
+    bench("uint", lambda : a.uint())
+    bench("xor", lambda : a.bitwiseXor(b))
@@ -1,4 +1,5 @@
 from Emu import Binary
+from Binary import div, divu, rem, remu, mulh, mulhsu, mulhu
 from random import randint
 
 def test_add():
@@ -20,4 +21,53 @@ def test_sub():
 
 
 def create_binary_test(a, b, op):
-    assert op(a, b) == int(op(Binary(a), Binary(b)))
\ No newline at end of file
+    assert op(a, b) == int(op(Binary(a), Binary(b)))
+
+def test_wrap():
+    assert int(Binary(2 ** 31 - 1) + Binary(1)) == -2 ** 31
+    assert int(Binary(-2 ** 31) - Binary(1)) == 2 ** 31 - 1
+    assert Binary(-1).uint() == 2 ** 32 - 1
+    assert int(Binary(2 ** 16) * Binary(2 ** 16)) == 0
+
+def test_compare():
+    for _ in range(500):
+        a = randint(-2 ** 31, 2 ** 31 - 1)
+        b = randint(-2 ** 31, 2 ** 31 - 1)
+
+        assert (Binary(a) < Binary(b)) == (a < b)
+        assert (Binary(a) == Binary(b)) == (a == b)
+        assert (Binary(a) >= b) == (a >= b)
+        assert Binary(a).uint() == a % 2 ** 32
+
+def test_bitwise():
+    for _ in range(500):
+        a = randint(-2 ** 31, 2 ** 31 - 1)
+        b = randint(-2 ** 31, 2 ** 31 - 1)
+
+        assert int(Binary(a).bitwiseAnd(Binary(b))) == a & b
+        assert int(Binary(a).bitwiseOr(Binary(b))) == a | b
+        assert int(Binary(a).bitwiseXor(Binary(b))) == a ^ b
+
+def test_bits():
+    assert "".join(Binary(5)) == "00000000000000000000000000000101"
+    assert "".join(Binary(-1)) == "1" * 32
+    assert int(Binary("11111111111111111111111111111110")) == -2
+    assert int(Binary(3.0)) == 3
+
+def test_m_extension():
+    low, high = -0x80000000, 0x7FFFFFFF
+
+    assert div(7, -2) == -3 and rem(7, -2) == 1
+    assert div(-7, 2) == -3 and rem(-7, 2) == -1
+    assert div(5, 0) == -1 and rem(5, 0) == 5
+    assert div(low, -1) == low and rem(low, -1) == 0
+    assert divu(-1, 2) == high and remu(-1, 2) == 1
+    assert divu(5, 0) == -1 and remu(-5, 0) == -5
+
+    assert mulh(low, low) == 0x40000000
+    assert mulhu(-1, -1) == -2
+    assert mulhsu(-1, -1) == -1
+    assert mulh(high, 2) == 0
+
+    assert int(Binary(-7) / Binary(2)) == -3
+    assert int(Binary(-7) % 2) == -1
@@ -1,8 +1,14 @@
+import io
+
+import pytest
+
 from Tokenizer import tokenize
 from Parser import parse
 from Typechecker import typecheck, TypeError
-from Compiler import comp
+from Compiler import Compiler, comp, link
+from InstructionGenerator import disassemble, parse as assemble
 from Emu import Emu
+from Instruction import Instructions, Addi, Add, Sw, Beq
 
 def test_expr1():
     buildtest("DEBUG true;", True)
@@ -118,6 +124,22 @@ def test_for1():
     buildtest("int i = 2; for (int j = 0; j < 4; j = j + 1) {i = i * 2;} DEBUG i;", 32)
     buildtest("for (int i = 0; i < 5; i = i + 1) {DEBUG i;}", [0, 1, 2, 3, 4])
 
+def test_break_continue():
+    buildtest("int a = 0; while (1) {a = a + 1; if (a == 5) {break;}} DEBUG a;", 5)
+    buildtest("int a = 0; int s = 0; while (a < 10) {a = a + 1; if (a % 2 == 0) {continue;} s = s + a;} DEBUG s;", 25)
+    buildtest("int s = 0; for (int i = 0; i < 10; i = i + 1) {if (i % 3) {continue;} s = s + i;} DEBUG s;", 18)
+    buildtest("for (int i = 0; i < 10; i = i + 1) {for (int j = 0; j < 10; j = j + 1) {if (j == i) {break;}} "
+              "if (i == 2) {break;} DEBUG i;}", [0, 1])
+
+    # locals declared inside the loop are dropped on the way out
+    buildtest("int i = 0; while (i < 10) {int x = i * 2; {int y = x; if (y > 6) {break;}} i = i + 1;} "
+              "int j = 7; DEBUG i; DEBUG j;", [4, 7])
+    buildtest("int f(int n) {int i = 0; while (1) {int x = i; if (x == n) {return x * 10;} i = i + 1;} return 0;} "
+              "int i = 0; while (i < 3) {DEBUG f(i); i = i + 1; if (i == 2) {continue;} DEBUG 0 - i;}", [0, -1, 10, 20, -3])
+
+    buildtest_expect("break;", TypeError)
+    buildtest_expect("while (1) {int f() {continue; return 0;}}", TypeError)
+
 def test_fn1():
     buildtest("int f() {DEBUG 1; return 0;} f();", 1)
     buildtest("int f() {DEBUG 1; return 0;}", None)
@@ -551,6 +573,149 @@ def test_shadow1():
 def test_shadow2():
     buildtest("int a = 1; {int a = 2;} DEBUG a;", 1)
 
+def test_mod():
+    buildtest("DEBUG 17 % 5;", 2)
+    buildtest("DEBUG (0 - 17) % 5;", -2)
+    buildtest("DEBUG 17 % 0;", 17)
+    # *, / and % share a level and apply left to right
+    buildtest("DEBUG 20 / 5 % 3;", 1)
+    buildtest("DEBUG 7 * 5 / 2;", 17)
+    buildtest("DEBUG 17 % 5 * 3;", 6)
+    buildtest("int a = 10; int h = 0; while (a > 0) {h = (h * 31 + a) % 1000; a = a - 1;} DEBUG h;", 955)
+
+def test_div_rounding():
+    buildtest("DEBUG (0 - 7) / 2;", -3)
+    buildtest("DEBUG 7 / 0;", -1)
+
+def test_packed_chars():
+    buildtest("""
+        char[6] s = ['h', 'e', 'l', 'l', 'o', '!'];
+        s[1] = 'a';
+        char* p = s + 4;
+        DEBUG s[0];
+        DEBUG s[1];
+        DEBUG s[2];
+        DEBUG *p;
+        DEBUG *(p + 1);
+        DEBUG p - s;
+    """, ["h", "a", "l", "o", "!", 4])
+
+    buildtest("char[5] s; int after = 7; s[4] = 'x'; DEBUG s[4]; DEBUG s[3]; DEBUG after;", ["x", 0, 7])
+
+def test_packed_struct():
+    buildtest("""
+        struct s {char a; char b; int c; char d;};
+        s v = {'x', 'y', 3, 'z'};
+        int after = 9;
+        v.b = 'q';
+        DEBUG v.a;
+        DEBUG v.b;
+        DEBUG v.c;
+        DEBUG v.d;
+        DEBUG after;
+    """, ["x", "q", 3, "z", 9])
+
+    buildtest("""
+        struct s {char a; char b;};
+        s[3] l = [{'a', 'b'}, {'c', 'd'}, {'e', 'f'}];
+        s v = l[2];
+        l[0] = l[1];
+        DEBUG l[0].a;
+        DEBUG l[0].b;
+        DEBUG v.b;
+    """, ["c", "d", "f"])
+
+def test_packed_layout():
+    # the stack starts at 0, so a char array's bytes follow its pointer word
+    instr = comp(*parseChecked("char[6] s = ['p', 'a', 'c', 'k', 'e', 'd']; int after = 7;"))
+    emu = Emu(instr)
+    emu.run()
+    assert bytes(emu.mem.bytes[4:10]) == b"packed"
+    assert emu.mem.words[3] == 7
+
+    instr = comp(*parseChecked("struct s {char a; char b; int c; char d;}; s v = {'x', 'y', 3, 'z'}; int after = 9;"))
+    emu = Emu(instr)
+    emu.run()
+    assert bytes(emu.mem.bytes[0:2]) == b"xy"
+    assert list(emu.mem.words[1:4]) == [3, ord("z"), 9]
+
+def test_instructions_rope():
+    instrs = [Addi("t0", "x0", i) for i in range(100)]
+    rope = Instructions()
+
+    for instr in instrs[:50]:
+        rope += instr
+
+    rope = Instructions(*instrs[50:60]) + (rope + Instructions(*instrs[60:]))
+    order = instrs[50:60] + instrs[:50] + instrs[60:]
+
+    assert len(rope) == 100
+    assert rope.flatten() == order
+    assert [rope[i] for i in range(100)] == order
+    assert rope[-1] is order[-1] and rope.first is order[0] and rope.last is order[-1]
+    assert rope.dropLast(45).flatten() == order[:55]
+    assert rope.dropLast(100).flatten() == []
+
+    # joining never changes either side
+    left = Instructions(*instrs[:40])
+    joined = left + Instructions(*instrs[40:])
+    assert len(left) == 40 and len(joined) == 100
+
+def test_instruction_fields():
+    addi = Addi("sp", "x0", -8)
+    sw = Sw("sp", "t1", 4)
+
+    assert (addi.rd, addi.r1, addi.imm) == (2, 0, -8) and (sw.r1, sw.r2) == (2, 6)
+    assert str(addi) == "addi sp x0 -8".ljust(20) and str(Add(5, 6, 7)) == "add t0 t1 t2".ljust(20)
+    assert not hasattr(addi, "__dict__")
+
+    with pytest.raises(Exception):
+        Addi("PC", "x0", 0)
+
+    # comments stay with their instruction through joins, merges and drops
+    rope = Instructions(addi).commentFirst("# first")
+    for i in range(40):
+        rope += Instructions(Addi("t0", "t0", i)).commentLast(f"# {i}")
+
+    flat = rope.dropLast(1).flatten()
+    assert flat.comments[0] == "# first" and flat.comments[39] == "# 38" and 40 not in flat.comments
+    assert str(flat).splitlines()[1] == str(flat[1]) + "# 0"
+
+    # commenting a rope leaves every rope that shares its leaves as it was
+    base = Instructions(*[Addi("t0", "t0", i) for i in range(40)])
+    joined = base + Instructions(*[Addi("t1", "t1", i) for i in range(40)])
+    first, last = joined.commentFirst("# first"), joined.commentLast("# last")
+
+    assert base.flatten().comments == {} and joined.flatten().comments == {}
+    assert first.flatten().comments == {0 : "# first"} and last.flatten().comments == {79 : "# last"}
+    assert first.first is joined.first and len(first) == 80
+
+# the unlinked program is assembly with labels, linking it matches assembling its listing
+def test_labels_link():
+    code = "int f(int n) {if (n < 2) {return n;} return f(n - 1) + f(n - 2);} int i = 0; while (i < 5) {DEBUG f(i); i = i + 1;}"
+    c = Compiler(*parseChecked(code))
+    rope = c.run()
+    program = c.link(rope)
+
+    listing = io.StringIO()
+    disassemble(rope.flatten(), listing)
+    assert "fn.f:" in listing.getvalue() and "jalr ra x0 fn.f" in listing.getvalue()
+    assert [str(instr) for instr in assemble(listing.getvalue())] == [str(instr) for instr in program]
+    assert c.function_addrs == {"f" : 4}
+
+    with pytest.raises(Exception, match="Undefined label nowhere"):
+        link(Instructions(Beq("x0", "x0", "nowhere")))
+
+def test_deep_nesting():
+    depth = 20
+    code = "int a = 0; " + "if (a < 1000) { a = a + 1; " * depth + "}" * depth + " DEBUG a;"
+    buildtest(code, depth)
+
+def parseChecked(code):
+    ast, types = parse(tokenize(code))
+    typecheck(ast)
+    return ast, types
+
 def buildtest(code , value):
     if value is None:
         value = []
@@ -0,0 +1,66 @@
+import time
+
+from Tokenizer import tokenize
+from Parser import parse
+from Typechecker import typecheck
+from Compiler import comp
+from Emu import Emu
+from JIT import JIT
+from Decoder import decode
+
+PROGRAMS = {
+    "fib" : """
+        int fib(int i) {
+            if (i == 0 or i == 1) {
+                return 1;
+            } else {
+                return fib(i-1) + fib(i-2);
+            }
+        }
+        DEBUG fib(9);
+    """,
+    "while" : "int a = 0; while (a < 100) {a = a + 1;} DEBUG a;",
+    "for" : "int i = 2; for (int j = 0; j < 80; j = j + 1) {i = i + j;} DEBUG i;",
+}
+
+LOOPS = {
+    "loop" : "int a = 0; int s = 0; while (a < 20000) {a = a + 1; s = s + a * 2;} DEBUG s;",
+    "nested" : """
+        int total = 0;
+        for (int i = 0; i < 100; i = i + 1) {
+            for (int j = 0; j < 100; j = j + 1) {
+                total = total + i * j;
+            }
+        }
+        DEBUG total;
+    """,
+}
+
+def build(code):
+    tokens = tokenize(code)
+    ast, types = parse(tokens)
+    typecheck(ast)
+    return comp(ast, types)
+
+def bench(instr, reps, debug=False, **kwargs):
+    steps = 0
+    start = time.perf_counter()
+
+    for _ in range(reps):
+        emu = Emu(instr, **kwargs)
+        if debug:
+            emu.runResolve(10 ** 9)
+        else:
+            emu.run()
+        steps += emu.steps
+
+    return steps / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    for name, code in (PROGRAMS | LOOPS).items():
+        instr = build(code)
+        resolve = bench(instr, 3, debug=True)
+        decoded = bench(instr, 20)
+        cold = bench(instr, 20, jit=True)
+        warm = bench(instr, 20, jit=JIT(decode(instr)))
+        print(f"{name:<8} resolve {resolve:>11,.0f}   decoded {decoded:>11,.0f}   jit cold {cold:>11,.0f}   jit warm {warm:>11,.0f} instr/s")
@@ -0,0 +1,456 @@
+import io
+
+import pytest
+
+from InstructionGenerator import parseFile
+from Instruction import Addi, Lw, Stop, Sw, Debug, Mul, Mulh, Mulhsu, Mulhu, Div, Divu, Rem, Remu
+from Instruction import Lb, Lbu, Lh, Lhu, Sb, Sh, Beq
+from Decoder import decode, opcode_of, NO_EXEC
+from JIT import JIT
+from Tracer import Tracer
+from Memory import MemoryFault, LittleEndianView
+from Emu import Emu, BudgetExceeded
+from emu_bench import PROGRAMS, build
+from Tokenizer import tokenize
+from Parser import parse
+from Typechecker import typecheck
+from Compiler import comp
+
+def test_decoded_matches_resolve():
+    for code in PROGRAMS.values():
+        instr = build(code)
+
+        decoded = Emu(instr)
+        decoded.run()
+
+        resolved = Emu(instr)
+        resolved.runResolve(10 ** 6)
+
+        assert decoded.debug_info == resolved.debug_info
+        assert decoded.steps == resolved.steps
+        assert decoded.regs[:32] == resolved.regs[:32]
+        assert decoded.pc == resolved.pc
+
+def test_asm_file():
+    emu = Emu(parseFile("test_beq.asm"))
+    emu.run()
+
+    assert int(emu.getReg("t1")) == 10
+    assert int(emu.getReg("t3")) == 1
+
+def test_large_array():
+    emu = Emu(build("int[1000] a; a[999] = 5; a[0] = 2; DEBUG a[999] + a[0];"))
+    emu.run()
+
+    assert emu.debug_info == [7]
+
+def test_memory_view():
+    emu = Emu(build("int[3] a = [1, 2, 3];"), mem_size=64 << 20)
+    emu.run()
+
+    assert len(emu.mem) == 64 << 20
+    assert list(emu.mem.view(4, 3)) == [1, 2, 3]
+
+def test_file_memory(tmp_path):
+    path = tmp_path / "mem.bin"
+    emu = Emu(build("int a = 258;"), mem_size=4096, mem_file=path)
+    emu.run()
+    emu.mem.close()
+
+    contents = path.read_bytes()
+    assert len(contents) == 4096
+    assert int.from_bytes(contents[:4], "little") == 258
+
+# the explicit view big endian hosts use lays words out like the cast does here
+def test_little_endian_view():
+    data = bytearray(16)
+    words = LittleEndianView(data, "i")
+    halves = LittleEndianView(data, "H")
+
+    words[1] = -2
+    halves[5] = 0x1234
+    words[-1] = 258
+
+    assert bytes(data) == bytes(4) + (-2).to_bytes(4, "little", signed=True) + b"\0\0\x34\x12" + (258).to_bytes(4, "little")
+    assert (words[1], halves[2], words[1:3], len(halves)) == (-2, 0xFFFE, [-2, 0x12340000], 8)
+
+    with pytest.raises(IndexError):
+        words[4]
+
+def test_bad_address():
+    emu = Emu(build("int a = 0; DEBUG *(&a + 2000);"), mem_size=4096)
+
+    with pytest.raises(MemoryFault) as fault:
+        emu.run()
+
+    assert str(fault.value).startswith("Bad address: read of ")
+    assert fault.value.addr >= 4096
+    assert isinstance(emu.instrs[fault.value.pc >> 2], Lw)
+
+def test_jit_matches_interpreter():
+    for code in PROGRAMS.values():
+        instr = build(code)
+
+        plain = Emu(instr)
+        plain.run()
+
+        for threshold in [1, 5]:
+            jit = Emu(instr, jit=True, jit_threshold=threshold)
+            jit.run()
+
+            assert jit.jit.compiled
+            assert jit.debug_info == plain.debug_info
+            assert jit.steps == plain.steps
+            assert jit.regs[:32] == plain.regs[:32]
+            assert jit.pc == plain.pc
+            assert list(jit.mem.view(0, 256)) == list(plain.mem.view(0, 256))
+
+# a fault inside a compiled block leaves the same pc, counts and error as the interpreter
+def test_jit_fault():
+    programs = [
+        [Addi("t0", "x0", 0), Addi("t0", "t0", 4096), Lw("t1", "t0", 0), Beq("x0", "x0", -8), Stop()],
+        [Addi("t0", "x0", 4096), Lw("t1", "t0", -4), Sb("t0", "t1", 0), Addi("t0", "t0", 4096),
+         Beq("x0", "x0", -12), Stop()],
+    ]
+
+    for instr in programs:
+        faults = []
+
+        for jit in [False, True]:
+            emu = Emu(instr, jit=jit, jit_threshold=2)
+
+            with pytest.raises(MemoryFault) as fault:
+                emu.run()
+
+            faults.append((str(fault.value), fault.value.access, emu.pc, emu.steps, emu.loads, emu.stores))
+            assert emu.pc == fault.value.pc
+
+        assert faults[0] == faults[1]
+
+    assert faults[0][1] == "write"
+
+# a block the JIT has no translation for stays with the interpreter
+def test_jit_fallback():
+    jit = JIT(decode([Addi("t0", "x0", 1), Stop()]) + [(NO_EXEC, 0, 0, 0, 0)])
+    jit.compile(8)
+    jit.compile(0)
+
+    assert jit.compiled[8] is None and jit.compiled[0] is not None
+
+def test_run_stats():
+    instr = build("int a = 0; while (a < 10) {a = a + 1;} DEBUG a;")
+
+    for jit in [False, True]:
+        emu = Emu(instr, jit=jit, jit_threshold=2)
+        stats = emu.run()
+
+        assert emu.debug_info == [10]
+        assert stats.instructions == emu.steps
+        assert stats.branches_taken == 10 + 1
+        assert stats.branches_not_taken == 10
+        assert stats.loads > 0 and stats.stores > 0
+        assert stats.instructions_per_second > 0
+
+def test_step_budget():
+    instr = build("int a = 0; while (1) {a = a + 1;}")
+
+    for jit in [False, True]:
+        emu = Emu(instr, jit=jit, jit_threshold=2)
+
+        try:
+            emu.run(max_steps=10000)
+        except BudgetExceeded as e:
+            assert e.stats.instructions == 10000
+            assert emu.steps == 10000
+        else:
+            raise Exception()
+
+        try:
+            emu.run(timeout=0.01)
+        except BudgetExceeded as e:
+            assert e.stats.instructions > 0
+        else:
+            raise Exception()
+
+def test_exact_budget():
+    instr = build("DEBUG 1;")
+    steps = Emu(instr).run().instructions
+
+    emu = Emu(instr)
+    emu.run(max_steps=steps)
+    assert emu.debug_info == [1]
+
+def test_profiler():
+    instr = build("""
+        int f(int x) {return x + 1;}
+        int a = 0;
+        while (a < 10) {a = f(a);}
+        DEBUG a;
+    """)
+    emu = Emu(instr, profile=True)
+    stats = emu.run()
+    profiler = emu.profiler
+
+    assert emu.debug_info == [10]
+    assert profiler.total() == stats.instructions
+    assert profiler.context(4) == ("f", "")
+    assert profiler.blockCounts()[0][2] in (10, 11)
+
+    lines = profiler.collapsed().splitlines()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == stats.instructions
+    assert any(line.startswith("main;#WHILE") for line in lines)
+    assert any(line.startswith("f;") for line in lines)
+    assert "construct" in profiler.report()
+
+    # expressions in registers are charged to their own construct
+    ast, types = parse(tokenize("int a = 0; int s = 0; while (a < 10) {s = s + a * a; a = a + 1;} DEBUG s;"))
+    typecheck(ast)
+    emu = Emu(comp(ast, types, registers=True), profile=True)
+    emu.run()
+
+    assert emu.debug_info == [285]
+    assert any(line.startswith("main;#registers") for line in emu.profiler.collapsed().splitlines())
+
+def test_snapshot_restore():
+    instr = build("int a = 0; while (a < 50) {a = a + 1;} DEBUG a; int b = 7; DEBUG b;")
+
+    for jit in [False, True]:
+        emu = Emu(instr, jit=jit, jit_threshold=2, mem_size=64 << 20)
+
+        try:
+            emu.run(max_steps=200)
+        except BudgetExceeded:
+            pass
+
+        snap = emu.snapshot()
+        assert snap.size() == 4096
+
+        emu.run()
+        first = (emu.debug_info[:], emu.regs[:32], emu.pc, list(emu.mem.view(0, 16)))
+
+        for _ in range(3):
+            emu.restore(snap)
+            assert emu.steps == 200 and not emu.stop
+            emu.run()
+            assert (emu.debug_info, emu.regs[:32], emu.pc, list(emu.mem.view(0, 16))) == first
+
+def test_restore_clears_later_pages():
+    emu = Emu(build("int a = 1;"))
+    snap = emu.snapshot()
+    assert snap.pages == {}
+
+    emu.run()
+    emu.mem.storeWord(8192, 5)
+    emu.restore(snap)
+
+    assert emu.mem.loadWord(0) == 0
+    assert emu.mem.loadWord(8192) == 0
+    assert emu.mem.writtenPages() == []
+
+def test_tracer():
+    instr = build("int a = 0; while (a < 10) {a = a + 1;} DEBUG a;")
+    emu = Emu(instr, trace=8)
+    emu.run()
+
+    records = emu.tracer.records()
+    assert emu.tracer.count == emu.steps
+    assert len(records) == 8
+    assert records[-1][:2] == ((len(instr) - 1) * 4, opcode_of[Stop])
+    assert [pc for pc, _, _, _ in records] == sorted(pc for pc, _, _, _ in records)
+
+    stores = Emu(instr, trace=Tracer(100, opcodes=["sw"]))
+    stores.run()
+    assert stores.tracer.count == stores.stores
+    assert {op for _, op, _, _ in stores.tracer.records()} == {opcode_of[Sw]}
+
+def test_tracer_dumps_on_error():
+    out = io.StringIO()
+    emu = Emu([Addi("t0", "x0", 7), Addi("t1", "x0", -3), Lw("t2", "t1", 0), Stop()],
+              trace=Tracer(4, pc_range=(4, 16), file=out))
+
+    with pytest.raises(Exception):
+        emu.run()
+
+    assert emu.tracer.records() == [(4, opcode_of[Addi], 6, -3), (8, opcode_of[Lw], 7, None)]
+    assert out.getvalue().splitlines()[1:] == ["     4  addi   x6  = -3", "     8  lw     <raised>"]
+
+def test_breakpoints():
+    instr = build("int a = 0; while (a < 5) {a = a + 1;} DEBUG a;")
+    expected = Emu(instr, profile=True)
+    expected.run()
+
+    loop_store = [pc for pc in range(0, len(instr) * 4, 4) if isinstance(instr[pc >> 2], Sw)][1]
+    runs = expected.profiler.counts[loop_store >> 2]
+
+    emu = Emu(instr, jit=True)
+    emu.addBreakpoint(loop_store)
+    values = []
+
+    while not emu.stop:
+        emu.run()
+        if emu.paused:
+            assert emu.pc == loop_store
+            values.append(emu.mem.loadWord(0))
+
+    assert emu.debug_info == expected.debug_info
+    assert emu.steps == expected.steps
+    assert len(values) == runs > 1
+
+    hits = []
+    counted = Emu(instr)
+    counted.addBreakpoint(loop_store, lambda emu, pc : hits.append(pc))
+    counted.run()
+    assert counted.paused is None and len(hits) == runs
+
+    counted.removeBreakpoint(loop_store)
+    assert counted.code == expected.code
+
+def test_watchpoints():
+    instr = build("int a = 0; while (a < 5) {a = a + 1;} DEBUG a;")
+
+    emu = Emu(instr)
+    emu.addWatchpoint(0)
+    writes = []
+
+    while not emu.stop:
+        emu.run()
+        if emu.paused:
+            writes.append(emu.mem.loadWord(0))
+
+    assert writes == [0, 1, 2, 3, 4, 5]
+    assert emu.debug_info == [5]
+
+    reads = []
+    emu = Emu(instr)
+    emu.addWatchpoint(0, read=True, write=False, callback=lambda emu, pc, addr, value : reads.append(value))
+    emu.run()
+    assert reads and set(reads) == {0, 1, 2, 3, 4, 5}
+
+    emu.removeWatchpoint(0)
+    assert emu.handlers[opcode_of[Lw]] == emu.execLw
+    assert emu.handlers[opcode_of[Sw]] == emu.execSw
+    assert emu.handlers[opcode_of[Sb]] == emu.execSb
+
+# byte and halfword accesses fire the watch on the word that contains them
+def test_sub_word_watchpoints():
+    instr = [Addi("t0", "x0", 4096), Addi("t1", "x0", 0x1FF), Sb("t0", "t1", 1), Lbu("t2", "t0", 1),
+             Sh("t0", "t1", 6), Lw("t2", "t0", 8), Stop()]
+
+    for paged in [False, True]:
+        hits = []
+        emu = Emu(instr, paged=paged)
+        emu.addWatchpoint(4096, read=True, callback=lambda emu, pc, addr, value : hits.append((pc, addr, value)))
+        emu.run()
+
+        assert hits == [(8, 4096, 0xFF), (12, 4096, 0xFF)]
+
+def test_paged_memory():
+    for code in PROGRAMS.values():
+        instr = build(code)
+
+        flat = Emu(instr)
+        flat.run()
+
+        paged = Emu(instr, paged=True, jit=True)
+        paged.setReg("sp", 0x7FFF0000)
+        paged.run()
+
+        assert paged.debug_info == flat.debug_info
+        assert paged.steps == flat.steps
+        assert len(paged.mem) == 1 << 32
+        assert paged.mem.writtenPages()[0] == 0x7FFF0000 >> 12
+        assert paged.mem.footprint() <= 2 * 4096
+
+def test_paged_snapshot():
+    instr = build("int a = 0; while (a < 50) {a = a + 1;} DEBUG a;")
+    emu = Emu(instr, paged=True)
+
+    with pytest.raises(BudgetExceeded):
+        emu.run(max_steps=200)
+
+    snap = emu.snapshot()
+    emu.run()
+    emu.restore(snap)
+    emu.run()
+    assert emu.debug_info == [50]
+
+def test_paged_permissions():
+    instr = build("int a = 1; DEBUG a;")
+
+    emu = Emu(instr, regions=[(0, 1 << 20, "rwx"), (0, 4096, "rx")])
+    with pytest.raises(MemoryFault) as fault:
+        emu.run()
+    assert fault.value.reason == "Permission denied" and fault.value.access == "write"
+    assert fault.value.addr == 0 and isinstance(instr[fault.value.pc >> 2], Sw)
+
+    emu = Emu(instr, regions=[(0, 1 << 20, "rw")])
+    with pytest.raises(MemoryFault) as fault:
+        emu.run()
+    assert fault.value.access == "execute" and fault.value.pc == 0
+
+    emu = Emu(instr, mem_size=1 << 20, paged=True)
+    emu.setReg("sp", 1 << 20)
+    with pytest.raises(MemoryFault) as fault:
+        emu.run()
+    assert fault.value.reason == "Bad address" and fault.value.addr == 1 << 20
+
+def test_m_extension_paths():
+    values = [0, 1, -1, 7, -7, 0x7FFFFFFF, -0x80000000]
+    ops = [Mul, Mulh, Mulhsu, Mulhu, Div, Divu, Rem, Remu]
+    instrs = []
+
+    for a in values:
+        for b in values:
+            instrs += [Addi("t0", "x0", a), Addi("t1", "x0", b)]
+            for op in ops:
+                instrs += [op("t2", "t0", "t1"), Sw("sp", "t2", 0), Addi("sp", "sp", 4), Debug()]
+    instrs.append(Stop())
+
+    decoded = Emu(instrs)
+    decoded.run()
+
+    resolved = Emu(instrs)
+    resolved.runResolve(10 ** 6)
+
+    compiled = Emu(instrs, jit=True, jit_threshold=1)
+    compiled.run()
+
+    assert decoded.debug_info == resolved.debug_info == compiled.debug_info
+    # 7 / 0
+    assert decoded.debug_info[len(ops) * 3 * len(values) + ops.index(Div)] == -1
+
+def test_byte_half_paths():
+    instrs = [Addi("s1", "x0", 64)]
+
+    for value in [0, 0x7F, 0x80, 0xFF, -1, 0x1234, 0x8001, -2]:
+        instrs += [Addi("t0", "x0", value), Sw("s1", "x0", 0), Sb("s1", "t0", 1), Sh("s1", "t0", 2)]
+        for load in [Lb("t1", "s1", 1), Lbu("t1", "s1", 1), Lh("t1", "s1", 2), Lhu("t1", "s1", 2), Lw("t1", "s1", 0)]:
+            instrs += [load, Sw("sp", "t1", 0), Addi("sp", "sp", 4), Debug()]
+    instrs.append(Stop())
+
+    decoded = Emu(instrs)
+    decoded.run()
+
+    resolved = Emu(instrs)
+    resolved.runResolve(10 ** 6)
+
+    compiled = Emu(instrs, jit=True, jit_threshold=1)
+    compiled.run()
+
+    paged = Emu(instrs, paged=True)
+    paged.run()
+
+    assert decoded.debug_info == resolved.debug_info == compiled.debug_info == paged.debug_info
+    # 0x80 stored as a byte and a half
+    assert decoded.debug_info[10:15] == [-128, 0x80, 0x80, 0x80, 0x00808000]
+    # -2 sign extends from both widths
+    assert decoded.debug_info[-5:-1] == [-2, 0xFE, -2, 0xFFFE]
+    assert decoded.loads == 40 and decoded.stores == 8 * 3 + 40
+
+def test_sub_word_faults():
+    for instrs in [[Addi("t0", "x0", 3), Lh("t1", "t0", 0)], [Addi("t0", "x0", 1), Sh("t0", "t0", 0)],
+                   [Addi("t0", "x0", -1), Lb("t1", "t0", 0)], [Sb("x0", "x0", 1 << 20)]]:
+        for emu in [Emu(instrs + [Stop()]), Emu(instrs + [Stop()], jit=True, jit_threshold=1),
+                    Emu(instrs + [Stop()], paged=True, mem_size=1 << 16)]:
+            with pytest.raises(MemoryFault):
+                emu.run()
@@ -0,0 +1,121 @@
+import pytest
+
+from Tokenizer import tokenize
+from Parser import parse
+from Typechecker import typecheck
+from Compiler import comp
+from Emu import Emu
+from Linker import ObjectFile, LinkError, compileUnit, linkObjects, build, objectPath, main
+
+UNITS = [
+    "int sq(int n) {return n * n;} int i = 0; while (i < 3) {DEBUG sq(i); i = i + 1;}",
+    "int sum(int n) {int s = 0; int i = 0; while (i <= n) {s = s + sq(i); i = i + 1;} return s;} DEBUG sum(3);",
+    "int first(int* p) {return *p;} char c(char x) {return x;} int[2] a = [7, 8]; DEBUG first(a) + sum(1); "
+    "if (sum(2) == 5) {DEBUG 1;} else {DEBUG 0;}",
+]
+
+def run(program):
+    emu = Emu(program)
+    emu.run()
+    return emu.debug_info
+
+def runWhole(code):
+    ast, types = parse(tokenize(code))
+    typecheck(ast)
+    return run(comp(ast, types))
+
+def compileAll(units):
+    objects = []
+    exports = {}
+
+    for unit in units:
+        objects.append(compileUnit(unit, exports))
+        exports.update(objects[-1].exports)
+
+    return objects
+
+# linking separately compiled units runs the same as compiling them as one program
+def test_link_matches_whole_program():
+    objects = compileAll(UNITS)
+
+    assert run(linkObjects(objects)) == runWhole(" ".join(UNITS)) == [0, 1, 4, 14, 8, 1]
+    assert set(objects[2].exports) == {"first", "c"}
+
+def test_object_bytes():
+    obj = compileAll(UNITS)[0]
+    data = obj.toBytes()
+    loaded = ObjectFile.fromBytes(data)
+
+    assert loaded.code == obj.code and loaded.symbols == obj.symbols and loaded.exports == obj.exports
+    assert loaded.relocations == obj.relocations and loaded.main_start == obj.main_start
+    assert len(data) < 8 * len(obj.code) + 512
+
+    for junk in [b"", b"RVO1", data[:-1], b"ELF" + data[3:]]:
+        with pytest.raises(LinkError):
+            ObjectFile.fromBytes(junk)
+
+def test_link_errors():
+    sq = compileUnit(UNITS[0])
+
+    with pytest.raises(LinkError, match="sq is defined twice"):
+        linkObjects([sq, sq])
+
+    # a call into a unit that is left out of the link
+    with pytest.raises(LinkError, match="Undefined label fn.sq"):
+        linkObjects([compileUnit(UNITS[1], sq.exports)])
+
+    # units only see the functions of the units before them
+    with pytest.raises(Exception):
+        compileUnit(UNITS[1])
+
+def test_incremental_build(tmp_path):
+    paths = []
+    for i, unit in enumerate(UNITS):
+        paths.append(tmp_path / f"unit{i}.src")
+        paths[-1].write_text(unit)
+
+    out = tmp_path / "build"
+    objects, rebuilt = build(paths, out)
+    assert rebuilt == paths
+    assert run(linkObjects(objects)) == [0, 1, 4, 14, 8, 1]
+
+    assert build(paths, out)[1] == []
+
+    # a body change only rebuilds its own unit
+    paths[1].write_text(UNITS[1].replace("DEBUG sum(3);", "DEBUG sum(4);"))
+    objects, rebuilt = build(paths, out)
+    assert rebuilt == [paths[1]]
+    assert run(linkObjects(objects)) == [0, 1, 4, 30, 8, 1]
+
+    # a signature change also rebuilds the units after it
+    paths[0].write_text(UNITS[0] + " int cube(int n) {return n * n * n;}")
+    assert build(paths, out)[1] == paths
+
+    with open(objectPath(paths[2], out), "wb") as f:
+        f.write(b"garbage")
+    assert build(paths, out)[1] == [paths[2]]
+
+# units with the same file name in different directories keep separate objects
+def test_same_file_names(tmp_path):
+    paths = []
+    for i, unit in enumerate(UNITS):
+        (tmp_path / f"dir{i}").mkdir()
+        paths.append(tmp_path / f"dir{i}" / "unit.src")
+        paths[-1].write_text(unit)
+
+    out = tmp_path / "build"
+    assert build(paths, out)[1] == paths
+    assert len(list(out.iterdir())) == len(paths)
+
+    objects, rebuilt = build(paths, out)
+    assert rebuilt == []
+    assert run(linkObjects(objects)) == [0, 1, 4, 14, 8, 1]
+
+def test_cli(tmp_path, capsys):
+    paths = []
+    for i, unit in enumerate(UNITS[:2]):
+        paths.append(tmp_path / f"unit{i}.src")
+        paths[-1].write_text(unit)
+
+    assert main([str(path) for path in paths] + ["--out-dir", str(tmp_path / "build")]) == 0
+    assert capsys.readouterr().out.split() == ["0", "1", "4", "14"]
@@ -0,0 +1,52 @@
+import pytest
+
+from Tokenizer import tokenize
+from Parser import parse
+from Typechecker import typecheck
+from Compiler import comp
+from Emu import BudgetExceeded
+from Pipeline import Pipeline, PhaseRecorder, countNodes
+from Batch import runSource
+
+CODE = "int[3] a = [1, 2, 3]; int s = 0; for (int i = 0; i < 3; i = i + 1) {s = s + a[i];} DEBUG s;"
+
+def test_phases():
+    recorder = PhaseRecorder()
+    emu = Pipeline([recorder]).run(CODE)
+
+    assert emu.debug_info == [6]
+    assert [s.phase for s in recorder.stats] == ["tokenize", "parse", "typecheck", "comp", "run"]
+
+    tokens = tokenize(CODE)
+    ast, types = parse(tokens)
+    typecheck(ast)
+    sizes = [len(tokens), countNodes(ast), None, len(comp(ast, types)), emu.steps]
+    assert [s.size for s in recorder.stats] == sizes
+
+    for stats in recorder.stats:
+        assert stats.wall_time >= 0 and stats.cpu_time >= 0
+        assert stats.peak >= 0
+
+    # the compiled program is kept until Emu gets it
+    assert recorder.stats[3].allocated > 0
+
+def test_no_hooks():
+    plain = Pipeline().run(CODE)
+    timed = Pipeline([PhaseRecorder(memory=False)]).run(CODE)
+
+    assert plain.debug_info == timed.debug_info == [6]
+    assert plain.steps == timed.steps
+
+def test_failed_phase():
+    recorder = PhaseRecorder()
+
+    with pytest.raises(BudgetExceeded):
+        Pipeline([recorder], max_steps=100).run("while (1) {}")
+
+    assert recorder.stats[-1].phase == "run"
+    assert recorder.stats[-1].size is None
+
+    result = runSource("bad", "DEBUG 1 + 'a';", phases=True)
+    assert result["error"].startswith("TypeError")
+    assert [p["phase"] for p in result["phases"]] == ["tokenize", "parse", "typecheck"]
+    assert "phases" not in runSource("good", CODE)
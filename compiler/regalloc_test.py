@@ -0,0 +1,60 @@
+import functools
+
+import pytest
+
+import comp_test
+from comp_test import *
+from Compiler import Compiler, comp
+from RegisterAllocator import VirtualCode, linearScan, allocate
+from Instruction import Program, Addi, Add, Lw, Sw, Debug, Stop
+
+# every compiler test again, with expressions in registers
+@pytest.fixture(autouse=True)
+def registers(monkeypatch):
+    monkeypatch.setattr(comp_test, "comp", functools.partial(comp, registers=True))
+    monkeypatch.setattr(comp_test, "Compiler", functools.partial(Compiler, registers=True))
+
+def count(program, *classes):
+    return sum(type(instr) in classes for instr in program)
+
+def test_fewer_loads_and_stores():
+    code = """
+        struct p {int x; int y;};
+        p a = {3, 4};
+        int[3] l = [5, 6, 7];
+        int i = 1;
+        DEBUG a.x * a.x + a.y * a.y == 25;
+        DEBUG (l[i] + l[i + 1]) * (i + 2) - l[0] % 3;
+        DEBUG i < 2 and l[2] >= 7 or a.x != 3;
+    """
+    stack = comp(*parseChecked(code))
+    registers = comp(*parseChecked(code), registers=True)
+
+    for program in [stack, registers]:
+        emu = Emu(program)
+        emu.run()
+        assert emu.debug_info == [1, 37, 1]
+
+    assert count(registers, Lw, Sw) * 3 < count(stack, Lw, Sw)
+    assert len(registers) * 2 < len(stack)
+
+# more values live at once than there are registers
+def test_spill():
+    depth = 24
+    code = "int a = 2; DEBUG " + "a + (" * depth + "a" + ")" * depth + ";"
+    buildtest(code, 2 * (depth + 1))
+    assert any(type(instr) == Sw and instr.r2 == 7 for instr in comp(*parseChecked(code), registers=True))
+
+    code = VirtualCode()
+    values = [code.emit(Addi, code.new(), "x0", imm=i) for i in range(4)]
+    total = values[0]
+    for value in values[1:]:
+        total = code.emit(Add, code.new(), total, value)
+
+    where = linearScan(code.ops, total, ["t3", "t4"])
+    assert sorted(loc for loc in where.values() if type(loc) == int) == [0, 4]
+
+    instr, reg = allocate(code, total, ["t3", "t4"])
+    emu = Emu(Program(instr.flatten()) + [Sw("sp", reg, 0), Addi("sp", "sp", 4), Debug(), Stop()])
+    emu.run()
+    assert emu.debug_info == [6]
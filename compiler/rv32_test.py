@@ -0,0 +1,120 @@
+import pytest
+
+from Instruction import *
+from Decoder import decode
+from Emu import Emu
+from RV32 import encode, decodeWord, writeBinary, loadBinary, legalize, ECALL, EBREAK
+from emu_bench import PROGRAMS, build
+
+def test_known_encodings():
+    assert encode(Addi("t0", "x0", 10)) == 0x00A00293
+    assert encode(Add("t0", "t1", "t2")) == 0x007302B3
+    assert encode(Sub("a0", "a0", "t0")) == 0x40550533
+    assert encode(Mul("t0", "t0", "t1")) == 0x026282B3
+    assert encode(Lw("t0", "sp", -4)) == 0xFFC12283
+    assert encode(Sw("sp", "t0", 0)) == 0x00512023
+    assert encode(Bne("t0", "t1", -4)) == 0xFE629EE3
+    assert encode(Jal("ra", 2048)) == 0x001000EF
+    assert encode(Jalr("x0", "ra", 0)) == 0x00008067
+    assert encode(Rem("t0", "t1", "t2")) == 0x027362B3
+    assert encode(Mulhu("a0", "a1", "a2")) == 0x02C5B533
+    assert encode(Lbu("t0", "a0", 3)) == 0x00354283
+    assert encode(Sb("a0", "t0", 1)) == 0x005500A3
+    assert encode(Stop()) == ECALL
+    assert encode(Debug()) == EBREAK
+    assert encode(Lui("t0", 0x12345)) == 0x123452B7
+
+def test_round_trip():
+    instrs = [Addi("t0", "x0", -2048), Addi("t0", "t0", 2047), SltiU("t1", "t0", -1), Beq("t0", "x0", 4092),
+              Blt("t0", "t1", -4096), Jal("x0", -(1 << 20)), Div("a0", "a1", "a2"), Divu("a0", "a1", "a2"),
+              Rem("a0", "a1", "a2"), Remu("a0", "a1", "a2"), Mulh("a0", "a1", "a2"), Mulhsu("a0", "a1", "a2"),
+              Lb("t0", "sp", -1), Lbu("t0", "sp", 5), Lh("t0", "sp", -2), Lhu("t0", "sp", 6),
+              Sb("sp", "t0", -3), Sh("sp", "t0", 2046), Lui("a0", 0xFFFFF), RaiseError()]
+
+    for instr in instrs:
+        assert decode([decodeWord(encode(instr))]) == decode([instr])
+
+def test_out_of_range():
+    for instr in [Addi("t0", "x0", 2048), Lw("t0", "sp", -2049), Beq("t0", "x0", 4096),
+                  Beq("t0", "x0", 6), Jal("x0", 1 << 20)]:
+        with pytest.raises(Exception):
+            encode(instr)
+
+def test_load_and_run(tmp_path):
+    for name, code in PROGRAMS.items():
+        instr = build(code)
+        path = tmp_path / f"{name}.bin"
+        writeBinary(instr, path)
+
+        assert path.stat().st_size == 4 + 4 * len(instr)
+
+        image = loadBinary(path)
+        assert image.records() == decode(instr)
+
+        expected = Emu(instr)
+        expected.run()
+
+        emu = Emu(image, jit=True)
+        emu.run()
+        assert emu.debug_info == expected.debug_info
+
+        resolve = Emu(image)
+        resolve.runResolve(10 ** 6)
+        assert resolve.debug_info == expected.debug_info
+
+        image.close()
+
+# constants and stack offsets past 12 bits are built with lui, which moves every jump target after them
+def test_wide_immediates(tmp_path):
+    code = """
+        int big(int n) {int[1000] l; l[999] = n; return l[999] * 3000 + l[0];}
+        int small(int n) {return n - 70000;}
+        int a = 20000;
+        int i = 0;
+        while (i < 2) {DEBUG big(a + i) - 50000000; DEBUG small(a); i = i + 1;}
+        DEBUG a > 0 - 5000;
+    """
+    instr = build(code)
+    path = tmp_path / "wide.bin"
+    writeBinary(instr, path)
+
+    image = loadBinary(path)
+    assert len(image) > len(instr) and any(type(word) == Lui for word in image)
+
+    expected = Emu(instr)
+    expected.run()
+    assert expected.debug_info == [10000000, -50000, 10003000, -50000, 1]
+
+    for jit in [False, True]:
+        emu = Emu(image, jit=jit)
+        emu.run()
+        assert emu.debug_info == expected.debug_info
+
+    image.close()
+
+# branches past 4 KiB hop over a jal, jumps past 1 MiB go through lui and jalr
+def test_far_branches(tmp_path):
+    depth = 20
+    code = "int a = 0; " + "if (a < 1000) { a = a + 1; int[40] pad; " * depth + "}" * depth + " DEBUG a;"
+    instr = build(code)
+    assert any(isinstance(i, BType) and i.imm > 4095 for i in instr)
+
+    path = tmp_path / "far.bin"
+    writeBinary(instr, path)
+    image = loadBinary(path)
+
+    emu = Emu(image)
+    emu.run()
+    assert emu.debug_info == [depth]
+    image.close()
+
+    program = legalize([Bne("t0", "x0", 8), Jal("ra", 3 << 20), Beq("t0", "x0", -8192), Stop()])
+    assert [str(i).split() for i in program] == [["bne", "t0", "x0", "12"], ["lui", "gp", "768"], ["jalr", "ra", "gp", "4"],
+                                                 ["bne", "t0", "x0", "8"], ["jal", "x0", "-8196"], ["stop"]]
+
+def test_not_a_program(tmp_path):
+    path = tmp_path / "junk.bin"
+    path.write_bytes(b"ELF\x7f0000")
+
+    with pytest.raises(Exception):
+        loadBinary(path)
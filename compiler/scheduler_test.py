@@ -0,0 +1,57 @@
+import asyncio
+
+from Emu import Emu
+from Scheduler import Scheduler
+from emu_bench import PROGRAMS, build
+
+def test_run_async():
+    for code in PROGRAMS.values():
+        instr = build(code)
+
+        expected = Emu(instr)
+        stats = expected.run()
+
+        emu = Emu(instr)
+        async_stats = asyncio.run(emu.runAsync(slice=7))
+
+        assert emu.debug_info == expected.debug_info
+        assert async_stats.instructions == stats.instructions
+
+def test_scheduler():
+    long = build("int a = 0; int s = 0; while (a < 500) {a = a + 1; s = s + a;} DEBUG s;")
+    short = build(PROGRAMS["while"])
+    finished = []
+
+    def done(future):
+        finished.append(future.result()["name"])
+
+    async def main():
+        scheduler = Scheduler(slice=256)
+        futures = [scheduler.submit(f"long{i}", Emu(long)) for i in range(8)]
+        futures.append(scheduler.submit("budget", Emu(long), max_steps=1000))
+
+        for future in futures:
+            future.add_done_callback(done)
+
+        async def late():
+            # arrives while the long programs are already running
+            await asyncio.sleep(0)
+            future = scheduler.submit("short", Emu(short))
+            future.add_done_callback(done)
+            result = await future
+            scheduler.cancel("long3")
+            return result
+
+        results = await asyncio.gather(scheduler.run(), late(), *futures)
+        return results[1:]
+
+    results = {result["name"] : result for result in asyncio.run(main())}
+
+    assert results["short"]["debug_info"] == [100] and results["short"]["error"] is None
+    assert results["long0"]["debug_info"] == [125250]
+    assert results["long3"]["error"] == "Cancelled"
+    assert results["budget"]["error"].startswith("BudgetExceeded")
+    assert results["budget"]["stats"]["instructions"] == 1000
+    # the short program overtakes every long one that was already running
+    assert finished[:3] == ["budget", "short", "long3"]
+    assert all(results[f"long{i}"]["error"] is None for i in range(8) if i != 3)
@@ -0,0 +1,99 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from Emu import Emu, BudgetExceeded
+from VectorEmu import VectorEmu
+from emu_bench import PROGRAMS, build
+
+def runUntilStored(emu, addr, value):
+    steps = 0
+
+    while emu.mem.loadWord(addr) != value:
+        try:
+            emu.run(max_steps=1)
+        except BudgetExceeded:
+            pass
+        steps += 1
+
+    return steps
+
+def test_lanes_match_emu():
+    for code in PROGRAMS.values():
+        instr = build(code)
+        emu = Emu(instr)
+        stats = emu.run()
+
+        vector = VectorEmu(instr, 8)
+        vector_stats = vector.run()
+
+        assert vector.debug_info == [emu.debug_info] * 8
+        assert vector.errors == [None] * 8
+        assert vector.steps == emu.steps
+        assert vector_stats.instructions == stats.instructions * 8
+        assert vector_stats.stores == stats.stores * 8
+
+def test_divergent_sweep():
+    instr = build("int n = 5; int s = 0; while (n > 0) { s = s + n * n; n = n - 1; } DEBUG s;")
+    emu = Emu(instr)
+    prelude = runUntilStored(emu, 0, 5)
+    emu.mem.storeWord(0, 39)
+    emu.run()
+
+    vector = VectorEmu(instr, 40)
+    with pytest.raises(BudgetExceeded):
+        vector.run(max_steps=prelude)
+
+    vector.storeWord(0, np.arange(40))
+    vector.run()
+
+    assert vector.debug_info == [[sum(i * i for i in range(n + 1))] for n in range(40)]
+    # lanes that finish early wait at the loop exit for the rest, so the whole sweep
+    # issues about as many instructions as its longest lane
+    assert vector.steps <= emu.steps + 1
+
+def test_lane_faults():
+    instr = build("int d = 5; int q = *(&d + d); DEBUG q;")
+    prelude = runUntilStored(Emu(instr), 0, 5)
+
+    vector = VectorEmu(instr, 4)
+    with pytest.raises(BudgetExceeded):
+        vector.run(max_steps=prelude)
+
+    vector.storeWord(0, [0, 100000, 0, -100000])
+    vector.run()
+
+    assert vector.debug_info == [[0], [], [0], []]
+    assert vector.errors[0] is None and vector.errors[2] is None
+    assert vector.errors[1] == vector.errors[3] == "Bad address"
+
+def test_division_semantics():
+    instr = build("int d = 1; DEBUG 100 / d; DEBUG 0 - 7 / d; DEBUG 100 % d; DEBUG (0 - 7) % d;")
+    prelude = runUntilStored(Emu(instr), 0, 1)
+    divisors = [1, 0, 3, -3, -1]
+
+    vector = VectorEmu(instr, len(divisors))
+    with pytest.raises(BudgetExceeded):
+        vector.run(max_steps=prelude)
+
+    vector.storeWord(0, divisors)
+    vector.run()
+
+    for lane, d in enumerate(divisors):
+        emu = Emu(instr)
+        runUntilStored(emu, 0, 1)
+        emu.mem.storeWord(0, d)
+        emu.run()
+        assert vector.debug_info[lane] == emu.debug_info
+
+def test_packed_chars():
+    instr = build("char[7] s = ['v', 'e', 'c', 't', 'o', 'r', 's']; s[2] = s[6]; int i = 0; while (i < 7) { DEBUG s[i]; i = i + 1; }")
+
+    emu = Emu(instr)
+    emu.run()
+
+    vector = VectorEmu(instr, 3)
+    vector.run()
+
+    assert vector.debug_info == [emu.debug_info] * 3
+    assert bytes(vector.mem_views[np.uint8][1, 4:11]) == b"vestors"